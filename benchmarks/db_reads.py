@@ -0,0 +1,167 @@
+"""Measure the database side of page requests, idle and while a scrape is writing.
+
+Run with ``python benchmarks/db_reads.py [--rows 500000] [--requests 2000] [--seconds 5]``.
+
+Every request runs the queries a dashboard needs on a connection it either opens itself, as
+pages used to, or takes from the pool of ``futuresboard.db``. The busy runs do so while another
+thread stores income pages the way the scraper does, one commit per page of 1000 rows.
+``rollback journal`` is the same database outside of WAL mode, for comparison.
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from futuresboard import db
+from futuresboard import scraper
+
+PAGE_SIZE = 1000
+
+QUERIES = (
+    "SELECT SUM(totalWalletBalance) FROM account",
+    "SELECT COUNT(*) FROM positions WHERE ABS(positionAmt) > 0",
+    "SELECT * FROM income ORDER BY IID DESC LIMIT 100",
+    "SELECT symbol, SUM(income) FROM income WHERE IID > (SELECT MAX(IID) FROM income) - 10000 "
+    "GROUP BY symbol",
+)
+
+
+def income_rows(first, count):
+    start = 1577836800000
+    return [
+        (
+            index + 1,
+            f"SYM{index % 50}USDT",
+            "REALIZED_PNL",
+            "0.12345678",
+            "USDT",
+            "",
+            start + index * 60_000,
+            index + 1,
+        )
+        for index in range(first, first + count)
+    ]
+
+
+def seed(database, rows):
+    scraper.db_setup(database)
+    conn = scraper.create_connection(database)
+    for first in range(0, rows, PAGE_SIZE):
+        scraper.create_income_batch(conn, income_rows(first, min(PAGE_SIZE, rows - first)))
+    conn.commit()
+    conn.close()
+
+
+class ConnectionPerRequest:
+    """How pages connected before the pool: a new connection per request."""
+
+    def __init__(self, database):
+        self.database = database
+
+    def acquire(self):
+        conn = sqlite3.connect(self.database, detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        conn.close()
+
+    def close(self):
+        pass
+
+
+def page_request(connections, trivial=False):
+    start = time.perf_counter()
+    conn = connections.acquire()
+    try:
+        for sql in QUERIES[:1] if trivial else QUERIES:
+            conn.execute(sql).fetchall()
+    finally:
+        connections.release(conn)
+    return time.perf_counter() - start
+
+
+def writer(database, first, stop, journal, written):
+    if journal == "wal":
+        conn = scraper.create_connection(database)
+    else:
+        conn = sqlite3.connect(database, timeout=scraper.SQLITE_TIMEOUT)
+    while not stop.is_set():
+        scraper.create_income_batch(conn, income_rows(first, PAGE_SIZE))
+        conn.commit()
+        first += PAGE_SIZE
+        written[0] += PAGE_SIZE
+    conn.close()
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+
+    def pick(share):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * share))]
+
+    return (
+        f"p50 {pick(0.5) * 1000:7.2f}ms, p90 {pick(0.9) * 1000:7.2f}ms, "
+        f"p99 {pick(0.99) * 1000:7.2f}ms, max {latencies[-1] * 1000:7.2f}ms"
+    )
+
+
+def run(name, seeded, journal, pool, args):
+    database = str(pathlib.Path(seeded).with_name(f"{journal}-{pool}.db"))
+    shutil.copyfile(seeded, database)
+    connections = db.ConnectionPool(database) if pool else ConnectionPerRequest(database)
+    with sqlite3.connect(database) as conn:
+        conn.execute(f"PRAGMA journal_mode = {'WAL' if journal == 'wal' else 'DELETE'}")
+
+    overhead = [page_request(connections, trivial=True) for _ in range(args.requests)]
+    idle = [page_request(connections) for _ in range(args.requests)]
+
+    stop = threading.Event()
+    written = [0]
+    thread = threading.Thread(
+        target=writer, args=(database, args.rows + 10**9, stop, journal, written)
+    )
+    thread.start()
+    busy, errors = [], 0
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        try:
+            busy.append(page_request(connections))
+        except sqlite3.OperationalError:
+            errors += 1
+    stop.set()
+    thread.join()
+    connections.close()
+
+    print(f"{name}:")
+    print(f"  per-request overhead {statistics.mean(overhead) * 1_000_000:8.1f}us")
+    print(f"  idle                 {percentiles(idle)}")
+    print(
+        f"  while writing        {percentiles(busy)}, {len(busy)} requests, {errors} failed, "
+        f"{written[0]:,} rows written"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000, help="Stored income rows")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests of the idle runs")
+    parser.add_argument("--seconds", type=float, default=5, help="Length of the busy runs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database = str(pathlib.Path(tmpdir) / "futures.db")
+        seed(database, args.rows)
+        run("rollback journal", database, "delete", False, args)
+        run("connection per request", database, "wal", False, args)
+        run("pool", database, "wal", True, args)
+
+
+if __name__ == "__main__":
+    main()
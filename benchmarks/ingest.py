@@ -0,0 +1,72 @@
+"""Compare per-row and batched income ingest on a simulated Binance backfill.
+
+Run with ``python benchmarks/ingest.py [--rows 500000] [--page-size 1000]``.
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+from futuresboard import scraper
+
+
+def income_pages(rows, page_size):
+    start = 1577836800000
+    for offset in range(0, rows, page_size):
+        yield [
+            {
+                "symbol": "BTCUSDT",
+                "incomeType": "REALIZED_PNL",
+                "income": "0.12345678",
+                "asset": "USDT",
+                "info": "",
+                "time": start + (offset + i) * 1000,
+                "tranId": offset + i + 1,
+                "tradeId": str(offset + i + 1),
+            }
+            for i in range(min(page_size, rows - offset))
+        ]
+
+
+def per_row(database, pages):
+    for page in pages:
+        with scraper.create_connection(database) as conn:
+            for income in page:
+                scraper.create_income(conn, scraper.binance_income_row(income))
+            conn.commit()
+
+
+def batched(database, pages):
+    for page in pages:
+        with scraper.create_connection(database) as conn:
+            scraper.create_income_batch(conn, [scraper.binance_income_row(income) for income in page])
+            conn.commit()
+
+
+def run(name, ingest, rows, page_size):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database = str(pathlib.Path(tmpdir) / "futures.db")
+        scraper.db_setup(database)
+        pages = list(income_pages(rows, page_size))
+        start = time.perf_counter()
+        ingest(database, pages)
+        elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    before = run("per-row", per_row, args.rows, args.page_size)
+    after = run("batched", batched, args.rows, args.page_size)
+    print(f" speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
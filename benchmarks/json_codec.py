@@ -0,0 +1,111 @@
+"""Compare the JSON backends of ``futuresboard.codec`` on exchange payloads and chart data.
+
+Run with ``python benchmarks/json_codec.py [--symbols 300] [--repeat 50]``.
+
+The exchange payloads are recorded from the fake exchange server and the stream fixtures, so
+they have the shape and size of what the scraper, the kline store and the account stream parse.
+The chart payload is what a coin page encodes: 1000 candles of each of its four timeframes.
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import time
+
+import requests  # type: ignore
+
+from futuresboard import codec
+from futuresboard.fakes.exchange import FakeExchangeServer
+from futuresboard.klines import INTERVALS
+
+FIXTURES = pathlib.Path(codec.__file__).parent / "fakes" / "fixtures"
+
+
+def record(symbols):
+    """Fetch the largest page of every endpoint the scraper and coin pages read."""
+    server = FakeExchangeServer(
+        symbols=symbols, open_positions=symbols, orders=2, income_rows=100_000
+    ).start()
+    day = 24 * 60 * 60 * 1000
+    endpoints = {
+        "binance income": ("/fapi/v1/income", {"limit": 1000}),
+        "binance klines": (
+            "/fapi/v1/klines",
+            {"symbol": "BTCUSDT", "interval": "1h", "limit": 1000},
+        ),
+        "binance premiumIndex": ("/fapi/v1/premiumIndex", {}),
+        "binance positions": ("/fapi/v2/account", {}),
+        "bybit kline": (
+            "/v5/market/kline",
+            {"category": "linear", "symbol": "BTCUSDT", "interval": "60", "limit": 1000},
+        ),
+        "bybit tickers": ("/v5/market/tickers", {"category": "linear"}),
+        "bybit closed-pnl": (
+            "/v5/position/closed-pnl",
+            {
+                "symbol": "BTCUSDT",
+                "startTime": server.now - 7 * day,
+                "endTime": server.now,
+                "limit": 100,
+            },
+        ),
+    }
+    payloads = {}
+    with requests.Session() as session:
+        for name, (path, params) in endpoints.items():
+            response = session.get(server.url + path, params=params, timeout=10)
+            response.raise_for_status()
+            payloads[name] = [response.content]
+    server.shutdown()
+    server.server_close()
+    for fixture in sorted(FIXTURES.glob("*.jsonl")):
+        lines = [line.encode() for line in fixture.read_text().splitlines() if line.strip()]
+        payloads[f"stream {fixture.stem}"] = lines
+    return payloads
+
+
+def chart_payload():
+    candles = [(1_600_000_000_000 + i * 60_000, 100.5, 101.25, 99.75, 100.0) for i in range(1000)]
+    return {
+        interval: [{"x": c[0], "o": c[1], "h": c[2], "l": c[3], "c": c[4]} for c in candles]
+        for interval in INTERVALS
+    }
+
+
+def timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, default=300, help="Contracts listed by the fake")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs, the fastest is reported")
+    args = parser.parse_args()
+
+    payloads = record(args.symbols)
+    chart = chart_payload()
+    results = {}
+    for backend in codec.BACKENDS:
+        codec.set_backend(backend)
+        for name, messages in payloads.items():
+            results[name, backend] = timed(lambda: [codec.loads(m) for m in messages], args.repeat)
+        results["encode chart", backend] = timed(lambda: codec.dumps(chart), args.repeat)
+
+    sizes = {name: sum(len(m) for m in messages) for name, messages in payloads.items()}
+    sizes["encode chart"] = len(codec.dumps(chart))
+    print(f"{'payload':>28} {'bytes':>9} " + " ".join(f"{b:>10}" for b in codec.BACKENDS))
+    for name, size in sizes.items():
+        timings = " ".join(f"{results[name, b] * 1000:8.3f}ms" for b in codec.BACKENDS)
+        speedup = ""
+        if len(codec.BACKENDS) > 1:
+            speedup = f"  x{results[name, 'json'] / results[name, codec.BACKENDS[0]]:.1f}"
+        print(f"{name:>28} {size:9d} {timings}{speedup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Time the dashboard pages on a database holding years of income.
+
+Run with ``python benchmarks/pages.py [--rows 3000000] [--repeat 20]``.
+
+The income is spread over four years and 50 symbols. Mark prices and candles come from the fake
+exchange server, so the timings are those of futuresboard itself. Every page is rendered once
+before it is timed, and the median of the runs is reported.
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import statistics
+import tempfile
+import time
+from datetime import date
+from datetime import timedelta
+
+from futuresboard import scraper
+from futuresboard.app import init_app
+from futuresboard.config import Config
+from futuresboard.fakes.exchange import FakeExchangeServer
+
+PAGE_SIZE = 10_000
+DAY = 24 * 60 * 60 * 1000
+INCOME_TYPES = ("REALIZED_PNL", "FUNDING_FEE", "COMMISSION", "REALIZED_PNL", "TRANSFER")
+
+
+def seed(database, rows, symbols):
+    scraper.db_setup(database)
+    conn = scraper.create_connection(database)
+    end = int(time.time() * 1000)
+    spacing = 4 * 365 * DAY // rows
+    start = end - rows * spacing
+    for first in range(0, rows, PAGE_SIZE):
+        scraper.create_income_batch(
+            conn,
+            [
+                (
+                    index + 1,
+                    symbols[index % len(symbols)],
+                    INCOME_TYPES[index % len(INCOME_TYPES)],
+                    (index % 200 - 100) / 100,
+                    "BNB" if index % 97 == 0 else "USDT",
+                    "",
+                    start + index * spacing,
+                    index + 1,
+                )
+                for index in range(first, min(first + PAGE_SIZE, rows))
+            ],
+        )
+        conn.commit()
+    conn.execute(
+        "INSERT INTO account(totalWalletBalance, totalUnrealizedProfit, totalMarginBalance, "
+        "availableBalance, maxWithdrawAmount) VALUES(10000, 0, 10000, 10000, 10000)"
+    )
+    conn.execute(
+        "INSERT INTO positions(symbol, unrealizedProfit, leverage, entryPrice, positionSide, "
+        "positionAmt) VALUES(?, 1, 10, 100, 'LONG', 1)",
+        (symbols[7],),
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=3_000_000, help="Stored income rows")
+    parser.add_argument("--repeat", type=int, default=20, help="Renders of every page")
+    args = parser.parse_args()
+
+    server = FakeExchangeServer(symbols=50).start()
+    month = (date.today() - timedelta(days=30)).isoformat(), date.today().isoformat()
+    years = (date.today() - timedelta(days=4 * 365)).isoformat(), date.today().isoformat()
+    pages = {
+        "index": "/",
+        "dashboard of a month": f"/dashboard/{month[0]}/{month[1]}",
+        "dashboard of 4 years": f"/dashboard/{years[0]}/{years[1]}",
+        "coin": f"/coins/{server.symbols[7]}",
+        "coin of a month": f"/coins/{server.symbols[7]}/{month[0]}/{month[1]}",
+        "projection": "/projection",
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database = str(pathlib.Path(tmpdir) / "futures.db")
+        seed(database, args.rows, server.symbols)
+        config = Config.parse_obj(
+            {
+                "API_KEY": "key",
+                "API_SECRET": "secret",
+                "API_BASE_URL": server.url,
+                "DISABLE_AUTO_SCRAPE": True,
+                "CONFIG_DIR": tmpdir,
+                "DATABASE": database,
+            }
+        )
+        app = init_app(config)
+        app.logger.disabled = True
+        client = app.test_client()
+        for name, url in pages.items():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise SystemExit(f"{url} answered {response.status_code}")
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                client.get(url)
+                timings.append(time.perf_counter() - start)
+            print(f"{name:>22}: {statistics.median(timings) * 1000:8.1f}ms")
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Measure full scrapes against the fake exchange server.
+
+Run with ``python benchmarks/scrape.py [scenario ...] [--rows 2000000] [--real-time]``.
+It exits with status 1 when a scrape task failed, the fake server rejected a request for going
+over a rate limit, or the scrape stored a different number of income rows than the server has.
+
+Rate limit pauses are simulated on a clock shared by the scraper and the fake server, so a
+backfill that would spend an hour waiting for its weight budget finishes in the time it takes
+to move the data. The reported sleeps are what the scraper would have waited. ``--real-time``
+waits for real instead.
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from futuresboard import metrics
+from futuresboard import ratelimit
+from futuresboard import scraper
+from futuresboard.app import init_app
+from futuresboard.config import Config
+from futuresboard.fakes.exchange import FakeExchangeServer
+
+
+class SimulatedClock:
+    """Wall clock time where sleeping moves the clock forward instead of waiting."""
+
+    def __init__(self):
+        self.skipped = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return time.time() + self.skipped
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.skipped += seconds
+
+
+def scenarios(args):
+    return {
+        "cold-backfill": (
+            "binance",
+            {"income_rows": args.rows, "symbols": 20, "open_positions": 5, "orders": 2},
+            0,
+        ),
+        "incremental": (
+            "binance",
+            {"income_rows": args.history, "symbols": 20, "open_positions": 5, "orders": 2},
+            args.new_rows,
+        ),
+        "bybit-100-symbols": (
+            "bybit",
+            {"symbols": 100, "open_positions": 100, "orders": 2, "closed_pnl_per_day": 4},
+            0,
+        ),
+    }
+
+
+def rows_ingested():
+    return sum(metrics.ROWS_INGESTED.values.values())
+
+
+def scrape_failures():
+    return sum(metrics.SCRAPE_FAILURES.values.values())
+
+
+def expected_rows(exchange, server):
+    """Return the number of income rows a scrape of ``server`` stores."""
+    if exchange == "binance":
+        return server.income_rows
+    # the closed trades newer than the scraper's look back, which starts a moment after the
+    # server's clock
+    history = int(scraper.BYBIT_CLOSED_PNL_HISTORY.total_seconds() * 1000)
+    per_symbol = min(server.closed_pnl_rows, -(-history // server.closed_pnl_spacing))
+    return len(server.symbols) * per_symbol
+
+
+def scrape_once(app):
+    with app.app_context():
+        scraper.scrape(app=app)
+
+
+def run(name, exchange, options, new_rows, args):
+    clock = SimulatedClock()
+    server_clock = time.time if args.real_time else clock
+    server = FakeExchangeServer(
+        latency=args.latency, error_rate=args.error_rate, clock=server_clock, **options
+    ).start()
+    if not args.real_time:
+        # installed before the first request, so the scraper's client picks it up
+        key = (exchange, server.url, "key" if exchange in ratelimit.PER_ACCOUNT_LIMITS else "")
+        ratelimit._governors[key] = ratelimit.RateGovernor(
+            exchange, sleep=clock.sleep, clock=clock, wallclock=clock
+        )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = Config.parse_obj(
+            {
+                "EXCHANGE": exchange,
+                "API_KEY": "key",
+                "API_SECRET": "secret",
+                "API_BASE_URL": server.url,
+                "DISABLE_AUTO_SCRAPE": True,
+                "CONFIG_DIR": tmpdir,
+                "DATABASE": str(pathlib.Path(tmpdir) / "futures.db"),
+            }
+        )
+        app = init_app(config)
+        if new_rows:
+            # the scenario measures a regular scrape of an account whose history is stored
+            scrape_once(app)
+            server.add_income(new_rows)
+            clock.sleep(5 * 60)
+
+        governor = ratelimit.get_governor(exchange, server.url, "key")
+        governor_start = governor.stats()
+        requests_start = sum(server.requests.values())
+        rows_start = rows_ingested()
+        failures_start = scrape_failures()
+        start = time.perf_counter()
+        scrape_once(app)
+        elapsed = time.perf_counter() - start
+        pacing = ratelimit.stats_since(governor, governor_start)
+        requests = sum(server.requests.values()) - requests_start
+        rows = rows_ingested() - rows_start
+        failures = scrape_failures() - failures_start
+        with sqlite3.connect(config.DATABASE) as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM income").fetchone()[0]
+    server.shutdown()
+    server.server_close()
+
+    print(
+        f"{name:>18}: {elapsed:8.2f}s wall, {requests:6d} requests, {rows:8d} rows "
+        f"({rows / elapsed:,.0f} rows/s), {pacing['sleeps']} sleeps ({pacing['slept']:.1f}s), "
+        f"{server.errors} errors, {server.rejected} rejected, {stored} income rows stored"
+    )
+    problems = []
+    if failures:
+        problems.append(f"{failures} scrape tasks failed")
+    if server.rejected:
+        problems.append(f"{server.rejected} requests rejected over the rate limits")
+    expected = expected_rows(exchange, server)
+    if stored != expected:
+        problems.append(f"{stored} income rows stored instead of {expected}")
+    for problem in problems:
+        print(f"{name:>18}: {problem}", file=sys.stderr)
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("scenario", nargs="*", help="Scenarios to run, all of them by default")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Income rows to backfill")
+    parser.add_argument("--history", type=int, default=100_000, help="Stored income rows")
+    parser.add_argument("--new-rows", type=int, default=5, help="Income rows of 5 minutes")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added per request")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--real-time", action="store_true", help="Sleep for real")
+    args = parser.parse_args()
+
+    available = scenarios(args)
+    passed = True
+    for name in args.scenario or available:
+        if name not in available:
+            parser.error(f"unknown scenario {name}, choose from {', '.join(available)}")
+        passed = run(name, *available[name], args) and passed
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,12 @@ from flask import redirect
 from flask import request
 
 import futuresboard.scraper
+import futuresboard.stream
 from futuresboard import blueprint
+from futuresboard import codec
 from futuresboard import db
+from futuresboard import metrics
+from futuresboard import trigger
 from futuresboard.config import Config
 
 
@@ -25,15 +29,25 @@ def init_app(config: Config | None = None):
         config = Config.from_config_dir(pathlib.Path.cwd())
 
     app = Flask(__name__)
+    app.json = codec.JSONProvider(app)
     app.config.from_mapping(**json.loads(config.json()))
     app.url_map.strict_slashes = False
     db.init_app(app)
+    metrics.init_app(app)
+    trigger.init_app(app)
     app.before_request(clear_trailing)
     app.register_blueprint(blueprint.app)
+    migrations = futuresboard.scraper.db_setup(app.config["DATABASE"])
 
-    if config.DISABLE_AUTO_SCRAPE is False:
-        futuresboard.scraper.auto_scrape(app)
+    # in its own process, the scraper is started by the command line once the app is ready
+    if config.DISABLE_AUTO_SCRAPE is False and config.SCRAPER_PROCESS is False:
+        futuresboard.scraper.auto_scrape(app, stream=config.STREAM)
+
+    if config.STREAM is True and config.SCRAPER_PROCESS is False:
+        futuresboard.stream.start_stream(app)
 
     app.logger.setLevel(logging.INFO)
+    for description in migrations:
+        app.logger.info(f"Database migrated: {description}")
 
     return app
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import csv
+import hmac
 import os
 from datetime import date
 from datetime import datetime
 from datetime import timedelta
 from typing import Any
+from urllib.parse import urlsplit
 
-import requests
 from flask import Blueprint
+from flask import Response
+from flask import abort
+from flask import jsonify
 from flask import redirect
 from flask import render_template
 from flask import request
@@ -17,6 +21,15 @@ from flask import current_app
 from typing_extensions import TypedDict
 
 from futuresboard import db
+from futuresboard import equity
+from futuresboard import metrics
+from futuresboard import rollup
+from futuresboard import summary
+from futuresboard import trigger
+from futuresboard.klines import get_klines
+from futuresboard.markprice import get_mark_prices
+from futuresboard.scraper import NON_PNL_INCOME_TYPES
+from futuresboard.scraper import data_generation
 
 app = Blueprint("main", __name__)
 
@@ -50,7 +63,26 @@ class Projections(TypedDict):
     pcustom_value: float
 
 
-remove_incomeTypes = ["TRANSFER", "COIN_SWAP_DEPOSIT", "COIN_SWAP_WITHDRAW"]
+remove_incomeTypes = list(NON_PNL_INCOME_TYPES)
+
+ACCOUNT_COOKIE = "account"
+COINS_EXTENSION = "futuresboard.coins"
+
+
+def selected_account():
+    """Return the account the dashboard is restricted to, or None to aggregate all of them."""
+    name = request.cookies.get(ACCOUNT_COOKIE)
+    if any(account["NAME"] == name for account in current_app.config["ACCOUNTS"]):
+        return name
+    return None
+
+
+def account_filter(keyword="AND"):
+    """Return the SQL condition and arguments restricting a query to the selected account."""
+    name = selected_account()
+    if name is None:
+        return "", []
+    return f" {keyword} account = ?", [name]
 
 
 def zero_value(x):
@@ -77,7 +109,11 @@ def average_down_target(posprice, posqty, currentprice, targetprice):
     return (posqty * (posprice - targetprice)) / (targetprice - currentprice)
 
 
-def get_coins():
+def load_coins():
+    """Read the coins of the sidebar from the database: the symbols with open positions, with
+    their open orders and position to balance ratios, and the other symbols with income."""
+    account_sql, account_args = account_filter()
+    where_sql, where_args = account_filter("WHERE")
     coins: Coins = {
         "active": {},
         "inactive": [],
@@ -86,98 +122,87 @@ def get_coins():
     }
 
     all_active_positions = db.query(
-        "SELECT symbol, entryPrice, positionSide, positionAmt FROM positions WHERE ABS(positionAmt) > 0 ORDER BY symbol ASC"
+        "SELECT symbol, entryPrice, positionSide, positionAmt FROM positions WHERE ABS(positionAmt) > 0"
+        + account_sql
+        + " ORDER BY symbol ASC",
+        account_args,
     )
 
+    orders = {
+        row[0]: row[1:]
+        for row in db.query(
+            'SELECT symbol, SUM(side = "BUY" AND positionSide = "LONG"), '
+            'SUM(side = "SELL" AND positionSide = "LONG"), '
+            'SUM(side = "BUY" AND positionSide = "SHORT"), '
+            'SUM(side = "SELL" AND positionSide = "SHORT") FROM orders'
+            + where_sql
+            + " GROUP BY symbol",
+            where_args,
+        )
+    }
+
     all_symbols_with_pnl = db.query(
-        'SELECT DISTINCT(symbol) FROM income WHERE asset <> "BNB" AND symbol <> "" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " ORDER BY symbol ASC",
-        remove_incomeTypes,
+        "SELECT DISTINCT(symbol) FROM income_symbols" + where_sql + " ORDER BY symbol ASC",
+        where_args,
     )
 
-    balance = db.query("SELECT totalWalletBalance FROM account WHERE AID = 1", one=True)
-
-    active_symbols = []
-    pbr_long, pbr_short = 0.0, 0.0
+    balance = db.query(
+        "SELECT SUM(totalWalletBalance) FROM account" + where_sql, where_args, one=True
+    )
 
     for position in all_active_positions:
-        if position[0] not in active_symbols:
+        symbol = position[0]
+        if symbol not in coins["active"]:
             coins["totals"]["active"] += 1
-        active_symbols.append(position[0])
-
-        buy_long, sell_long, buy_short, sell_short,  = 0, 0, 0, 0
-
-        buyorders_long = db.query(
-            'SELECT COUNT(OID) FROM orders WHERE symbol = ? AND side = "BUY" AND positionSide = "LONG"',
-            [position[0]],
-            one=True,
-        )
-
-        buyorders_short = db.query(
-            'SELECT COUNT(OID) FROM orders WHERE symbol = ? AND side = "BUY" AND positionSide = "SHORT"',
-            [position[0]],
-            one=True,
-        )
-
-        sellorders_long = db.query(
-            'SELECT COUNT(OID) FROM orders WHERE symbol = ? AND side = "SELL" AND positionSide = "LONG"',
-            [position[0]],
-            one=True,
-        )
-
-        sellorders_short = db.query(
-            'SELECT COUNT(OID) FROM orders WHERE symbol = ? AND side = "SELL" AND positionSide = "SHORT"',
-            [position[0]],
-            one=True,
-        )
-
-        coins["active"][position[0]] = [buy_long, sell_long, pbr_long, buy_short, sell_short, pbr_short]
-        if position[2] == 'LONG':
-            pbr_long = round(calc_pbr(position[3], position[1], position[2], float(balance[0])), 2)
-            pbr_short = 0.0
-        if position[2] == 'SHORT':
-            pbr_short = round(calc_pbr(position[3], position[1], position[2], float(balance[0])), 2)
-            pbr_long = 0.0
-
-        if buyorders_long is not None:
-            buy_long = int(buyorders_long[0])
-        if sellorders_long is not None:
-            sell_long = int(sellorders_long[0])
-        if buyorders_short is not None:
-            buy_short = int(buyorders_short[0])
-        if sellorders_short is not None:
-            sell_short = int(sellorders_short[0])
-        if buy_long == 0 and sell_long == 0 and buy_short == 0 and sell_short == 0:
-            coins["warning"] = True
-
-        coins["active"][position[0]][0] = buy_long
-        coins["active"][position[0]][1] = sell_long
-        coins["active"][position[0]][2] += pbr_long
-        coins["active"][position[0]][3] = buy_short
-        coins["active"][position[0]][4] = sell_short
-        coins["active"][position[0]][5] += pbr_short
-        coins["totals"]["buys_long"] += buy_long
-        coins["totals"]["sells_long"] += sell_long
-        coins["totals"]["pbr_long"] += pbr_long
-        coins["totals"]["buys_short"] += buy_short
-        coins["totals"]["sells_short"] += sell_short
-        coins["totals"]["pbr_short"] += pbr_short
-        coins["active"][position[0]][2] = round(coins["active"][position[0]][2],2)
-        coins["active"][position[0]][5] = round(coins["active"][position[0]][5],2)
+            buy_long, sell_long, buy_short, sell_short = orders.get(symbol, (0, 0, 0, 0))
+            if buy_long == 0 and sell_long == 0 and buy_short == 0 and sell_short == 0:
+                coins["warning"] = True
+            coins["active"][symbol] = [buy_long, sell_long, 0.0, buy_short, sell_short, 0.0]
+            coins["totals"]["buys_long"] += buy_long
+            coins["totals"]["sells_long"] += sell_long
+            coins["totals"]["buys_short"] += buy_short
+            coins["totals"]["sells_short"] += sell_short
+
+        pbr = round(calc_pbr(position[3], position[1], position[2], float(balance[0])), 2)
+        if position[2] == "LONG":
+            coins["active"][symbol][2] = round(coins["active"][symbol][2] + pbr, 2)
+            coins["totals"]["pbr_long"] += pbr
+        if position[2] == "SHORT":
+            coins["active"][symbol][5] = round(coins["active"][symbol][5] + pbr, 2)
+            coins["totals"]["pbr_short"] += pbr
 
     for symbol in all_symbols_with_pnl:
-        if symbol[0] not in active_symbols:
+        if symbol[0] not in coins["active"]:
             coins["inactive"].append(symbol[0])
             coins["totals"]["inactive"] += 1
-    
+
     coins["totals"]["pbr_long"] = format_dp(coins["totals"]["pbr_long"])
     coins["totals"]["pbr_short"] = format_dp(coins["totals"]["pbr_short"])
     return coins
 
 
+def get_coins():
+    """Return the coins of the sidebar for the selected account.
+
+    They are read once per scrape generation and shared by the pages until the scraper changes
+    the database again. With DISABLE_AUTO_SCRAPE the database is likely written by another
+    process, such as a scheduled ``futuresboard --scrape-only``, so they are read for every page.
+    """
+    account = selected_account()
+    generation = data_generation()
+    cache = current_app.extensions.setdefault(COINS_EXTENSION, {})
+    cached = cache.get(account)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    coins = load_coins()
+    if current_app.config["DISABLE_AUTO_SCRAPE"] is False:
+        cache[account] = (generation, coins)
+    return coins
+
+
 def get_lastupdate():
-    lastupdate = db.query("SELECT MAX(time) FROM orders", one=True)
+    where_sql, where_args = account_filter("WHERE")
+    lastupdate = db.query("SELECT MAX(time) FROM orders" + where_sql, where_args, one=True)
     if lastupdate[0] is None:
         return "-"
     return datetime.fromtimestamp(lastupdate[0] / 1000.0).strftime("%Y-%m-%d %H:%M:%S")
@@ -212,8 +237,68 @@ def timeranges():
     ]
 
 
+@app.app_context_processor
+def inject_accounts():
+    return {
+        "accounts": [account["NAME"] for account in current_app.config["ACCOUNTS"]],
+        "selected_account": selected_account(),
+    }
+
+
+@app.route("/account", defaults={"name": None})
+@app.route("/account/<name>")
+def account_page(name):
+    target = request.referrer
+    if not target or urlsplit(target).netloc != request.host:
+        target = url_for("main.index_page")
+    response = redirect(target)
+    if name is None:
+        response.delete_cookie(ACCOUNT_COOKIE)
+    else:
+        response.set_cookie(ACCOUNT_COOKIE, name, samesite="Lax")
+    return response
+
+
+@app.route("/metrics")
+def metrics_page():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/scrape", methods=["GET", "POST", "DELETE"])
+def scrape_trigger():
+    """Start (POST), follow (GET) or cancel (DELETE) an on-demand scrape of every account.
+
+    Only available with a ``SCRAPE_TOKEN``, which must be sent as a bearer token.
+    """
+    token = current_app.config["SCRAPE_TOKEN"]
+    if not token:
+        abort(404)
+    authorization = request.headers.get("Authorization", "").encode("utf-8")
+    if not hmac.compare_digest(authorization, f"Bearer {token}".encode("utf-8")):
+        return jsonify({"error": "invalid or missing token"}), 401
+
+    scrape_trigger = trigger.get_trigger()
+    try:
+        if request.method == "POST":
+            run, started = scrape_trigger.request()
+            return jsonify(dict(run.as_dict(), coalesced=not started)), 202 if started else 200
+        if request.method == "DELETE":
+            run = scrape_trigger.cancel()
+            if run is None:
+                return jsonify({"error": "no scrape is running"}), 404
+            return jsonify(run.as_dict()), 202
+        run = scrape_trigger.run
+    except trigger.ScraperUnavailable as exc:
+        return jsonify({"error": str(exc)}), 503
+    if run is None:
+        return jsonify({"status": "idle"})
+    return jsonify(run.as_dict())
+
+
 @app.route("/", methods=["GET"])
 def index_page():
+    account = selected_account()
+    where_sql, where_args = account_filter("WHERE")
     daterange = request.args.get("daterange")
     ranges = timeranges()
 
@@ -273,69 +358,43 @@ def index_page():
     )
     startdate, enddate = ranges[2][0], ranges[2][1]
 
-    balance = db.query("SELECT totalWalletBalance FROM account WHERE AID = 1", one=True)
-    total = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes)),
-        remove_incomeTypes,
-        one=True,
-    )
-    today = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ?",
-        remove_incomeTypes + [todaystart, todayend],
-        one=True,
-    )
-    week = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ?",
-        remove_incomeTypes + [weekstart, weekend],
-        one=True,
+    balance = db.query(
+        "SELECT SUM(totalWalletBalance) FROM account" + where_sql, where_args, one=True
     )
-    month = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ?",
-        remove_incomeTypes + [monthstart, monthend],
-        one=True,
+    period_pnl, all_fees = summary.totals(
+        {
+            "total": (None, None),
+            "today": (todaystart, todayend),
+            "week": (weekstart, weekend),
+            "month": (monthstart, monthend),
+        },
+        account=account,
     )
+    total, today, week, month = period_pnl.values()
 
-    unrealized = db.query("SELECT SUM(unrealizedProfit) FROM positions", one=True)
-
-    all_fees = db.query(
-        'SELECT SUM(income), asset FROM income WHERE incomeType ="COMMISSION" GROUP BY asset'
+    unrealized = db.query(
+        "SELECT SUM(unrealizedProfit) FROM positions" + where_sql, where_args, one=True
     )
 
-    by_date = db.query(
-        'SELECT DATE(time / 1000, "unixepoch") AS Date, SUM(income) AS inc FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ?  AND time <= ? GROUP BY Date",
-        remove_incomeTypes + [start, end],
-    )
+    by_date = rollup.pnl_by_date(start, end, exclude=remove_incomeTypes, account=account)
 
-    by_symbol = db.query(
-        'SELECT SUM(income) AS inc, symbol FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ? GROUP BY symbol ORDER BY inc DESC",
-        remove_incomeTypes + [start, end],
-    )
+    by_symbol = rollup.pnl_by_symbol(start, end, exclude=remove_incomeTypes, account=account)
 
     fees = {"USDT": 0, "BNB": 0}
 
     balance = float(balance[0])
 
     temptotal: tuple[list[float], list[float]] = ([], [])
-    profit_period = balance - zero_value(week[0])
+    # the balance without the profit and loss of all time
+    starting_balance = balance - total
 
     temp: tuple[list[float], list[float]] = ([], [])
     for each in by_date:
         temp[0].append(round(float(each[1]), 2))
         temp[1].append(each[0])
-        temptotal[1].append(each[0])
-        temptotal[0].append(round(profit_period + float(each[1]), 2))
-        profit_period += float(each[1])
+    for day, pnl_to_date in zip(temp[1], equity.by_date(temp[1], account=account)):
+        temptotal[1].append(day)
+        temptotal[0].append(round(starting_balance + pnl_to_date, 2))
     by_date = temp
     total_by_date = temptotal
 
@@ -349,27 +408,27 @@ def index_page():
         percentages = ["-", "-", "-", "-"]
     else:
         percentages = [
-            format_dp(zero_value(today[0]) / balance * 100),
-            format_dp(zero_value(week[0]) / balance * 100),
-            format_dp(zero_value(month[0]) / balance * 100),
-            format_dp(zero_value(total[0]) / balance * 100),
+            format_dp(zero_value(today) / balance * 100),
+            format_dp(zero_value(week) / balance * 100),
+            format_dp(zero_value(month) / balance * 100),
+            format_dp(zero_value(total) / balance * 100),
         ]
 
-    for row in all_fees:
-        fees[row[1]] = format_dp(abs(zero_value(row[0])), 4)
+    for asset, income in all_fees.items():
+        fees[asset] = format_dp(abs(income), 4)
 
     pnl = [format_dp(zero_value(unrealized[0])), format_dp(balance)]
     totals = [
-        format_dp(zero_value(total[0])),
-        format_dp(zero_value(today[0])),
-        format_dp(zero_value(week[0])),
-        format_dp(zero_value(month[0])),
+        format_dp(zero_value(total)),
+        format_dp(zero_value(today)),
+        format_dp(zero_value(week)),
+        format_dp(zero_value(month)),
         ranges[3],
         fees,
         percentages,
         pnl,
         datetime.now().strftime("%B"),
-        zero_value(week[0]),
+        zero_value(week),
         len(by_symbol[0]),
     ]
 
@@ -389,6 +448,8 @@ def index_page():
 
 @app.route("/dashboard/<start>/<end>", methods=["GET"])
 def dashboard_page(start, end):
+    account = selected_account()
+    where_sql, where_args = account_filter("WHERE")
     ranges = timeranges()
     daterange = request.args.get("daterange")
 
@@ -448,55 +509,28 @@ def dashboard_page(start, end):
         * 1000
     )
 
-    balance = db.query("SELECT totalWalletBalance FROM account WHERE AID = 1", one=True)
-    total = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes)),
-        remove_incomeTypes,
-        one=True,
+    balance = db.query(
+        "SELECT SUM(totalWalletBalance) FROM account" + where_sql, where_args, one=True
     )
-
-    today = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ?",
-        remove_incomeTypes + [todaystart, todayend],
-        one=True,
-    )
-    week = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ?",
-        remove_incomeTypes + [weekstart, weekend],
-        one=True,
+    period_pnl, all_fees = summary.totals(
+        {
+            "total": (None, None),
+            "today": (todaystart, todayend),
+            "week": (weekstart, weekend),
+            "month": (monthstart, monthend),
+            "custom": (start, end),
+        },
+        account=account,
     )
-    month = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ?",
-        remove_incomeTypes + [monthstart, monthend],
-        one=True,
-    )
-
-    unrealized = db.query("SELECT SUM(unrealizedProfit) FROM positions", one=True)
+    total, today, week, month, customframe = period_pnl.values()
 
-    all_fees = db.query(
-        'SELECT SUM(income), asset FROM income WHERE incomeType ="COMMISSION" GROUP BY asset'
+    unrealized = db.query(
+        "SELECT SUM(unrealizedProfit) FROM positions" + where_sql, where_args, one=True
     )
 
-    by_date = db.query(
-        'SELECT DATE(time / 1000, "unixepoch") AS Date, SUM(income) AS inc FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ?  AND time <= ? GROUP BY Date",
-        remove_incomeTypes + [start, end],
-    )
+    by_date = rollup.pnl_by_date(start, end, exclude=remove_incomeTypes, account=account)
 
-    by_symbol = db.query(
-        'SELECT SUM(income) AS inc, symbol FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ? GROUP BY symbol ORDER BY inc DESC",
-        remove_incomeTypes + [start, end],
-    )
+    by_symbol = rollup.pnl_by_symbol(start, end, exclude=remove_incomeTypes, account=account)
 
     fees = {"USDT": 0, "BNB": 0}
 
@@ -504,23 +538,16 @@ def dashboard_page(start, end):
 
     temptotal: tuple[list[float], list[float]] = ([], [])
 
-    customframe = db.query(
-        'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType <> "TRANSFER" AND incomeType NOT IN'
-        + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-        + " AND time >= ? AND time <= ?",
-        remove_incomeTypes + [start, end],
-        one=True,
-    )
-
-    profit_period = balance - zero_value(customframe[0])
+    # the balance without the profit and loss of all time
+    starting_balance = balance - total
 
     temp: tuple[list[float], list[float]] = ([], [])
     for each in by_date:
         temp[0].append(round(float(each[1]), 2))
         temp[1].append(each[0])
-        temptotal[1].append(each[0])
-        temptotal[0].append(round(profit_period + float(each[1]), 2))
-        profit_period += float(each[1])
+    for day, pnl_to_date in zip(temp[1], equity.by_date(temp[1], account=account)):
+        temptotal[1].append(day)
+        temptotal[0].append(round(starting_balance + pnl_to_date, 2))
     by_date = temp
     total_by_date = temptotal
 
@@ -534,26 +561,26 @@ def dashboard_page(start, end):
         percentages = ["-", "-", "-", "-"]
     else:
         percentages = [
-            format_dp(zero_value(today[0]) / balance * 100),
-            format_dp(zero_value(week[0]) / balance * 100),
-            format_dp(zero_value(month[0]) / balance * 100),
-            format_dp(zero_value(total[0]) / balance * 100),
+            format_dp(zero_value(today) / balance * 100),
+            format_dp(zero_value(week) / balance * 100),
+            format_dp(zero_value(month) / balance * 100),
+            format_dp(zero_value(total) / balance * 100),
         ]
 
-    for row in all_fees:
-        fees[row[1]] = format_dp(abs(zero_value(row[0])), 4)
+    for asset, income in all_fees.items():
+        fees[asset] = format_dp(abs(income), 4)
     pnl = [format_dp(zero_value(unrealized[0])), format_dp(balance)]
     totals = [
-        format_dp(zero_value(total[0])),
-        format_dp(zero_value(today[0])),
-        format_dp(zero_value(week[0])),
-        format_dp(zero_value(month[0])),
+        format_dp(zero_value(total)),
+        format_dp(zero_value(today)),
+        format_dp(zero_value(week)),
+        format_dp(zero_value(month)),
         ranges[3],
         fees,
         percentages,
         pnl,
         datetime.now().strftime("%B"),
-        zero_value(customframe[0]),
+        zero_value(customframe),
         len(by_symbol[0]),
     ]
     return render_template(
@@ -571,31 +598,21 @@ def dashboard_page(start, end):
 
 @app.route("/positions")
 def positions_page():
+    account_sql, account_args = account_filter()
     coins = get_coins()
     positions = {}
 
-    try:
-        response = requests.get("https://fapi.binance.com/fapi/v1/premiumIndex", timeout=2)
-        markPrices: dict
-        markPrices = {}
-        if response:
-            temp = response.json()
-            for each in temp:
-                markPrices[each["symbol"]] = float(each["markPrice"])
-        else:
-            markPrices = {}
-    except Exception:
-        markPrices = {}
+    markPrices = get_mark_prices().prices
 
     for coin in coins["active"]:
 
         allpositions = db.query(
-            "SELECT * FROM positions WHERE symbol = ?",
-            [coin],
+            "SELECT * FROM positions WHERE symbol = ?" + account_sql,
+            [coin] + account_args,
         )
         allorders = db.query(
-            "SELECT * FROM orders WHERE symbol = ? ORDER BY side, price, origQty",
-            [coin],
+            "SELECT * FROM orders WHERE symbol = ?" + account_sql + " ORDER BY side, price, origQty",
+            [coin] + account_args,
         )
 
         temp = []
@@ -664,7 +681,7 @@ def positions_page():
 
     return render_template(
         "positions.html",
-        coin_list=get_coins(),
+        coin_list=coins,
         positions=positions,
         custom=current_app.config["CUSTOM"],
         markprices=markPrices,
@@ -673,12 +690,15 @@ def positions_page():
 
 @app.route("/coins/<coin>", methods=["GET"])
 def coin_page(coin):
+    account_sql, account_args = account_filter()
+    account = selected_account()
+    where_sql, where_args = account_filter("WHERE")
     coins = get_coins()
     if coin not in coins["inactive"] and coin not in coins["active"]:
         return (
             render_template(
                 "error.html",
-                coin_list=get_coins(),
+                coin_list=coins,
                 custom=current_app.config["CUSTOM"],
             ),
             404,
@@ -710,7 +730,9 @@ def coin_page(coin):
             except Exception:
                 pass
 
-    balance = db.query("SELECT totalWalletBalance FROM account WHERE AID = 1", one=True)
+    balance = db.query(
+        "SELECT SUM(totalWalletBalance) FROM account" + where_sql, where_args, one=True
+    )
     if balance[0] is None:
         totals = ["-", "-", "-", "-", "-", {"USDT": 0, "BNB": 0}, ["-", "-", "-", "-"]]
     else:
@@ -742,51 +764,30 @@ def coin_page(coin):
 
         startdate, enddate = ranges[2][0], ranges[2][1]
 
-        total = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType <> "TRANSFER" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND symbol = ?",
-            remove_incomeTypes + [coin],
-            one=True,
-        )
-        today = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType <> "TRANSFER" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ?",
-            remove_incomeTypes + [todaystart, todayend, coin],
-            one=True,
-        )
-        week = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType <> "TRANSFER" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ?",
-            remove_incomeTypes + [weekstart, weekend, coin],
-            one=True,
-        )
-        month = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType <> "TRANSFER" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ?",
-            remove_incomeTypes + [monthstart, monthend, coin],
-            one=True,
+        period_pnl, all_fees = summary.totals(
+            {
+                "total": (None, None),
+                "today": (todaystart, todayend),
+                "week": (weekstart, weekend),
+                "month": (monthstart, monthend),
+            },
+            symbol=coin,
+            account=account,
         )
+        total, today, week, month = period_pnl.values()
 
-        result = db.query(
-            'SELECT SUM(income), asset FROM income WHERE incomeType ="COMMISSION" AND symbol = ? GROUP BY asset',
-            [coin],
-        )
         unrealized = db.query(
-            "SELECT SUM(unrealizedProfit) FROM positions WHERE symbol = ?",
-            [coin],
+            "SELECT SUM(unrealizedProfit) FROM positions WHERE symbol = ?" + account_sql,
+            [coin] + account_args,
             one=True,
         )
         allpositions = db.query(
-            "SELECT * FROM positions WHERE symbol = ? AND entryPrice > 0",
-            [coin],
+            "SELECT * FROM positions WHERE symbol = ? AND entryPrice > 0" + account_sql,
+            [coin] + account_args,
         )
         allorders = db.query(
-            "SELECT * FROM orders WHERE symbol = ? ORDER BY side, price, origQty",
-            [coin],
+            "SELECT * FROM orders WHERE symbol = ?" + account_sql + " ORDER BY side, price, origQty",
+            [coin] + account_args,
         )
 
         temp = []
@@ -797,13 +798,11 @@ def coin_page(coin):
         allpositions = temp
 
         averagetargets = ["-", "-", "-", "-"]
+        markPriceCache = get_mark_prices()
+        markPrice: float | str | None = markPriceCache.get(coin)
+        markPriceAge = markPriceCache.age(coin)
         try:
-            response = requests.get(
-                "https://fapi.binance.com/fapi/v1/premiumIndex?symbol=" + coin, timeout=2
-            )
-            markPrice: float | str
-            if response:
-                markPrice = float(response.json()["markPrice"])
+            if markPrice is not None:
                 averagetargets = [
                     round(
                         average_down_target(
@@ -826,37 +825,7 @@ def coin_page(coin):
         except Exception:
             markPrice = "-"
 
-        sticks = {"15m": [], "1h": [], "4h": [], "1d": []}
-
-        for timeframe in sticks:
-            try:
-                response = requests.get(
-                    "https://fapi.binance.com/fapi/v1/klines?symbol="
-                    + coin
-                    + "&interval="
-                    + timeframe
-                    + "&limit=1000",
-                    timeout=2,
-                )
-                if response:
-                    timestamps = []
-                    candles = []
-                    for candle in response.json():
-                        dateconvert = candle[0]
-                        timestamps.append(dateconvert)
-                        candles.append(
-                            [
-                                dateconvert,
-                                candle[1],
-                                candle[2],
-                                candle[3],
-                                candle[4],
-                                candle[5],
-                            ]
-                        )
-                    sticks[timeframe] = [timestamps, candles]
-            except:
-                pass
+        sticks = get_klines().chart(coin)
 
         temp = []
         for order in allorders:
@@ -871,31 +840,28 @@ def coin_page(coin):
             percentages = ["-", "-", "-", "-"]
         else:
             percentages = [
-                format_dp(zero_value(today[0]) / balance * 100),
-                format_dp(zero_value(week[0]) / balance * 100),
-                format_dp(zero_value(month[0]) / balance * 100),
-                format_dp(zero_value(total[0]) / balance * 100),
+                format_dp(zero_value(today) / balance * 100),
+                format_dp(zero_value(week) / balance * 100),
+                format_dp(zero_value(month) / balance * 100),
+                format_dp(zero_value(total) / balance * 100),
             ]
-        for row in result:
-            fees[row[1]] = format_dp(abs(zero_value(row[0])), 4)
+        for asset, income in all_fees.items():
+            fees[asset] = format_dp(abs(income), 4)
         pnl = [format_dp(zero_value(unrealized[0])), format_dp(balance)]
         totals = [
-            format_dp(zero_value(total[0])),
-            format_dp(zero_value(today[0])),
-            format_dp(zero_value(week[0])),
-            format_dp(zero_value(month[0])),
+            format_dp(zero_value(total)),
+            format_dp(zero_value(today)),
+            format_dp(zero_value(week)),
+            format_dp(zero_value(month)),
             ranges[3],
             fees,
             percentages,
             pnl,
             datetime.now().strftime("%B"),
-            zero_value(week[0]),
+            zero_value(week),
         ]
-        by_date = db.query(
-            'SELECT DATE(time / 1000, "unixepoch") AS Date, SUM(income) AS inc FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ? GROUP BY Date",
-            remove_incomeTypes + [weekstart, weekend, coin],
+        by_date = rollup.pnl_by_date(
+            weekstart, weekend, symbol=coin, exclude=remove_incomeTypes, account=account
         )
         temp = [[], []]
         for each in by_date:
@@ -905,7 +871,7 @@ def coin_page(coin):
 
     return render_template(
         "coin.html",
-        coin_list=get_coins(),
+        coin_list=coins,
         coin=coin,
         totals=totals,
         summary=[],
@@ -913,6 +879,7 @@ def coin_page(coin):
         orders=[allpositions, allorders],
         lastupdate=get_lastupdate(),
         markprice=markPrice,
+        markprice_age=markPriceAge,
         startdate=startdate,
         enddate=enddate,
         timeranges=ranges,
@@ -924,12 +891,15 @@ def coin_page(coin):
 
 @app.route("/coins/<coin>/<start>/<end>")
 def coin_page_timeframe(coin, start, end):
+    account_sql, account_args = account_filter()
+    account = selected_account()
+    where_sql, where_args = account_filter("WHERE")
     coins = get_coins()
     if coin not in coins["inactive"] and coin not in coins["active"]:
         return (
             render_template(
                 "error.html",
-                coin_list=get_coins(),
+                coin_list=coins,
                 custom=current_app.config["CUSTOM"],
             ),
             404,
@@ -1000,54 +970,36 @@ def coin_page_timeframe(coin, start, end):
         * 1000
     )
 
-    balance = db.query("SELECT totalWalletBalance FROM account WHERE AID = 1", one=True)
+    balance = db.query(
+        "SELECT SUM(totalWalletBalance) FROM account" + where_sql, where_args, one=True
+    )
     if balance[0] is None:
         totals = ["-", "-", "-", "-", "-", {"USDT": 0, "BNB": 0}, ["-", "-", "-", "-"]]
     else:
-        total = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND symbol = ?",
-            remove_incomeTypes + [coin],
-            one=True,
-        )
-        today = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType <> "TRANSFER" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ?",
-            remove_incomeTypes + [todaystart, todayend, coin],
-            one=True,
-        )
-        week = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType <> "TRANSFER" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ?",
-            remove_incomeTypes + [weekstart, weekend, coin],
-            one=True,
-        )
-        month = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType <> "TRANSFER" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ?",
-            remove_incomeTypes + [monthstart, monthend, coin],
-            one=True,
-        )
-        result = db.query(
-            'SELECT SUM(income), asset FROM income WHERE incomeType ="COMMISSION" AND symbol = ? GROUP BY asset',
-            [coin],
+        period_pnl, all_fees = summary.totals(
+            {
+                "total": (None, None),
+                "today": (todaystart, todayend),
+                "week": (weekstart, weekend),
+                "month": (monthstart, monthend),
+                "custom": (start, end),
+            },
+            symbol=coin,
+            account=account,
         )
+        total, today, week, month, customframe = period_pnl.values()
         unrealized = db.query(
-            "SELECT SUM(unrealizedProfit) FROM positions WHERE symbol = ?",
-            [coin],
+            "SELECT SUM(unrealizedProfit) FROM positions WHERE symbol = ?" + account_sql,
+            [coin] + account_args,
             one=True,
         )
         allpositions = db.query(
-            "SELECT * FROM positions WHERE symbol = ? AND entryPrice > 0",
-            [coin],
+            "SELECT * FROM positions WHERE symbol = ? AND entryPrice > 0" + account_sql,
+            [coin] + account_args,
         )
         allorders = db.query(
-            "SELECT * FROM orders WHERE symbol = ? ORDER BY side, price, origQty",
-            [coin],
+            "SELECT * FROM orders WHERE symbol = ?" + account_sql + " ORDER BY side, price, origQty",
+            [coin] + account_args,
         )
 
         temp = []
@@ -1058,13 +1010,11 @@ def coin_page_timeframe(coin, start, end):
         allpositions = temp
 
         averagetargets = ["-", "-", "-", "-"]
+        markPriceCache = get_mark_prices()
+        markPrice: float | str | None = markPriceCache.get(coin)
+        markPriceAge = markPriceCache.age(coin)
         try:
-            response = requests.get(
-                "https://fapi.binance.com/fapi/v1/premiumIndex?symbol=" + coin, timeout=2
-            )
-            markPrice: float | str
-            if response:
-                markPrice = float(response.json()["markPrice"])
+            if markPrice is not None:
                 averagetargets = [
                     round(
                         average_down_target(
@@ -1087,37 +1037,7 @@ def coin_page_timeframe(coin, start, end):
         except Exception:
             markPrice = "-"
 
-        sticks = {"15m": [], "1h": [], "4h": [], "1d": []}
-
-        for timeframe in sticks:
-            try:
-                response = requests.get(
-                    "https://fapi.binance.com/fapi/v1/klines?symbol="
-                    + coin
-                    + "&interval="
-                    + timeframe
-                    + "&limit=1000",
-                    timeout=2,
-                )
-                if response:
-                    timestamps = []
-                    candles = []
-                    for candle in response.json():
-                        dateconvert = candle[0]
-                        timestamps.append(dateconvert)
-                        candles.append(
-                            [
-                                dateconvert,
-                                candle[1],
-                                candle[2],
-                                candle[3],
-                                candle[4],
-                                candle[5],
-                            ]
-                        )
-                    sticks[timeframe] = [timestamps, candles]
-            except:
-                pass
+        sticks = get_klines().chart(coin)
 
         temp = []
         for order in allorders:
@@ -1131,19 +1051,16 @@ def coin_page_timeframe(coin, start, end):
             percentages = ["-", "-", "-", "-"]
         else:
             percentages = [
-                format_dp(zero_value(today[0]) / balance * 100),
-                format_dp(zero_value(week[0]) / balance * 100),
-                format_dp(zero_value(month[0]) / balance * 100),
-                format_dp(zero_value(total[0]) / balance * 100),
+                format_dp(zero_value(today) / balance * 100),
+                format_dp(zero_value(week) / balance * 100),
+                format_dp(zero_value(month) / balance * 100),
+                format_dp(zero_value(total) / balance * 100),
             ]
-        for row in result:
-            fees[row[1]] = format_dp(abs(zero_value(row[0])), 4)
-
-        by_date = db.query(
-            'SELECT DATE(time / 1000, "unixepoch") AS Date, SUM(income) AS inc FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ? GROUP BY Date",
-            remove_incomeTypes + [start, end, coin],
+        for asset, income in all_fees.items():
+            fees[asset] = format_dp(abs(income), 4)
+
+        by_date = rollup.pnl_by_date(
+            start, end, symbol=coin, exclude=remove_incomeTypes, account=account
         )
         temp = [[], []]
         for each in by_date:
@@ -1153,30 +1070,22 @@ def coin_page_timeframe(coin, start, end):
 
         pnl = [format_dp(zero_value(unrealized[0])), format_dp(balance)]
 
-        customframe = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ? AND symbol = ?",
-            remove_incomeTypes + [start, end, coin],
-            one=True,
-        )
-
         totals = [
-            format_dp(zero_value(total[0])),
-            format_dp(zero_value(today[0])),
-            format_dp(zero_value(week[0])),
-            format_dp(zero_value(month[0])),
+            format_dp(zero_value(total)),
+            format_dp(zero_value(today)),
+            format_dp(zero_value(week)),
+            format_dp(zero_value(month)),
             ranges[3],
             fees,
             percentages,
             pnl,
             datetime.now().strftime("%B"),
-            zero_value(customframe[0]),
+            zero_value(customframe),
         ]
 
     return render_template(
         "coin.html",
-        coin_list=get_coins(),
+        coin_list=coins,
         coin=coin,
         totals=totals,
         summary=[],
@@ -1184,6 +1093,7 @@ def coin_page_timeframe(coin, start, end):
         orders=[allpositions, allorders],
         lastupdate=get_lastupdate(),
         markprice=markPrice,
+        markprice_age=markPriceAge,
         startdate=startdate,
         enddate=enddate,
         timeranges=ranges,
@@ -1195,6 +1105,7 @@ def coin_page_timeframe(coin, start, end):
 
 @app.route("/history")
 def history_page():
+    account_sql, account_args = account_filter()
     ranges = timeranges()
     history: History = {"columns": []}
 
@@ -1208,8 +1119,10 @@ def history_page():
             * 1000
         )
         incomesummary = db.query(
-            "SELECT incomeType, COUNT(IID) FROM income WHERE time >= ? AND time <= ? GROUP BY incomeType",
-            [start, end],
+            "SELECT incomeType, COUNT(IID) FROM income WHERE time >= ? AND time <= ?"
+            + account_sql
+            + " GROUP BY incomeType",
+            [start, end] + account_args,
         )
         temp = timeframe[0] + "/" + timeframe[1]
         if temp not in history:
@@ -1247,6 +1160,7 @@ def history_page():
 
 @app.route("/history/<start>/<end>")
 def history_page_timeframe(start, end):
+    account_sql, account_args = account_filter()
     try:
         startdate, enddate = start, end
         start = (
@@ -1259,8 +1173,8 @@ def history_page_timeframe(start, end):
     ranges = timeranges()
 
     history = db.query(
-        "SELECT * FROM income WHERE time >= ? AND time <= ? ORDER BY time desc",
-        [start, end],
+        "SELECT * FROM income WHERE time >= ? AND time <= ?" + account_sql + " ORDER BY time desc",
+        [start, end] + account_args,
     )
 
     history_temp = []
@@ -1304,8 +1218,10 @@ def history_page_timeframe(start, end):
             * 1000
         )
         incomesummary = db.query(
-            "SELECT incomeType, COUNT(IID) FROM income WHERE time >= ? AND time <= ? GROUP BY incomeType",
-            [start, end],
+            "SELECT incomeType, COUNT(IID) FROM income WHERE time >= ? AND time <= ?"
+            + account_sql
+            + " GROUP BY incomeType",
+            [start, end] + account_args,
         )
         temp = timeframe[0] + "/" + timeframe[1]
         if temp not in history:
@@ -1346,7 +1262,11 @@ def history_page_timeframe(start, end):
 
 @app.route("/projection")
 def projection_page():
-    balance = db.query("SELECT totalWalletBalance FROM account WHERE AID = 1", one=True)
+    account = selected_account()
+    where_sql, where_args = account_filter("WHERE")
+    balance = db.query(
+        "SELECT SUM(totalWalletBalance) FROM account" + where_sql, where_args, one=True
+    )
     projections: Projections = {
         "dates": [],
         "proj": {},
@@ -1369,14 +1289,8 @@ def projection_page():
             * 1000
         )
 
-        week = db.query(
-            'SELECT SUM(income) FROM income WHERE asset <> "BNB" AND incomeType NOT IN'
-            + " ({0})".format(", ".join("?" for _ in remove_incomeTypes))
-            + " AND time >= ? AND time <= ?",
-            remove_incomeTypes + [minus_7_start, todayend],
-            one=True,
-        )
-        custom = round(week[0] / balance[0] * 100 / 7, 2)
+        week = equity.pnl(minus_7_start, todayend, account=account)
+        custom = round((week or 0) / balance[0] * 100 / 7, 2)
         projections["pcustom_value"] = custom
         today = date.today()
         x = 1
@@ -1402,7 +1316,7 @@ def projection_page():
             else:
                 newbalance = projections["pcustom"][-1]
 
-            projections["pcustom"].append(newbalance * (1 + (week[0] / balance[0]) / 7))
+            projections["pcustom"].append(newbalance * (1 + (week / balance[0]) / 7))
 
             x += 1
 
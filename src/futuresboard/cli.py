@@ -7,6 +7,8 @@ import sys
 
 import futuresboard.app
 import futuresboard.scraper
+import futuresboard.trigger
+import futuresboard.worker
 from futuresboard import __version__  # type: ignore[attr-defined]
 from futuresboard.config import Config
 from pydantic import IPvAnyInterface
@@ -33,6 +35,30 @@ def main():
         action="store_true",
         help="Disable the routines which scrape while the webservice is running",
     )
+    parser.add_argument(
+        "--scraper-process",
+        default=False,
+        action="store_true",
+        help="Run the scraper in a separate process supervised by the webservice",
+    )
+    parser.add_argument(
+        "--trigger-scrape",
+        default=False,
+        action="store_true",
+        help="Ask the running futuresboard to scrape now and follow the progress, Ctrl-C cancels",
+    )
+    parser.add_argument(
+        "--cancel-scrape",
+        default=False,
+        action="store_true",
+        help="Cancel the scrape triggered on the running futuresboard",
+    )
+    parser.add_argument(
+        "--rebuild-rollup",
+        default=False,
+        action="store_true",
+        help="Recompute the income totals the pages read from the stored income, then exit",
+    )
     server_settings = parser.add_argument_group("Server Settings")
     server_settings.add_argument(
         "--host",
@@ -56,6 +82,39 @@ def main():
     if not args.port:
         args.port = config.PORT
 
+    if args.trigger_scrape or args.cancel_scrape:
+        if not config.SCRAPE_TOKEN:
+            parser.error("SCRAPE_TOKEN must be configured to trigger a scrape")
+        host = args.host.ip
+        if host.is_unspecified:
+            host = host.__class__("::1" if host.version == 6 else "127.0.0.1")
+        url = f"http://{host}:{args.port}" if host.version == 4 else f"http://[{host}]:{args.port}"
+        try:
+            run = futuresboard.trigger.remote_scrape(
+                url, config.SCRAPE_TOKEN, cancel=args.cancel_scrape
+            )
+        except OSError as exc:
+            sys.exit(f"Could not reach futuresboard at {url}: {exc}")
+        failed = run is not None and run["status"] == "failed"
+        sys.exit(1 if failed else 0)
+
+    if args.rebuild_rollup:
+        futuresboard.scraper.db_setup(config.DATABASE)
+        conn = futuresboard.scraper.create_connection(config.DATABASE)
+        with conn:
+            days = futuresboard.scraper.rebuild_income_daily(conn)
+            nodes = futuresboard.scraper.rebuild_income_equity(conn)
+            symbols = futuresboard.scraper.rebuild_income_symbols(conn)
+        conn.close()
+        print(
+            f"Rebuilt the income rollup: {days} rows, running total: {nodes} rows, "
+            f"symbols: {symbols} rows"
+        )
+        sys.exit(0)
+
+    if args.scraper_process:
+        config.SCRAPER_PROCESS = True
+
     # Run the application
     app = futuresboard.app.init_app(config)
 
@@ -64,4 +123,7 @@ def main():
             futuresboard.scraper.scrape()
         sys.exit(0)
 
+    if config.SCRAPER_PROCESS:
+        futuresboard.worker.start_worker(app, config)
+
     app.run(host=args.host.ip.exploded, port=args.port)
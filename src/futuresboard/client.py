@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
+
+from futuresboard import codec
+from futuresboard.metrics import EXCHANGE_REQUEST_SECONDS
+from futuresboard.ratelimit import RATE_LIMIT_RETRIES
+from futuresboard.ratelimit import get_governor
+
+DEFAULT_TIMEOUT = 10
+POOL_SIZE = 10
+
+BINANCE_FUTURES_URL = "https://fapi.binance.com"
+
+# Bybit answers a request over its limit with HTTP 200 and this code in the body
+BYBIT_RATE_LIMIT_CODE = 10006
+
+_clients: dict[tuple[str, str, str], ExchangeClient] = {}
+_clients_lock = threading.Lock()
+
+
+def default_headers(exchange, api_key=""):
+    headers = {"Content-Type": "application/json;charset=utf-8"}
+    if not api_key:
+        return headers
+    if exchange == "bybit":
+        headers.update(
+            {
+                "X-BAPI-API-KEY": api_key,
+                "X-BAPI-SIGN-TYPE": "2",
+                "X-BAPI-RECV-WINDOW": "5000",
+            }
+        )
+    else:
+        headers["X-MBX-APIKEY"] = api_key
+    return headers
+
+
+class ExchangeClient:
+    """A long-lived HTTP client for one exchange API host.
+
+    The session keeps a pool of connections alive between calls, so consecutive requests
+    reuse an open TCP/TLS connection instead of performing a new handshake each time. Requests
+    the exchange turns down for going over its rate limits are sent again once the governor
+    lets them through.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        exchange="binance",
+        api_key="",
+        timeout=DEFAULT_TIMEOUT,
+        pool_size=POOL_SIZE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.exchange = exchange
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(default_headers(exchange, api_key))
+        self.governor = get_governor(exchange, self.base_url, api_key)
+
+    def url(self, url_path):
+        if url_path.startswith(("http://", "https://")):
+            return url_path
+        return f"{self.base_url}{url_path}"
+
+    def request(self, http_method, url_path, headers=None, timeout=None, **kwargs):
+        url = self.url(url_path)
+        endpoint = urlsplit(url).path
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            cost = self.governor.acquire(endpoint)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(
+                    http_method,
+                    url,
+                    headers=headers,
+                    timeout=timeout or self.timeout,
+                    **kwargs,
+                )
+            except Exception:
+                self.governor.observe(endpoint, {}, cost)
+                raise
+            EXCHANGE_REQUEST_SECONDS.observe(
+                self.exchange, endpoint, value=time.perf_counter() - start
+            )
+            self.governor.observe(endpoint, response.headers, cost)
+            if attempt == RATE_LIMIT_RETRIES or not self.rate_limited(response):
+                return response
+            self.governor.backoff(endpoint, attempt)
+
+    def rate_limited(self, response):
+        """Tell whether the exchange turned down ``response`` for going over a rate limit."""
+        if response.status_code == 429:
+            return True
+        # a rejected Bybit request leaves none to spare, which spares decoding every other body
+        if self.exchange == "bybit" and response.headers.get("X-Bapi-Limit-Status") == "0":
+            try:
+                return codec.response_json(response).get("retCode") == BYBIT_RATE_LIMIT_CODE
+            except (codec.JSONDecodeError, AttributeError):
+                return False
+        return False
+
+    def get(self, url_path, **kwargs):
+        return self.request("GET", url_path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def get_client(base_url=BINANCE_FUTURES_URL, exchange="binance", api_key=""):
+    """Return the shared client for ``base_url``, creating it on first use."""
+    key = (exchange, base_url, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = ExchangeClient(base_url, exchange=exchange, api_key=api_key)
+    return client
+
+
+def close_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
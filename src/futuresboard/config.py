@@ -31,6 +31,57 @@ class Exchanges(enum.Enum):
     BYBIT = "bybit"
 
 
+DEFAULT_ACCOUNT = "default"
+
+
+def default_api_base_url(exchange, test_mode):
+    if exchange == Exchanges.BINANCE:
+        if test_mode:
+            return "https://testnet.binancefuture.com"
+        return "https://fapi.binance.com"
+    if exchange == Exchanges.BYBIT:
+        if test_mode:
+            return "https://api-testnet.bybit.com"
+        return "https://api.bybit.com"
+    return None
+
+
+def default_stream_url(exchange, test_mode):
+    if exchange == Exchanges.BINANCE:
+        if test_mode:
+            return "wss://stream.binancefuture.com"
+        return "wss://fstream.binance.com"
+    if exchange == Exchanges.BYBIT:
+        if test_mode:
+            return "wss://stream-testnet.bybit.com/v5/private"
+        return "wss://stream.bybit.com/v5/private"
+    return None
+
+
+class Account(BaseModel):
+    NAME: str = Field(..., min_length=1, max_length=50, regex=r"^[A-Za-z0-9_.-]+$")
+    EXCHANGE: Exchanges = Exchanges.BINANCE
+    TEST_MODE: bool = False
+    API_BASE_URL: Optional[str]
+    STREAM_URL: Optional[str]
+    API_KEY: str
+    API_SECRET: str
+
+    @validator("API_BASE_URL", always=True)
+    @classmethod
+    def _validate_api_base_url(cls, value, values):
+        if not value and "EXCHANGE" in values:
+            value = default_api_base_url(values["EXCHANGE"], values["TEST_MODE"])
+        return value
+
+    @validator("STREAM_URL", always=True)
+    @classmethod
+    def _validate_stream_url(cls, value, values):
+        if not value and "EXCHANGE" in values:
+            value = default_stream_url(values["EXCHANGE"], values["TEST_MODE"])
+        return value
+
+
 class Custom(BaseModel):
     NAVBAR_TITLE: Optional[str] = Field("Futuresboard", min_length=1, max_length=50)
     NAVBAR_BG: Optional[NavbarBG] = NavbarBG.BG_DARK
@@ -57,12 +108,22 @@ class Config(BaseModel):
     EXCHANGE: Optional[Exchanges] = Exchanges.BINANCE
     TEST_MODE: Optional[bool] = False
     API_BASE_URL: Optional[str]
+    STREAM: bool = False
+    STREAM_URL: Optional[str]
     AUTO_SCRAPE_INTERVAL: int = 300
+    POSITIONS_SCRAPE_INTERVAL: int = Field(15, ge=5, le=3600)
+    BACKFILL_WORKERS: int = Field(4, ge=1, le=16)
+    MARK_PRICE_INTERVAL: int = Field(10, ge=1, le=3600)
+    KLINE_RETENTION_DAYS: int = Field(7, ge=1, le=365)
     DISABLE_AUTO_SCRAPE: bool = False
     HOST: Optional[IPvAnyInterface] = IPvAnyInterface.validate("0.0.0.0")  # type: ignore[assignment]
     PORT: Optional[int] = Field(5000, ge=1, le=65535)
-    API_KEY: str
-    API_SECRET: str
+    API_KEY: Optional[str]
+    API_SECRET: Optional[str]
+    ACCOUNTS: List[Account] = []
+    SCRAPE_WORKERS: int = Field(4, ge=1, le=16)
+    SCRAPE_TOKEN: Optional[str] = Field(None, min_length=16)
+    SCRAPER_PROCESS: bool = False
 
     CUSTOM: Optional[Custom] = Custom()
 
@@ -77,16 +138,14 @@ class Config(BaseModel):
     @classmethod
     def _validate_api_base_url(cls, value, values):
         if not value:
-            if values["EXCHANGE"] == Exchanges.BINANCE:
-                if values["TEST_MODE"]:
-                    value = "https://testnet.binancefuture.com"
-                else:
-                    value = "https://fapi.binance.com"
-            elif values["EXCHANGE"] == Exchanges.BYBIT:
-                if values["TEST_MODE"]:
-                    value = "https://api-testnet.bybit.com"
-                else:
-                    value = "https://api.bybit.com"
+            value = default_api_base_url(values["EXCHANGE"], values["TEST_MODE"])
+        return value
+
+    @validator("STREAM_URL", always=True)
+    @classmethod
+    def _validate_stream_url(cls, value, values):
+        if not value:
+            value = default_stream_url(values["EXCHANGE"], values["TEST_MODE"])
         return value
 
     @validator("AUTO_SCRAPE_INTERVAL")
@@ -98,10 +157,35 @@ class Config(BaseModel):
             raise ValueError("The upper allowed value is 3600")
         return value
 
+    @root_validator(skip_on_failure=True)
+    @classmethod
+    def _validate_accounts(cls, values):
+        if not values["ACCOUNTS"]:
+            if not values["API_KEY"] or not values["API_SECRET"]:
+                raise ValueError("Either API_KEY and API_SECRET or ACCOUNTS have to be set")
+            values["ACCOUNTS"] = [
+                Account(
+                    NAME=DEFAULT_ACCOUNT,
+                    EXCHANGE=values["EXCHANGE"],
+                    TEST_MODE=values["TEST_MODE"],
+                    API_BASE_URL=values["API_BASE_URL"],
+                    STREAM_URL=values["STREAM_URL"],
+                    API_KEY=values["API_KEY"],
+                    API_SECRET=values["API_SECRET"],
+                )
+            ]
+        names = [account.NAME for account in values["ACCOUNTS"]]
+        if len(set(names)) != len(names):
+            raise ValueError("The NAME of every account has to be unique")
+        return values
+
     @root_validator(pre=True)
     @classmethod
     def _capitalize_all_keys(cls, fields):
         def _capitalize_keys(c):
+            if isinstance(c, list):
+                for item in c:
+                    _capitalize_keys(item)
             if not isinstance(c, dict):
                 return c
             for key, value in copy.deepcopy(c).items():
@@ -117,6 +201,12 @@ class Config(BaseModel):
             if not key.isupper():
                 fields.pop(key)
 
+        # without an exchange of its own, market data comes from the first account's exchange
+        accounts = fields.get("ACCOUNTS")
+        if accounts and isinstance(accounts[0], dict) and "EXCHANGE" not in fields:
+            fields["EXCHANGE"] = accounts[0].get("EXCHANGE", Exchanges.BINANCE.value)
+            fields.setdefault("TEST_MODE", accounts[0].get("TEST_MODE", False))
+
         return fields
 
     @classmethod
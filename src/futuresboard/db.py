@@ -1,37 +1,100 @@
 from __future__ import annotations
 
 import sqlite3
+import threading
+import time
 
 from flask import current_app
 from flask import g
 
+from futuresboard.metrics import observe_query
+
+EXTENSION = "futuresboard.db"
+
+# Idle connections kept open; a busier moment opens more and closes the extra ones afterwards
+POOL_SIZE = 8
+# Read connection settings: pages never write, the file is shared with the scraper in WAL mode
+READ_PRAGMAS = (
+    ("busy_timeout", 5000),  # milliseconds
+    ("journal_mode", "WAL"),
+    ("query_only", 1),
+    ("cache_size", -16000),  # KiB
+    ("mmap_size", 256 * 1024 * 1024),
+)
+
+
+class ConnectionPool:
+    """Read-only connections to the database, opened once and shared by the requests.
+
+    A request takes a connection for its lifetime and gives it back on teardown. Connections
+    are not tied to a thread, but only one request uses a connection at a time.
+    """
+
+    def __init__(self, database, size=POOL_SIZE):
+        self.database = database
+        self.size = size
+        self.lock = threading.Lock()
+        self.idle: list[sqlite3.Connection] = []
+
+    def connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        for pragma, value in READ_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return self.connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+def get_pool(app=None):
+    if app is None:
+        app = current_app
+    return app.extensions[EXTENSION]
+
 
 def get_db():
-    """Connect to the application's configured database. The connection
-    is unique for each request and will be reused if this is called
-    again.
+    """Return the database connection of the current request. It is taken from the pool on
+    first use and will be reused if this is called again.
     """
     if "db" not in g:
-        g.db = sqlite3.connect(current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES)
-        g.db.row_factory = sqlite3.Row
+        g.db = get_pool().acquire()
 
     return g.db
 
 
 def close_db(e=None):
-    """If this request connected to the database, close the
-    connection.
-    """
+    """If this request used a database connection, return it to the pool."""
     db = g.pop("db", None)
 
     if db is not None:
-        db.close()
+        get_pool().release(db)
 
 
 def query(query, args=(), one=False):
+    start = time.perf_counter()
     cur = get_db().execute(query, args)
     rv = cur.fetchall()
     cur.close()
+    observe_query(time.perf_counter() - start)
     return (rv[0] if rv else None) if one else rv
 
 
@@ -39,4 +102,5 @@ def init_app(app):
     """Register database functions with the Flask app. This is called by
     the application factory.
     """
+    app.extensions[EXTENSION] = ConnectionPool(app.config["DATABASE"])
     app.teardown_appcontext(close_db)
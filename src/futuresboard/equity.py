@@ -0,0 +1,94 @@
+"""Profit and loss of whole accounts from the running income total.
+
+The ``income_equity`` table keeps the profit and loss of every account summed up to each UTC day,
+which the scraper updates as it stores income. The total up to any time is read from it with a
+handful of lookups, along with the income of that day up to the time, however long the history.
+"""
+from __future__ import annotations
+
+from datetime import date
+
+from futuresboard import db
+from futuresboard.scraper import EQUITY_DAYS
+from futuresboard.scraper import EQUITY_LEVELS
+from futuresboard.scraper import NON_PNL_INCOME_TYPES
+from futuresboard.scraper import ROLLUP_DAY
+from futuresboard.scraper import SQL_EQUITY_LEVELS
+
+EPOCH = date(1970, 1, 1)
+
+
+def _days(day, account):
+    """Return the SQL and arguments of the total of the days before the day numbered ``day``."""
+    sql = (
+        "SELECT COALESCE(SUM(income), 0) FROM income_equity WHERE node IN "
+        f"(SELECT (? >> column1) << column1 FROM ({SQL_EQUITY_LEVELS}))"
+    )
+    if account is None:
+        return sql, [day]
+    return f"{sql} AND account = ?", [day, account]
+
+
+def _until(time, inclusive, account):
+    """Return the SQL and arguments of the total of the income before ``time``, or up to it when
+    ``inclusive``."""
+    day = int(time // ROLLUP_DAY)
+    days_sql, args = _days(day, account)
+    sql = (
+        "SELECT COALESCE(SUM(income), 0) FROM income "
+        f"WHERE time >= ? AND time {'<=' if inclusive else '<'} ? AND asset <> 'BNB' "
+        f"AND incomeType NOT IN ({', '.join('?' for _ in NON_PNL_INCOME_TYPES)})"
+    )
+    args += [day * ROLLUP_DAY, time, *NON_PNL_INCOME_TYPES]
+    if account is not None:
+        # not a term for an index: an account has most of the rows of a day
+        sql += " AND +account = ?"
+        args.append(account)
+    return f"({days_sql}) + ({sql})", args
+
+
+def rounded(value):
+    # income has eight decimals, a difference of two totals has float noise beyond them
+    return round(value, 8) + 0.0
+
+
+def pnl_sql(start=None, end=None, account=None):
+    """Return the SQL expression and arguments of the profit and loss from ``start`` to ``end``,
+    both included, of all time without them."""
+    end_sql, end_args = (
+        _days(EQUITY_DAYS, account) if end is None else _until(end, True, account)
+    )
+    if start is None:
+        return f"({end_sql})", end_args
+    start_sql, start_args = _until(start, False, account)
+    return f"({end_sql}) - ({start_sql})", end_args + start_args
+
+
+def pnl(start=None, end=None, account=None):
+    """Return the profit and loss from ``start`` to ``end``, both included, of all time without
+    them."""
+    sql, args = pnl_sql(start, end, account)
+    return rounded(db.query(f"SELECT {sql}", args, one=True)[0])
+
+
+def _nodes(day):
+    """Return the nodes adding up to the total of the days before the day numbered ``day``."""
+    return {day >> level << level for level in range(EQUITY_LEVELS)} - {0}
+
+
+def by_date(dates, account=None):
+    """Return the profit and loss of all time up to the end of each of the UTC ``dates``."""
+    days = [(date.fromisoformat(each) - EPOCH).days + 1 for each in dates]
+    nodes = set().union(*map(_nodes, days))
+    if not nodes:
+        return []
+    sql = (
+        "SELECT node, SUM(income) FROM income_equity "
+        f"WHERE node IN ({', '.join('?' for _ in nodes)})"
+    )
+    args = list(nodes)
+    if account is not None:
+        sql += " AND account = ?"
+        args.append(account)
+    totals = dict(db.query(f"{sql} GROUP BY node", args))
+    return [rounded(sum(totals.get(node, 0) for node in _nodes(day))) for day in days]
@@ -0,0 +1,512 @@
+"""A local stand-in for the exchange REST endpoints the scraper uses, serving synthetic data.
+
+Start it with ``python -m futuresboard.fakes.exchange --income-rows 100000`` and point
+``API_BASE_URL`` at the printed address. The same server answers the Binance and the Bybit
+endpoints, the market data of the coin pages included, so either exchange can be scraped from
+it. Keys and signatures are not checked.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from urllib.parse import urlsplit
+
+from futuresboard.klines import BYBIT_INTERVALS
+from futuresboard.klines import CANDLE_LIMIT
+from futuresboard.klines import INTERVALS
+from futuresboard.ratelimit import ENDPOINT_WEIGHTS
+from futuresboard.scraper import BACKFILL_START
+
+DAY = 24 * 60 * 60 * 1000
+# Binance weight budget per minute, and Bybit requests per second and endpoint
+BINANCE_WEIGHT_LIMIT = 1200
+BYBIT_ENDPOINT_LIMIT = 10
+# Longest time range, and largest page, Bybit serves closed PnL for
+BYBIT_CLOSED_PNL_RANGE = 7 * DAY
+BYBIT_CLOSED_PNL_LIMIT = 100
+BINANCE_INCOME_LIMIT = 1000
+INCOME_TYPES = ("REALIZED_PNL", "COMMISSION", "FUNDING_FEE")
+
+
+def symbol_names(count):
+    names = ["BTCUSDT", "ETHUSDT", "XRPUSDT", "SOLUSDT", "BNBUSDT"][:count]
+    names.extend(f"ALT{index}USDT" for index in range(len(names), count))
+    return names
+
+
+class FakeExchangeServer(ThreadingHTTPServer):
+    """Serves a synthetic account holding ``symbols`` contracts.
+
+    The first ``open_positions`` symbols have an open position with ``orders`` open orders each.
+    Binance has ``income_rows`` income records spread evenly from the start of the backfill until
+    now, and Bybit ``closed_pnl_per_day`` closed trades per symbol and day over the last
+    ``history_days``. The data follows from these numbers, so a history of millions of rows
+    costs no memory.
+
+    Every response is delayed by ``latency`` seconds and a share ``error_rate`` of them is an
+    error. The rate limits of both exchanges are tracked on ``clock``, a wall clock in seconds.
+    They are reported in the usual headers when ``weight_headers`` is set, and enforced by
+    rejecting the requests over them.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        symbols=5,
+        open_positions=1,
+        orders=1,
+        income_rows=10_000,
+        closed_pnl_per_day=4,
+        history_days=730,
+        latency=0.0,
+        error_rate=0.0,
+        weight_headers=True,
+        seed=0,
+        clock=time.time,
+    ):
+        super().__init__(address, _ExchangeHandler)
+        self.symbols = symbol_names(symbols)
+        self.open_positions = min(open_positions, symbols)
+        self.orders = orders
+        self.now = int(time.time() * 1000)
+        self.income_rows = income_rows
+        self.income_spacing = max(1, (self.now - BACKFILL_START) // max(income_rows, 1))
+        self.closed_pnl_spacing = DAY // max(closed_pnl_per_day, 1)
+        self.closed_pnl_rows = history_days * closed_pnl_per_day if closed_pnl_per_day else 0
+        self.latency = latency
+        self.error_rate = error_rate
+        self.weight_headers = weight_headers
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.errors = 0
+        self.rejected = 0
+        self._binance_window = (0, 0)
+        self._bybit_windows: dict[str, tuple[int, int]] = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def add_income(self, rows):
+        """Append ``rows`` new Binance income records after the existing ones."""
+        with self.lock:
+            self.income_rows += rows
+
+    # rate limits
+    def binance_weight(self, path):
+        """Spend the weight of a request to ``path``, returning the weight used this minute and
+        whether the request fits within the limit."""
+        weight = ENDPOINT_WEIGHTS["binance"].get(path, 1)
+        minute = int(self.clock() // 60)
+        with self.lock:
+            window, used = self._binance_window
+            if window != minute:
+                used = 0
+            used += weight
+            self._binance_window = (minute, used)
+        return used, used <= BINANCE_WEIGHT_LIMIT
+
+    def bybit_remaining(self, path):
+        """Count a request to ``path``, returning the requests left this second and when the
+        next second starts."""
+        second = int(self.clock())
+        with self.lock:
+            window, used = self._bybit_windows.get(path, (0, 0))
+            if window != second:
+                used = 0
+            used += 1
+            self._bybit_windows[path] = (second, used)
+        return BYBIT_ENDPOINT_LIMIT - used, (second + 1) * 1000
+
+    # market data
+    def mark_price(self, symbol):
+        return 100.0 + self.symbols.index(symbol) % 50
+
+    def candles(self, interval, start, limit):
+        """Return (openTime, open, high, low, close, volume) candles of ``interval``, oldest first,
+        from ``start`` onwards or the latest ones without it."""
+        length = INTERVALS[interval]
+        latest = self.now // length * length
+        first = latest - (limit - 1) * length if start is None else -(-start // length) * length
+        candles = []
+        for open_time in range(first, min(latest, first + (limit - 1) * length) + 1, length):
+            base = 100.0 + (open_time // length) % 50 / 10
+            candles.append((open_time, base, base + 0.5, base - 0.5, base + 0.2, 1000.0))
+        return candles
+
+    # Binance
+    def binance_positions(self):
+        positions = []
+        for index, symbol in enumerate(self.symbols):
+            is_open = index < self.open_positions
+            positions.append(
+                {
+                    "symbol": symbol,
+                    "positionSide": "LONG" if is_open else "BOTH",
+                    "positionAmt": "0.5" if is_open else "0",
+                    "entryPrice": "100.0" if is_open else "0.0",
+                    "unrealizedProfit": "1.25" if is_open else "0",
+                    "leverage": "10",
+                }
+            )
+        return positions
+
+    def binance_account(self):
+        return {
+            "totalWalletBalance": "1000.0",
+            "totalUnrealizedProfit": f"{1.25 * self.open_positions}",
+            "totalMarginBalance": "1000.0",
+            "availableBalance": "900.0",
+            "maxWithdrawAmount": "900.0",
+            "positions": self.binance_positions(),
+        }
+
+    def binance_orders(self):
+        return [
+            {
+                "symbol": symbol,
+                "origQty": "0.5",
+                "price": f"{90.0 - number}",
+                "side": "BUY",
+                "positionSide": "LONG",
+                "status": "NEW",
+                "time": self.now - number * 60_000,
+                "type": "LIMIT",
+            }
+            for symbol in self.symbols[: self.open_positions]
+            for number in range(self.orders)
+        ]
+
+    def binance_income(self, params):
+        start = int(params.get("startTime", BACKFILL_START))
+        end = int(params.get("endTime", 2**62))
+        limit = min(int(params.get("limit", 100)), BINANCE_INCOME_LIMIT)
+        spacing = self.income_spacing
+        first = max(0, -(-(start - BACKFILL_START) // spacing))
+        last = min(self.income_rows - 1, (end - BACKFILL_START) // spacing)
+        return [
+            {
+                "symbol": self.symbols[index % len(self.symbols)],
+                "incomeType": INCOME_TYPES[index % len(INCOME_TYPES)],
+                "income": f"{(index % 200 - 100) / 100:.2f}",
+                "asset": "USDT",
+                "info": "",
+                "time": BACKFILL_START + index * spacing,
+                "tranId": index + 1,
+                "tradeId": str(index + 1),
+            }
+            for index in range(first, min(last + 1, first + limit))
+        ]
+
+    def binance_mark_prices(self):
+        return [
+            {
+                "symbol": symbol,
+                "markPrice": f"{self.mark_price(symbol):.8f}",
+                "indexPrice": f"{self.mark_price(symbol):.8f}",
+                "estimatedSettlePrice": f"{self.mark_price(symbol):.8f}",
+                "lastFundingRate": "0.00010000",
+                "interestRate": "0.00010000",
+                "nextFundingTime": self.now // (8 * 3600_000) * 8 * 3600_000 + 8 * 3600_000,
+                "time": self.now,
+            }
+            for symbol in self.symbols
+        ]
+
+    def binance_klines(self, params):
+        start = int(params["startTime"]) if "startTime" in params else None
+        limit = min(int(params.get("limit", 500)), CANDLE_LIMIT)
+        length = INTERVALS[params["interval"]]
+        return [
+            [
+                open_time,
+                f"{open:.2f}",
+                f"{high:.2f}",
+                f"{low:.2f}",
+                f"{close:.2f}",
+                f"{volume:.3f}",
+                open_time + length - 1,
+                f"{volume * close:.5f}",
+                100,
+                f"{volume / 2:.3f}",
+                f"{volume * close / 2:.5f}",
+                "0",
+            ]
+            for open_time, open, high, low, close, volume in self.candles(
+                params["interval"], start, limit
+            )
+        ]
+
+    # Bybit
+    def bybit_positions(self):
+        positions = []
+        for index, symbol in enumerate(self.symbols):
+            is_open = index < self.open_positions
+            positions.append(
+                {
+                    "symbol": symbol,
+                    "side": "Buy" if is_open else "None",
+                    "size": "0.5" if is_open else "0",
+                    "avgPrice": "100.0" if is_open else "0",
+                    "unrealisedPnl": "1.25" if is_open else "0",
+                    "leverage": "10",
+                    "positionIdx": 0,
+                }
+            )
+        return {"list": positions, "nextPageCursor": ""}
+
+    def bybit_orders(self, params):
+        symbol = params.get("symbol")
+        if symbol not in self.symbols[: self.open_positions]:
+            return {"list": [], "nextPageCursor": ""}
+        return {
+            "list": [
+                {
+                    "symbol": symbol,
+                    "qty": "0.5",
+                    "price": f"{90.0 - number}",
+                    "side": "Buy",
+                    "orderStatus": "New",
+                    "createdTime": str(self.now - number * 60_000),
+                    "orderType": "Limit",
+                    "positionIdx": 0,
+                }
+                for number in range(self.orders)
+            ],
+            "nextPageCursor": "",
+        }
+
+    def bybit_wallet(self):
+        return {
+            "list": [
+                {
+                    "totalMaintenanceMargin": "",
+                    "coin": [
+                        {
+                            "coin": "USDT",
+                            "walletBalance": "1000.0",
+                            "unrealisedPnl": f"{1.25 * self.open_positions}",
+                            "availableToWithdraw": "900.0",
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def bybit_tickers(self):
+        return {
+            "category": "linear",
+            "list": [
+                {
+                    "symbol": symbol,
+                    "lastPrice": f"{self.mark_price(symbol):.2f}",
+                    "markPrice": f"{self.mark_price(symbol):.2f}",
+                    "indexPrice": f"{self.mark_price(symbol):.2f}",
+                    "fundingRate": "0.0001",
+                    "volume24h": "1000.000",
+                }
+                for symbol in self.symbols
+            ],
+        }
+
+    def bybit_klines(self, params):
+        interval = {code: name for name, code in BYBIT_INTERVALS.items()}[params["interval"]]
+        start = int(params["start"]) if "start" in params else None
+        limit = min(int(params.get("limit", 200)), CANDLE_LIMIT)
+        candles = self.candles(interval, start, limit)
+        return {
+            "category": "linear",
+            "symbol": params["symbol"],
+            "list": [
+                [
+                    str(open_time),
+                    f"{open:.2f}",
+                    f"{high:.2f}",
+                    f"{low:.2f}",
+                    f"{close:.2f}",
+                    f"{volume:.3f}",
+                    f"{volume * close:.5f}",
+                ]
+                for open_time, open, high, low, close, volume in reversed(candles)
+            ],
+        }
+
+    def bybit_closed_pnl(self, params):
+        """Return a page of closed trades, newest first, or None for a range Bybit rejects."""
+        symbol = params["symbol"]
+        start, end = int(params["startTime"]), int(params["endTime"])
+        if end < start or end - start > BYBIT_CLOSED_PNL_RANGE:
+            return None
+        limit = min(int(params.get("limit", 50)), BYBIT_CLOSED_PNL_LIMIT)
+        offset = int(params.get("cursor") or 0)
+        spacing = self.closed_pnl_spacing
+        first = max(0, -(-(self.now - end) // spacing))
+        last = min(self.closed_pnl_rows - 1, (self.now - start) // spacing)
+        indexes = range(first + offset, min(last + 1, first + offset + limit))
+        trades = [
+            {
+                "symbol": symbol,
+                "orderId": f"{symbol}-{index}",
+                "execType": "Trade",
+                "closedPnl": f"{(index % 200 - 100) / 100:.2f}",
+                "createdTime": str(self.now - index * spacing),
+            }
+            for index in indexes
+        ]
+        more = indexes.stop <= last
+        return {"list": trades, "nextPageCursor": str(offset + limit) if more else ""}
+
+
+class _ExchangeHandler(BaseHTTPRequestHandler):
+    server: FakeExchangeServer
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, which Nagle's algorithm would hold back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        server = self.server
+        with server.lock:
+            server.requests[url.path] += 1
+            failed = server.error_rate and server.random.random() < server.error_rate
+        if server.latency:
+            time.sleep(server.latency)
+        if url.path.startswith("/v5/"):
+            self._bybit(url.path, params, failed)
+        else:
+            self._binance(url.path, params, failed)
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _binance(self, path, params, failed):
+        server = self.server
+        used, allowed = server.binance_weight(path)
+        headers = {"X-MBX-USED-WEIGHT-1M": str(used)} if server.weight_headers else {}
+        if not allowed:
+            with server.lock:
+                server.rejected += 1
+            headers["Retry-After"] = str(60 - int(server.clock()) % 60)
+            return self._send(429, {"code": -1003, "msg": "Too many requests."}, headers)
+        if failed:
+            with server.lock:
+                server.errors += 1
+            return self._send(500, {"code": -1001, "msg": "Internal error."}, headers)
+
+        if path == "/fapi/v1/openOrders":
+            body = server.binance_orders()
+        elif path == "/fapi/v2/account":
+            body = server.binance_account()
+        elif path == "/fapi/v1/income":
+            body = server.binance_income(params)
+        elif path == "/fapi/v1/premiumIndex":
+            body = server.binance_mark_prices()
+        elif path == "/fapi/v1/klines":
+            body = server.binance_klines(params)
+        else:
+            return self._send(404, {"code": -5000, "msg": f"Unknown path {path}"}, headers)
+        self._send(200, body, headers)
+
+    def _bybit(self, path, params, failed):
+        server = self.server
+        remaining, reset = server.bybit_remaining(path)
+        headers = {}
+        if server.weight_headers:
+            headers = {
+                "X-Bapi-Limit": str(BYBIT_ENDPOINT_LIMIT),
+                "X-Bapi-Limit-Status": str(max(remaining, 0)),
+                "X-Bapi-Limit-Reset-Timestamp": str(reset),
+            }
+        if remaining < 0:
+            with server.lock:
+                server.rejected += 1
+            return self._send(200, {"retCode": 10006, "retMsg": "Too many visits!"}, headers)
+        if failed:
+            with server.lock:
+                server.errors += 1
+            return self._send(200, {"retCode": 10016, "retMsg": "Internal error."}, headers)
+
+        if path == "/v5/position/list":
+            result = server.bybit_positions()
+        elif path == "/v5/order/realtime":
+            result = server.bybit_orders(params)
+        elif path == "/v5/account/wallet-balance":
+            result = server.bybit_wallet()
+        elif path == "/v5/market/tickers":
+            result = server.bybit_tickers()
+        elif path == "/v5/market/kline":
+            result = server.bybit_klines(params)
+        elif path == "/v5/position/closed-pnl":
+            result = server.bybit_closed_pnl(params)
+            if result is None:
+                body = {"retCode": 10001, "retMsg": "The time range is more than 7 days."}
+                return self._send(200, body, headers)
+        else:
+            return self._send(404, {"retCode": 10005, "retMsg": f"Unknown path {path}"}, headers)
+        self._send(200, {"retCode": 0, "retMsg": "OK", "result": result}, headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--symbols", type=int, default=5)
+    parser.add_argument("--open-positions", type=int, default=1)
+    parser.add_argument("--orders", type=int, default=1, help="Open orders per position")
+    parser.add_argument("--income-rows", type=int, default=10_000)
+    parser.add_argument("--closed-pnl-per-day", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to responses")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of failed requests")
+    parser.add_argument("--no-weight-headers", action="store_true")
+    args = parser.parse_args()
+
+    server = FakeExchangeServer(
+        (args.host, args.port),
+        symbols=args.symbols,
+        open_positions=args.open_positions,
+        orders=args.orders,
+        income_rows=args.income_rows,
+        closed_pnl_per_day=args.closed_pnl_per_day,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        weight_headers=not args.no_weight_headers,
+    )
+    print(f"Serving a fake exchange account on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""A local stand-in for the exchange account streams which replays recorded events.
+
+Start it with ``python -m futuresboard.fakes.stream binance`` (or ``bybit``) and point
+``STREAM_URL`` at the printed address. For Binance, ``API_BASE_URL`` has to point at it as well,
+since it also answers the listen key requests.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import socketserver
+import threading
+import time
+
+from futuresboard.ws import WebSocket
+from futuresboard.ws import WebSocketClosed
+from futuresboard.ws import accept_key
+from futuresboard.ws import read_headers
+
+FIXTURES = pathlib.Path(__file__).resolve().parent / "fixtures"
+FIXTURE_FILES = {
+    "binance": FIXTURES / "binance_user_data.jsonl",
+    "bybit": FIXTURES / "bybit_private.jsonl",
+}
+
+
+def load_events(path):
+    with open(path) as rfh:
+        return [json.loads(line) for line in rfh if line.strip()]
+
+
+class FakeStreamServer(socketserver.ThreadingTCPServer):
+    """Replays ``events`` to every WebSocket client, ``interval`` seconds apart."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, events, address=("127.0.0.1", 0), interval=0.0):
+        super().__init__(address, _StreamHandler)
+        self.events = events
+        self.interval = interval
+        self.connections = 0
+        self.replayed = threading.Event()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+    server: FakeStreamServer
+
+    def handle(self):
+        request_line = self.rfile.readline().decode("latin-1")
+        headers = read_headers(self.rfile)
+        if headers.get("upgrade", "").lower() != "websocket":
+            # Binance listen key management: POST creates one, PUT keeps it alive
+            body = json.dumps({"listenKey": "fake-listen-key"} if request_line.startswith("POST") else {})
+            self.wfile.write(
+                (
+                    "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n{body}"
+                ).encode()
+            )
+            return
+
+        self.wfile.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept_key(headers['sec-websocket-key'])}\r\n\r\n"
+            ).encode()
+        )
+        self.server.connections += 1
+        websocket = WebSocket(self.connection, mask=False, rfile=self.rfile)
+        responder = threading.Thread(target=self._respond, args=(websocket,))
+        responder.daemon = True
+        responder.start()
+        try:
+            for event in self.server.events:
+                if self.server.interval:
+                    time.sleep(self.server.interval)
+                websocket.send(json.dumps(event))
+            self.server.replayed.set()
+            responder.join()
+        except OSError:
+            pass
+
+    def _respond(self, websocket):
+        # Answer the Bybit auth, subscribe and ping requests until the client goes away
+        try:
+            while True:
+                request = json.loads(websocket.recv())
+                op = request.get("op")
+                if op == "ping":
+                    websocket.send(json.dumps({"op": "pong", "success": True}))
+                else:
+                    websocket.send(json.dumps({"op": op, "success": True, "ret_msg": ""}))
+        except (WebSocketClosed, OSError, ValueError):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("exchange", choices=sorted(FIXTURE_FILES))
+    parser.add_argument("--fixture", type=pathlib.Path, default=None)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between events")
+    args = parser.parse_args()
+
+    events = load_events(args.fixture or FIXTURE_FILES[args.exchange])
+    server = FakeStreamServer(events, (args.host, args.port), interval=args.interval)
+    print(f"Replaying {len(events)} {args.exchange} events on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
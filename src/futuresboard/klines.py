@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+
+import requests  # type: ignore
+from flask import current_app
+
+from futuresboard import codec
+from futuresboard.client import get_client
+
+EXTENSION = "futuresboard.klines"
+# Chart timeframes and their candle length in milliseconds
+INTERVALS = {
+    "15m": 15 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+BYBIT_INTERVALS = {"15m": "15", "1h": "60", "4h": "240", "1d": "D"}
+# Candles kept, and drawn, per symbol and timeframe
+CANDLE_LIMIT = 1000
+# The candles of the charts being viewed are brought up to date this often, in milliseconds,
+# which is also as often as the candle that is still open is fetched again
+OPEN_CANDLE_REFRESH = 60 * 1000
+# A chart is kept up to date for this long after it was last viewed, in milliseconds
+WATCH_PERIOD = 15 * 60 * 1000
+# How long a view of a chart that is not kept up to date waits for its candles, the old
+# per-request timeout
+FIRST_REFRESH_TIMEOUT = 2
+
+_lock = threading.Lock()
+
+SQL_CREATE_KLINES = """ CREATE TABLE IF NOT EXISTS klines (
+                            symbol text,
+                            interval text,
+                            openTime integer,
+                            open real,
+                            high real,
+                            low real,
+                            close real,
+                            volume real,
+                            PRIMARY KEY(symbol, interval, openTime)
+                        ) WITHOUT ROWID; """
+SQL_CREATE_KLINE_STATE = """ CREATE TABLE IF NOT EXISTS kline_state (
+                                symbol text,
+                                interval text,
+                                fetched integer,
+                                PRIMARY KEY(symbol, interval)
+                            ); """
+
+
+def fetch_klines(client, symbol, interval, start=None):
+    """Download up to ``CANDLE_LIMIT`` candles from ``start`` onwards, or the latest ones without it.
+
+    Candles are returned oldest first as (openTime, open, high, low, close, volume).
+    """
+    if client.exchange == "bybit":
+        params = {
+            "category": "linear",
+            "symbol": symbol,
+            "interval": BYBIT_INTERVALS[interval],
+            "limit": CANDLE_LIMIT,
+        }
+        if start is not None:
+            params["start"] = start
+        response = client.get("/v5/market/kline", params=params, timeout=2)
+        response.raise_for_status()
+        candles = reversed(codec.response_json(response)["result"]["list"])
+    else:
+        params = {"symbol": symbol, "interval": interval, "limit": CANDLE_LIMIT}
+        if start is not None:
+            params["startTime"] = start
+        response = client.get("/fapi/v1/klines", params=params, timeout=2)
+        response.raise_for_status()
+        candles = codec.response_json(response)
+    return [
+        (
+            int(candle[0]),
+            float(candle[1]),
+            float(candle[2]),
+            float(candle[3]),
+            float(candle[4]),
+            float(candle[5]),
+        )
+        for candle in candles
+    ]
+
+
+class KlineStore:
+    """Candlesticks kept in the database and brought up to date by a background thread, so coin
+    pages only ever read them.
+
+    Viewing the chart of a symbol has the thread fetch the candles it misses, and keep fetching
+    the new ones every ``OPEN_CANDLE_REFRESH`` milliseconds for as long as the chart is viewed.
+    Only the first view after a while waits for those candles, and not longer than
+    ``FIRST_REFRESH_TIMEOUT``. The store writes through its own connection, which ``lock``
+    guards along with the charts being viewed. Symbols whose charts have not been viewed for
+    ``retention`` milliseconds are dropped.
+    """
+
+    def __init__(self, database, client, retention, interval=OPEN_CANDLE_REFRESH):
+        self.client = client
+        self.retention = retention
+        self.interval = interval
+        self.lock = threading.Lock()
+        # when the chart of each symbol kept up to date was last viewed, in milliseconds, and
+        # whether its candles were fetched since it is kept up to date
+        self.viewed: dict[str, int] = {}
+        self.ready: dict[str, threading.Event] = {}
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.conn = sqlite3.connect(database, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(SQL_CREATE_KLINES)
+            self.conn.execute(SQL_CREATE_KLINE_STATE)
+
+    def candles(self, symbol, interval):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT openTime, open, high, low, close, volume FROM klines WHERE symbol = ? AND interval = ? ORDER BY openTime DESC LIMIT 0, ?",
+                (symbol, interval, CANDLE_LIMIT),
+            ).fetchall()
+        rows.reverse()
+        return rows
+
+    def view(self, symbol):
+        """Keep the candles of ``symbol`` up to date, returning an event set once they are."""
+        with self.lock:
+            self.viewed[symbol] = int(time.time() * 1000)
+            ready = self.ready.get(symbol)
+            if ready is None:
+                ready = self.ready[symbol] = threading.Event()
+                self.wake.set()
+        return ready
+
+    def chart(self, symbol):
+        """Return the stored candles of every timeframe as the points of the coin page charts."""
+        self.view(symbol).wait(FIRST_REFRESH_TIMEOUT)
+        return {
+            interval: [
+                {"x": candle[0], "o": candle[1], "h": candle[2], "l": candle[3], "c": candle[4]}
+                for candle in self.candles(symbol, interval)
+            ]
+            for interval in INTERVALS
+        }
+
+    def refresh_viewed(self, logger):
+        """Bring the candles of every chart viewed lately up to date, forgetting the others."""
+        now = int(time.time() * 1000)
+        with self.lock:
+            for symbol, viewed in list(self.viewed.items()):
+                if now - viewed > WATCH_PERIOD:
+                    del self.viewed[symbol]
+                    del self.ready[symbol]
+            ready = dict(self.ready)
+        for symbol, event in ready.items():
+            for interval in INTERVALS:
+                try:
+                    self.refresh(symbol, interval)
+                except (requests.RequestException, ValueError, KeyError) as exc:
+                    logger.warning(f"Could not update {interval} candles of {symbol}: {exc}")
+            event.set()
+
+    def run(self, logger):
+        while not self.stopped.is_set():
+            self.wake.clear()
+            try:
+                self.refresh_viewed(logger)
+            except Exception as exc:
+                logger.warning(f"Candle refresh failed: {exc}")
+            self.wake.wait(self.interval / 1000)
+
+    def start(self, logger):
+        thread = threading.Thread(target=self.run, args=(logger,))
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def refresh(self, symbol, interval):
+        """Fetch the candles newer than the latest stored one, when there can be any."""
+        length = INTERVALS[interval]
+        now = int(time.time() * 1000)
+        with self.lock:
+            latest, fetched = self.conn.execute(
+                "SELECT MAX(openTime), (SELECT fetched FROM kline_state WHERE symbol = ? AND interval = ?) FROM klines WHERE symbol = ? AND interval = ?",
+                (symbol, interval, symbol, interval),
+            ).fetchone()
+        if latest is not None and latest + length > now:
+            if now - (fetched or 0) < self.interval:
+                return
+        if latest is not None and (now - latest) // length >= CANDLE_LIMIT:
+            # too far behind to catch up within one request, start over from the latest candles
+            latest = None
+
+        candles = fetch_klines(self.client, symbol, interval, latest)
+        with self.lock, self.conn:
+            if latest is None:
+                self.conn.execute(
+                    "DELETE FROM klines WHERE symbol = ? AND interval = ?", (symbol, interval)
+                )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO klines VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(symbol, interval, *candle) for candle in candles],
+            )
+            if candles:
+                self.conn.execute(
+                    "DELETE FROM klines WHERE symbol = ? AND interval = ? AND openTime <= ?",
+                    (symbol, interval, candles[-1][0] - CANDLE_LIMIT * length),
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO kline_state VALUES (?, ?, ?)", (symbol, interval, now)
+            )
+            self.evict(now)
+
+    def evict(self, now):
+        expired = self.conn.execute(
+            "SELECT symbol FROM kline_state GROUP BY symbol HAVING MAX(fetched) < ?",
+            (now - self.retention,),
+        ).fetchall()
+        if expired:
+            self.conn.executemany("DELETE FROM klines WHERE symbol = ?", expired)
+            self.conn.executemany("DELETE FROM kline_state WHERE symbol = ?", expired)
+
+
+def get_klines(app=None):
+    """Return the candlestick store of ``app``, opening it and starting its refresh thread on
+    first use."""
+    if app is None:
+        app = current_app._get_current_object()
+    store = app.extensions.get(EXTENSION)
+    if store is None:
+        with _lock:
+            store = app.extensions.get(EXTENSION)
+            if store is None:
+                client = get_client(
+                    app.config["API_BASE_URL"], exchange=app.config["EXCHANGE"].lower()
+                )
+                store = KlineStore(
+                    app.config["DATABASE"],
+                    client,
+                    app.config["KLINE_RETENTION_DAYS"] * INTERVALS["1d"],
+                )
+                store.start(app.logger)
+                app.extensions[EXTENSION] = store
+    return store
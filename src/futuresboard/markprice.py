@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from flask import current_app
+
+from futuresboard import codec
+from futuresboard.client import get_client
+
+EXTENSION = "futuresboard.markprice"
+# How long the first page view waits for the initial refresh, the old per-request timeout
+FIRST_REFRESH_TIMEOUT = 2
+
+_lock = threading.Lock()
+
+
+def fetch_mark_prices(client):
+    """Download the mark price of every linear contract listed on the client's exchange."""
+    if client.exchange == "bybit":
+        response = client.get("/v5/market/tickers", params={"category": "linear"})
+        response.raise_for_status()
+        return {
+            ticker["symbol"]: float(ticker["markPrice"])
+            for ticker in codec.response_json(response)["result"]["list"]
+        }
+    response = client.get("/fapi/v1/premiumIndex")
+    response.raise_for_status()
+    return {each["symbol"]: float(each["markPrice"]) for each in codec.response_json(response)}
+
+
+class MarkPriceCache:
+    """Mark prices kept fresh by a background thread, so page handlers never wait on the exchange.
+
+    Every refresh replaces the whole mapping at once, readers only ever look up a dictionary.
+    """
+
+    def __init__(self, client, interval):
+        self.client = client
+        self.interval = interval
+        self.prices: dict[str, float] = {}
+        self.updated: dict[str, float] = {}
+        self.stopped = threading.Event()
+        self.ready = threading.Event()
+
+    def get(self, symbol):
+        return self.prices.get(symbol)
+
+    def age(self, symbol):
+        """Return how many seconds ago the price of ``symbol`` was fetched, if it is known."""
+        updated = self.updated.get(symbol)
+        if updated is None:
+            return None
+        return time.time() - updated
+
+    def refresh(self):
+        prices = fetch_mark_prices(self.client)
+        now = time.time()
+        updated = dict(self.updated)
+        updated.update(dict.fromkeys(prices, now))
+        self.prices = {**self.prices, **prices}
+        self.updated = updated
+        self.ready.set()
+
+    def run(self, logger):
+        while True:
+            try:
+                self.refresh()
+            except Exception as exc:
+                logger.warning(f"Mark price refresh failed: {exc}")
+            if self.stopped.wait(self.interval):
+                return
+
+    def start(self, logger):
+        thread = threading.Thread(target=self.run, args=(logger,))
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def get_mark_prices(app=None):
+    """Return the mark price cache of ``app``, starting its refresh thread on first use."""
+    if app is None:
+        app = current_app._get_current_object()
+    cache = app.extensions.get(EXTENSION)
+    if cache is None:
+        with _lock:
+            cache = app.extensions.get(EXTENSION)
+            if cache is None:
+                client = get_client(
+                    app.config["API_BASE_URL"], exchange=app.config["EXCHANGE"].lower()
+                )
+                cache = MarkPriceCache(client, app.config["MARK_PRICE_INTERVAL"])
+                cache.start(app.logger)
+                cache.ready.wait(FIRST_REFRESH_TIMEOUT)
+                app.extensions[EXTENSION] = cache
+    return cache
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from flask import g
+from flask import request
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upper bounds of the histogram of SQL queries run per page
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_registry: list[Metric] = []
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    if not pairs:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """A family of samples of one metric, one sample per combination of label values.
+
+    ``remote`` holds the samples last reported by the scraper process, if it runs on its own,
+    which are merged with the samples of this process when rendered.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.values: dict[tuple, object] = {}
+        self.remote: dict[tuple, object] = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for labelvalues, value in sorted(self.samples()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            )
+        return lines
+
+    def samples(self):
+        return list(self.current().items())
+
+    def current(self):
+        """Return the samples of this process merged with the remote ones."""
+        with self.lock:
+            merged = dict(self.values)
+            for labelvalues, value in self.remote.items():
+                local = merged.get(labelvalues)
+                merged[labelvalues] = value if local is None else self.merge(local, value)
+            return merged
+
+    def merge(self, local, remote):
+        return remote
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def merge(self, local, remote):
+        return local + remote
+
+
+class Gauge(Metric):
+    """A value that goes up and down. With ``collect``, the samples are computed on every scrape
+    from the mapping of label values to numbers it returns."""
+
+    kind = "gauge"
+
+    def __init__(self, name, description, labelnames=(), collect=None):
+        super().__init__(name, description, labelnames)
+        self.collect = collect
+
+    def set(self, *labelvalues, value):
+        with self.lock:
+            self.values[labelvalues] = value
+
+    def samples(self):
+        if self.collect is not None:
+            return list(self.collect().items())
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labelvalues, value):
+        with self.lock:
+            counts = self.values.get(labelvalues)
+            if counts is None:
+                # one count per bucket, then the sum and the total count
+                counts = self.values[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def merge(self, local, remote):
+        return [a + b for a, b in zip(local, remote)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        samples = sorted((key, list(counts)) for key, counts in self.current().items())
+        for labelvalues, counts in samples:
+            for bound, count in zip(self.buckets + (float("inf"),), counts[:-2] + [counts[-1]]):
+                labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-2])}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def export():
+    """Return a copy of the samples of this process, by metric name, for ``load_remote``."""
+    snapshot = {}
+    for metric in _registry:
+        with metric.lock:
+            snapshot[metric.name] = {
+                labelvalues: list(value) if isinstance(value, list) else value
+                for labelvalues, value in metric.values.items()
+            }
+    return snapshot
+
+
+def load_remote(snapshot):
+    """Replace the remote samples with those ``export`` returned in the scraper process."""
+    for metric in _registry:
+        remote = snapshot.get(metric.name, {})
+        with metric.lock:
+            metric.remote = remote
+
+
+# exchange requests and rate limiting
+EXCHANGE_REQUEST_SECONDS = Histogram(
+    "futuresboard_exchange_request_seconds",
+    "Latency of the requests sent to the exchange, per endpoint.",
+    ("exchange", "endpoint"),
+)
+EXCHANGE_WEIGHT = Counter(
+    "futuresboard_exchange_weight_total",
+    "Request weight spent against the exchange rate limits.",
+    ("exchange",),
+)
+EXCHANGE_WEIGHT_USED = Gauge(
+    "futuresboard_exchange_weight_used",
+    "Weight used in the current minute, as last reported by Binance.",
+    ("exchange",),
+)
+RATE_LIMIT_SLEEPS = Counter(
+    "futuresboard_rate_limit_sleeps_total",
+    "Times a request waited for the rate limit budget to refill.",
+    ("exchange",),
+)
+RATE_LIMIT_SLEEP_SECONDS = Counter(
+    "futuresboard_rate_limit_sleep_seconds_total",
+    "Time spent waiting for the rate limit budget to refill.",
+    ("exchange",),
+)
+
+# scraping
+ROWS_INGESTED = Counter(
+    "futuresboard_rows_ingested_total",
+    "Rows inserted or updated by the scraper and the account stream, per table.",
+    ("account", "table"),
+)
+SCRAPE_SECONDS = Histogram(
+    "futuresboard_scrape_seconds",
+    "Duration of the scrape tasks.",
+    ("account", "task"),
+)
+SCRAPE_FAILURES = Counter(
+    "futuresboard_scrape_failures_total",
+    "Scrape tasks that ended with an error.",
+    ("account", "task"),
+)
+SCRAPE_LAST_SUCCESS = Gauge(
+    "futuresboard_scrape_last_success_timestamp_seconds",
+    "Unix time of the last successful run of each scrape task.",
+    ("account", "task"),
+)
+
+
+def _scrape_lag():
+    last_success = SCRAPE_LAST_SUCCESS.current()
+    now = time.time()
+    return {labels: now - value for labels, value in last_success.items()}
+
+
+SCRAPE_LAG = Gauge(
+    "futuresboard_scrape_lag_seconds",
+    "Seconds since the last successful run of each scrape task.",
+    ("account", "task"),
+    collect=_scrape_lag,
+)
+
+# pages
+ROUTE_SECONDS = Histogram(
+    "futuresboard_route_seconds",
+    "Time taken to render each page.",
+    ("endpoint",),
+)
+ROUTE_QUERIES = Histogram(
+    "futuresboard_route_queries",
+    "SQL queries run to render each page.",
+    ("endpoint",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+ROUTE_QUERY_SECONDS = Histogram(
+    "futuresboard_route_query_seconds",
+    "Time spent in SQL queries while rendering each page.",
+    ("endpoint",),
+)
+
+
+def observe_scrape(account, task, func):
+    """Run the scrape ``task`` of ``account``, recording its duration and outcome."""
+    start = time.perf_counter()
+    try:
+        results = func()
+    except Exception:
+        SCRAPE_FAILURES.inc(account, task)
+        raise
+    finally:
+        SCRAPE_SECONDS.observe(account, task, value=time.perf_counter() - start)
+    SCRAPE_LAST_SUCCESS.set(account, task, value=time.time())
+    return results
+
+
+def observe_query(seconds):
+    """Count one SQL query of the current request."""
+    g.metrics_queries = g.get("metrics_queries", 0) + 1
+    g.metrics_query_time = g.get("metrics_query_time", 0.0) + seconds
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _finish_request(exc=None):
+    start = g.get("metrics_start")
+    if start is None or request.endpoint is None or request.endpoint == "static":
+        return
+    endpoint = request.endpoint.rpartition(".")[2]
+    ROUTE_SECONDS.observe(endpoint, value=time.perf_counter() - start)
+    ROUTE_QUERIES.observe(endpoint, value=g.get("metrics_queries", 0))
+    ROUTE_QUERY_SECONDS.observe(endpoint, value=g.get("metrics_query_time", 0.0))
+
+
+def init_app(app):
+    """Time every page of the Flask app. This is called by the application factory."""
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request)
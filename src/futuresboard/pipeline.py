@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+
+# Pages that may wait for the writer, per fetching worker
+QUEUE_DEPTH = 2
+
+_DONE = object()
+
+
+class ScrapeCancelled(Exception):
+    """Raised when a scrape is cancelled before it finished."""
+
+
+class Pipeline:
+    """Fetches pages on a pool of threads while a single writer stores them.
+
+    Every source is an iterator of pages, typically a generator that requests one page after the
+    other. The sources run on ``workers`` threads inside an app context of ``app`` for
+    ``account``, so they can talk to the exchange but must not touch the database. Each page is
+    handed to ``write`` on the calling thread, which is the only one writing. The pages of a
+    source are written in the order it produced them.
+
+    The queue between the two sides is bounded, so fetching pauses when the writer falls behind.
+    An error in a source or in the writer stops the remaining sources and is raised from ``run``,
+    and so is ``ScrapeCancelled`` once the ``stop`` event is set.
+    """
+
+    def __init__(self, app, account, workers=1, depth=QUEUE_DEPTH, stop=None):
+        self.app = app
+        self.account = account
+        self.workers = max(1, workers)
+        self.pages: queue.Queue = queue.Queue(maxsize=self.workers * depth)
+        self.cancelled = threading.Event()
+        self.stop = stop
+
+    def run(self, sources, write):
+        """Drain ``sources`` through ``write``, returning the sum of what ``write`` returned."""
+        sources = list(sources)
+        if not sources:
+            return 0
+        written = 0
+        remaining = len(sources)
+        executor = ThreadPoolExecutor(max_workers=min(self.workers, remaining))
+        futures = [executor.submit(self._produce, source) for source in sources]
+        try:
+            while remaining:
+                if self.stop is not None and self.stop.is_set():
+                    raise ScrapeCancelled()
+                try:
+                    page = self.pages.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if page is _DONE:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    written += write(page) or 0
+        finally:
+            # a source waiting for the rate limit finishes in the background, its page discarded
+            self.cancel()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+        return written
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _produce(self, source):
+        if self.cancelled.is_set():
+            return
+        with self.app.app_context():
+            g.account = self.account
+            try:
+                for page in source:
+                    if not self._put(page):
+                        break
+                else:
+                    self._put(_DONE)
+            except Exception as exc:
+                self._put(exc)
+            finally:
+                close = getattr(source, "close", None)
+                if close is not None:
+                    close()
+
+    def _put(self, page):
+        while not self.cancelled.is_set():
+            try:
+                self.pages.put(page, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
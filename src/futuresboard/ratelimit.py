@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from futuresboard.metrics import EXCHANGE_WEIGHT
+from futuresboard.metrics import EXCHANGE_WEIGHT_USED
+from futuresboard.metrics import RATE_LIMIT_SLEEP_SECONDS
+from futuresboard.metrics import RATE_LIMIT_SLEEPS
+
+# Request weight budget per exchange: (limit, period in seconds). Binance shares one weight
+# budget per IP across all endpoints; Bybit limits each endpoint separately, and those limits
+# are learned from the response headers.
+EXCHANGE_LIMITS = {
+    "binance": (1200, 60.0),
+    "bybit": (600, 5.0),
+}
+
+ENDPOINT_WEIGHTS = {
+    "binance": {
+        "/fapi/v1/openOrders": 40,
+        "/fapi/v2/account": 5,
+        "/fapi/v1/income": 30,
+        "/fapi/v1/premiumIndex": 10,
+        "/fapi/v1/klines": 5,
+    },
+}
+
+# Requests per second Bybit allows each endpoint by default. An endpoint is held to it until the
+# X-Bapi-Limit header of a response tells its actual limit.
+BYBIT_ENDPOINT_LIMIT = 10
+
+# Keep this fraction of every budget free so requests run just under the limit
+HEADROOM = 0.95
+
+# A request the exchange turned down for going over a limit (HTTP 429 with Binance code -1003,
+# Bybit code 10006) is sent again up to this many times, after waiting for the limit to reset or,
+# without a hint when that is, an exponential back-off in seconds
+RATE_LIMIT_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# What the scraper used to do: sleep a full minute once the used weight (Binance) or the number
+# of requests (Bybit) went past a fixed threshold.
+LEGACY_THRESHOLDS = {"binance": 800, "bybit": 50}
+LEGACY_SLEEP = 60
+
+# Exchanges whose limits apply to each account rather than to the IP address
+PER_ACCOUNT_LIMITS = {"bybit"}
+
+_governors: dict[tuple[str, str, str], RateGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, capacity, period, clock=time.monotonic):
+        self.clock = clock
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self.held_until = 0.0
+
+    def _refill(self, now):
+        start = max(self.updated, self.held_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated = now
+
+    def delay(self, cost):
+        """Return the number of seconds to wait until ``cost`` tokens are available."""
+        now = self.clock()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens + 1e-9 < cost:
+            held = max(0.0, self.held_until - now)
+            wait = max(wait, held + (cost - self.tokens) / self.rate)
+        return wait
+
+    def consume(self, cost):
+        self._refill(self.clock())
+        self.tokens -= cost
+
+    def resize(self, capacity, period):
+        self._refill(self.clock())
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = min(self.tokens, self.capacity)
+
+    def sync(self, remaining):
+        self._refill(self.clock())
+        self.tokens = min(self.capacity, float(remaining))
+
+    def hold(self, seconds):
+        """Refill nothing for ``seconds``, the rest of the fixed window the tokens were synced to."""
+        now = self.clock()
+        self._refill(now)
+        self.held_until = max(self.held_until, now + seconds)
+
+    def block(self, seconds):
+        now = self.clock()
+        self._refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class RateGovernor:
+    """Paces the requests sent to one exchange so they stay just under its rate limits.
+
+    Every request first takes its weight from the exchange wide bucket and from the bucket of
+    its endpoint, sleeping only as long as it takes for enough tokens to refill. The buckets are
+    corrected from the rate limit headers of every response, minus the requests still in flight,
+    which the exchange has not counted yet when several threads share the governor. A Bybit
+    endpoint starts out with the default limit, so the first requests of concurrent threads
+    cannot overspend it before a response tells the actual one.
+    """
+
+    def __init__(self, exchange, sleep=time.sleep, clock=time.monotonic, wallclock=time.time):
+        self.exchange = exchange
+        self.sleep = sleep
+        self.clock = clock
+        self.wallclock = wallclock
+        limit, period = EXCHANGE_LIMITS.get(exchange, EXCHANGE_LIMITS["binance"])
+        self.bucket = TokenBucket(limit * HEADROOM, period, clock=clock)
+        self.endpoints: dict[str, TokenBucket] = {}
+        # (requests, weight) sent to each endpoint and not answered yet
+        self.in_flight: dict[str, tuple[int, float]] = {}
+        # (reset timestamp, fewest requests left) of the last Bybit window seen of each endpoint,
+        # as a response answered earlier can arrive after a later one
+        self.windows: dict[str, tuple[int, int]] = {}
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "sleeps": 0,
+            "slept": 0.0,
+            "legacy_slept": 0.0,
+            "retries": 0,
+        }
+        self._legacy_used = 0
+        self._legacy_window = clock()
+
+    def weight(self, endpoint):
+        return ENDPOINT_WEIGHTS.get(self.exchange, {}).get(endpoint, 1)
+
+    def _endpoint_bucket(self, endpoint):
+        bucket = self.endpoints.get(endpoint)
+        if bucket is None and self.exchange == "bybit":
+            bucket = self.endpoints[endpoint] = TokenBucket(
+                BYBIT_ENDPOINT_LIMIT * HEADROOM, 1.0, clock=self.clock
+            )
+        return bucket
+
+    def acquire(self, endpoint, cost=None):
+        """Block until a request to ``endpoint`` fits within the rate limits, returning the
+        weight it took. Every request acquired must be followed by a call to ``observe``."""
+        if cost is None:
+            cost = self.weight(endpoint)
+        while True:
+            with self.lock:
+                buckets = [self.bucket]
+                endpoint_bucket = self._endpoint_bucket(endpoint)
+                if endpoint_bucket is not None:
+                    buckets.append(endpoint_bucket)
+                wait = max(bucket.delay(cost) for bucket in buckets)
+                if wait <= 0:
+                    for bucket in buckets:
+                        bucket.consume(cost)
+                    requests, weight = self.in_flight.get(endpoint, (0, 0))
+                    self.in_flight[endpoint] = (requests + 1, weight + cost)
+                    self._count_request(cost)
+                    return cost
+                self.counters["sleeps"] += 1
+                self.counters["slept"] += wait
+            RATE_LIMIT_SLEEPS.inc(self.exchange)
+            RATE_LIMIT_SLEEP_SECONDS.inc(self.exchange, amount=wait)
+            self.sleep(wait)
+
+    def _count_request(self, cost):
+        # Replay the fixed threshold rule against the same requests to know what it would have
+        # slept, on a timeline where its own sleeps replace the ones taken by the governor
+        self.counters["requests"] += 1
+        EXCHANGE_WEIGHT.inc(self.exchange, amount=cost)
+        now = self.clock() - self.counters["slept"] + self.counters["legacy_slept"]
+        if now - self._legacy_window >= LEGACY_SLEEP:
+            self._legacy_window, self._legacy_used = now, 0
+        if self._legacy_used > LEGACY_THRESHOLDS.get(self.exchange, LEGACY_THRESHOLDS["binance"]):
+            self.counters["legacy_slept"] += LEGACY_SLEEP
+            self._legacy_window, self._legacy_used = now, 0
+        self._legacy_used += cost
+
+    def observe(self, endpoint, headers, cost=None):
+        """Learn the current rate limit state from the headers of a response to a request of
+        ``cost`` weight. A request that failed without a response is observed with no headers."""
+        if cost is None:
+            cost = self.weight(endpoint)
+        with self.lock:
+            requests, weight = self.in_flight.get(endpoint, (1, cost))
+            self.in_flight[endpoint] = (max(0, requests - 1), max(0, weight - cost))
+            used_weight = headers.get("X-MBX-USED-WEIGHT-1M")
+            if used_weight is not None:
+                pending = sum(weight for requests, weight in self.in_flight.values())
+                self.bucket.sync(self.bucket.capacity - int(used_weight) - pending)
+                if int(used_weight) >= self.bucket.capacity:
+                    # Binance counts weight per clock minute, none of it frees up before the next
+                    self.bucket.block(60 - self.wallclock() % 60)
+                EXCHANGE_WEIGHT_USED.set(self.exchange, value=int(used_weight))
+
+            remaining = headers.get("X-Bapi-Limit-Status")
+            if remaining is not None:
+                limit = headers.get("X-Bapi-Limit")
+                bucket = self._endpoint_bucket(endpoint)
+                if bucket is not None:
+                    if limit is not None and bucket.capacity != int(limit) * HEADROOM:
+                        bucket.resize(int(limit) * HEADROOM, 1.0)
+                    reset = headers.get("X-Bapi-Limit-Reset-Timestamp")
+                    if reset is None:
+                        bucket.sync(int(remaining) - self.in_flight[endpoint][0])
+                    else:
+                        self._sync_window(endpoint, bucket, int(remaining), int(reset))
+
+            retry_after = headers.get("Retry-After")
+            if retry_after is not None:
+                try:
+                    self.bucket.block(float(retry_after))
+                except ValueError:
+                    pass
+
+    def _sync_window(self, endpoint, bucket, remaining, reset):
+        window = self.windows.get(endpoint)
+        if window is not None and window[0] > reset:
+            # the answer from a window that is over by now tells nothing
+            return
+        if window is not None and window[0] == reset:
+            remaining = min(remaining, window[1])
+        self.windows[endpoint] = (reset, remaining)
+        remaining -= self.in_flight[endpoint][0]
+        bucket.sync(remaining)
+        # Bybit counts requests per window, none of them frees up before the next
+        window_left = max(0.0, reset / 1000 - self.wallclock())
+        if remaining <= 1:
+            bucket.block(window_left)
+        else:
+            bucket.hold(window_left)
+
+    def backoff(self, endpoint, attempt):
+        """Hold back the requests to ``endpoint`` after the exchange turned down the ``attempt``-th
+        retry of one for going over its limits, unless its headers already said for how long."""
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+        with self.lock:
+            self.counters["retries"] += 1
+            bucket = self.endpoints.get(endpoint, self.bucket)
+            if bucket.blocked_until <= self.clock():
+                bucket.block(delay)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["saved"] = stats["legacy_slept"] - stats["slept"]
+        return stats
+
+
+def get_governor(exchange, base_url, api_key=""):
+    """Return the governor shared by every client talking to ``base_url``.
+
+    Binance counts weight per IP, so its accounts share one governor, while Bybit limits every
+    account (API key) on its own.
+    """
+    key = (exchange, base_url, api_key if exchange in PER_ACCOUNT_LIMITS else "")
+    with _governors_lock:
+        governor = _governors.get(key)
+        if governor is None:
+            governor = _governors[key] = RateGovernor(exchange)
+    return governor
+
+
+def stats_since(governor, previous):
+    """Return the governor counters accumulated since ``previous`` was taken."""
+    current = governor.stats()
+    return {key: current[key] - previous.get(key, 0) for key in current}
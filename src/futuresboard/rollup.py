@@ -0,0 +1,90 @@
+"""Income sums of the pages, read from the daily rollup wherever a range covers whole days.
+
+The ``income_daily`` table holds the income of every account, UTC day, symbol, income type and
+asset, kept up to date by the scraper as it stores income. A range is split into the whole days
+it covers, summed from the rollup, and the parts of days at its edges, summed from the income
+rows themselves. The two are added up in one query.
+"""
+from __future__ import annotations
+
+import math
+
+from futuresboard import db
+from futuresboard.scraper import ROLLUP_DAY
+
+
+def split_range(start, end):
+    """Split the times from ``start`` to ``end``, both included, at midnight UTC.
+
+    Returns the whole days as the half-open range of their starts, or None when there is no
+    whole day, and the inclusive time ranges left over at the edges.
+    """
+    first = math.ceil(start / ROLLUP_DAY) * ROLLUP_DAY
+    last = math.floor((end + 1) / ROLLUP_DAY) * ROLLUP_DAY
+    if first >= last:
+        return None, [(start, end)]
+    edges = []
+    if start < first:
+        edges.append((start, first - 1))
+    if last <= end:
+        edges.append((last, end))
+    return (first, last), edges
+
+
+def _filters(symbol=None, account=None, exclude=()):
+    sql, args = "", []
+    if exclude:
+        sql += f" AND asset <> 'BNB' AND incomeType NOT IN ({', '.join('?' for _ in exclude)})"
+        args.extend(exclude)
+    if symbol is not None:
+        sql += " AND symbol = ?"
+        args.append(symbol)
+    if account is not None:
+        # not a term for an index: an account has most of the rows of a range of time
+        sql += " AND +account = ?"
+        args.append(account)
+    return sql, args
+
+
+def _income(columns, start=None, end=None, **filters):
+    """Return the SQL and arguments of the income rows of a range with ``columns``, where the
+    column ``time`` of the rolled up rows is the start of their day."""
+    sql, args = _filters(**filters)
+    if start is None or end is None:
+        return f"SELECT day AS time, {columns} FROM income_daily WHERE 1{sql}", args
+    days, edges = split_range(start, end)
+    parts, parts_args = [], []
+    if days is not None:
+        parts.append(
+            f"SELECT day AS time, {columns} FROM income_daily WHERE day >= ? AND day < ?{sql}"
+        )
+        parts_args += [*days, *args]
+    for edge in edges:
+        parts.append(f"SELECT time, {columns} FROM income WHERE time >= ? AND time <= ?{sql}")
+        parts_args += [*edge, *args]
+    return " UNION ALL ".join(parts), parts_args
+
+
+def pnl(start=None, end=None, **filters):
+    """Sum the income from ``start`` to ``end``, of all time without them."""
+    sql, args = _income("income", start, end, **filters)
+    return db.query(f"SELECT SUM(income) FROM ({sql})", args, one=True)[0]
+
+
+def pnl_by_date(start, end, **filters):
+    """Return the income of every UTC date with income in the range, as (date, income) rows."""
+    sql, args = _income("income", start, end, **filters)
+    return db.query(
+        f'SELECT DATE(time / 1000, "unixepoch") AS Date, SUM(income) AS inc FROM ({sql}) '
+        "GROUP BY Date",
+        args,
+    )
+
+
+def pnl_by_symbol(start, end, **filters):
+    """Return the income of every symbol in the range, as (income, symbol) rows, best first."""
+    sql, args = _income("income, symbol", start, end, **filters)
+    return db.query(
+        f"SELECT SUM(income) AS inc, symbol FROM ({sql}) GROUP BY symbol ORDER BY inc DESC", args
+    )
+
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ScheduledTask:
+    def __init__(self, name, func, interval, jitter=0.0, priority=0, group=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.priority = priority
+        self.group = group
+        self.runs = 0
+
+    def next_due(self, now):
+        return now + self.interval + random.uniform(0, self.jitter * self.interval)  # nosec
+
+
+class Scheduler:
+    """Runs each registered task every ``interval`` seconds on a pool of ``workers`` threads.
+
+    A task's next run is counted from the end of its previous one, plus a random jitter of up to
+    ``jitter`` times its interval. Tasks of the same ``group`` (an account) never run at the same
+    time, so they share that account's rate budget without competing for it, while different
+    groups run concurrently. When several tasks are due at once, the lowest ``priority`` runs
+    first.
+    """
+
+    def __init__(self, logger, workers=1, clock=time.monotonic):
+        self.logger = logger
+        self.clock = clock
+        self.queue: list = []
+        self.running: set = set()
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.stopped = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def add(self, name, func, interval, jitter=0.0, priority=0, delay=0, group=None):
+        task = ScheduledTask(name, func, interval, jitter, priority, group)
+        self._push(self.clock() + delay, task)
+        return task
+
+    def _push(self, due, task):
+        with self.lock:
+            self.queue.append((due, next(self.counter), task))
+        self.changed.set()
+
+    def _take_due(self, now):
+        """Remove and return the due tasks that may start now, at most one per group."""
+        with self.lock:
+            due = sorted(
+                (entry for entry in self.queue if entry[0] <= now),
+                key=lambda entry: (entry[2].priority, entry[0]),
+            )
+            taken = []
+            for entry in due:
+                if entry[2].group not in self.running:
+                    self.running.add(entry[2].group)
+                    self.queue.remove(entry)
+                    taken.append(entry[2])
+            return taken
+
+    def _next_wakeup(self):
+        with self.lock:
+            waiting = [due for due, _, task in self.queue if task.group not in self.running]
+        if not waiting:
+            return None
+        return max(0.0, min(waiting) - self.clock())
+
+    def _run_task(self, task):
+        try:
+            task.func()
+        except Exception as exc:
+            self.logger.error(f"Scrape task {task.name} failed: {exc}")
+        finally:
+            task.runs += 1
+            with self.lock:
+                self.running.discard(task.group)
+            self._push(task.next_due(self.clock()), task)
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.changed.clear()
+            for task in self._take_due(self.clock()):
+                self.executor.submit(self._run_task, task)
+            self.changed.wait(self._next_wakeup())
+
+    def stop(self):
+        self.stopped.set()
+        self.changed.set()
+        self.executor.shutdown(wait=False)
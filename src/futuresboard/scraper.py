@@ -1,17 +1,31 @@
 from __future__ import annotations
 
+import functools
 import hashlib
 import hmac
 import sqlite3
 import threading
 import time
 from collections import OrderedDict
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Callable
 from sqlite3 import Error
 from urllib.parse import urlencode
 
 import requests  # type: ignore
 from flask import current_app
+from flask import g
+
+from futuresboard import codec
+from futuresboard.client import get_client
+from futuresboard.config import DEFAULT_ACCOUNT
+from futuresboard.metrics import ROWS_INGESTED
+from futuresboard.metrics import observe_scrape
+from futuresboard.pipeline import Pipeline
+from futuresboard.ratelimit import stats_since
+from futuresboard.scheduler import Scheduler
 
 
 class HTTPRequestError(Exception):
@@ -27,34 +41,69 @@ class HTTPRequestError(Exception):
         return f"Request to {self.url!r} failed. Code: {self.code}; Message: {self.msg}"
 
 
-def auto_scrape(app):
-    thread = threading.Thread(target=_auto_scrape, args=(app,))
+def auto_scrape(app, stream=False):
+    """Start the scheduled scrape of every configured account. With ``stream`` the account stream
+    keeps the orders, positions and balance up to date, so they are only reconciled as often as the
+    income is scraped."""
+    thread = threading.Thread(target=_auto_scrape, args=(app, stream))
     thread.daemon = True
     thread.start()
 
 
-def _auto_scrape(app):
+def _auto_scrape(app, stream):
     with app.app_context():
-        interval = app.config["AUTO_SCRAPE_INTERVAL"]
-        while True:
-            app.logger.info("Auto scrape routines starting")
-            scrape(app=app)
-            app.logger.info(
-                f"Auto scrape routines terminated. Sleeping {interval} seconds...",
-            )
-            time.sleep(interval)
+        accounts = app.config["ACCOUNTS"]
+        scheduler = Scheduler(app.logger, workers=min(len(accounts), app.config["SCRAPE_WORKERS"]))
+        for account in accounts:
+            # the tasks of an account never overlap, so they can share one connection
+            conn = create_connection(app.config["DATABASE"])
+            for name, task, interval, priority in SCRAPE_TASKS.get(account["EXCHANGE"].lower(), []):
+                if stream and interval == "POSITIONS_SCRAPE_INTERVAL":
+                    interval = "AUTO_SCRAPE_INTERVAL"
+                scheduler.add(
+                    name,
+                    scheduled_task(app, account, name, task, conn),
+                    app.config[interval],
+                    jitter=SCRAPE_JITTER,
+                    priority=priority,
+                    group=account["NAME"],
+                )
+                app.logger.info(
+                    f"Scrape task {name} of account {account['NAME']} runs every {app.config[interval]} seconds"
+                )
+        scheduler.run()
+
+
+_account_locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+_account_locks_lock = threading.Lock()
+
+
+def account_lock(name):
+    """Return the lock held while the tasks of account ``name`` run, so the scheduled and the
+    on-demand scrapes of one account take turns."""
+    with _account_locks_lock:
+        return _account_locks[name]
+
+
+def current_account():
+    """Return the account the scraper works for in this context, the first configured by default."""
+    account = g.get("account")
+    if account is None:
+        account = current_app.config["ACCOUNTS"][0]
+    return account
 
 
 def hashing(query_string, exchange="binance", timestamp=None):
+    account = current_account()
     if exchange == "bybit":
-        query_string = f"{timestamp}{current_app.config['API_KEY']}5000" + query_string
+        query_string = f"{timestamp}{account['API_KEY']}5000" + query_string
         return hmac.new(
-            bytes(current_app.config["API_SECRET"].encode("utf-8")),
+            bytes(account["API_SECRET"].encode("utf-8")),
             query_string.encode("utf-8"),
             hashlib.sha256,
         ).hexdigest()
     return hmac.new(
-        bytes(current_app.config["API_SECRET"].encode("utf-8")),
+        bytes(account["API_SECRET"].encode("utf-8")),
         query_string.encode("utf-8"),
         hashlib.sha256,
     ).hexdigest()
@@ -64,30 +113,28 @@ def get_timestamp():
     return int(time.time() * 1000)
 
 
-def dispatch_request(http_method, signature=None, timestamp=None):
-    session = requests.Session()
-    session.headers.update(
-        {
-            "Content-Type": "application/json;charset=utf-8",
-            "X-MBX-APIKEY": current_app.config["API_KEY"],
-            "X-BAPI-API-KEY": current_app.config["API_KEY"],
-            "X-BAPI-SIGN": f"{signature}",
-            "X-BAPI-SIGN-TYPE": "2",
-            "X-BAPI-TIMESTAMP": f"{timestamp}",
-            "X-BAPI-RECV-WINDOW": "5000",
-        }
+def exchange_client():
+    account = current_account()
+    return get_client(
+        account["API_BASE_URL"],
+        exchange=account["EXCHANGE"].lower(),
+        api_key=account["API_KEY"],
     )
 
-    return {
-        "GET": session.get,
-        "DELETE": session.delete,
-        "PUT": session.put,
-        "POST": session.post,
-    }.get(http_method, "GET")
+
+def dispatch_request(http_method, signature=None, timestamp=None):
+    headers = {}
+    if signature is not None:
+        headers["X-BAPI-SIGN"] = f"{signature}"
+        headers["X-BAPI-TIMESTAMP"] = f"{timestamp}"
+
+    return functools.partial(exchange_client().request, http_method, headers=headers)
 
 
 # used for sending request requires the signature
-def send_signed_request(http_method, url_path, payload={}, exchange="binance"):
+def send_signed_request(http_method, url_path, payload=None, exchange="binance"):
+    # a copy, so the timestamp neither stays in a shared default nor in the caller's parameters
+    payload = dict(payload or {})
     if exchange == "binance":
         payload["timestamp"] = get_timestamp()
     query_string = urlencode(OrderedDict(sorted(payload.items())))
@@ -95,23 +142,22 @@ def send_signed_request(http_method, url_path, payload={}, exchange="binance"):
         "%27", "%22"
     )  # replace single quote to double quote
 
-    url = f"{current_app.config['API_BASE_URL']}{url_path}?{query_string}"
+    url = f"{current_account()['API_BASE_URL']}{url_path}?{query_string}"
     if exchange == "binance":
         url += f"&signature={hashing(query_string, exchange)}"
 
     # print("{} {}".format(http_method, url))
-    params = {"url": url, "params": {}}
     try:
         timestamp = get_timestamp()
         response = dispatch_request(
             http_method,
             hashing(query_string=query_string, exchange=exchange, timestamp=timestamp),
             timestamp=timestamp,
-        )(**params)
+        )(url)
         headers = response.headers
         try:
-            json_response = response.json()
-        except requests.exceptions.JSONDecodeError as e:
+            json_response = codec.response_json(response)
+        except codec.JSONDecodeError as e:
             raise HTTPRequestError(url=url, code=-3, msg=f"{e}")
         if "code" in json_response:
             raise HTTPRequestError(
@@ -123,43 +169,79 @@ def send_signed_request(http_method, url_path, payload={}, exchange="binance"):
                     url=url, code=json_response["retCode"], msg=json_response["retMsg"]
                 )
         return headers, json_response
-    except requests.exceptions.ConnectionError as e:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
         raise HTTPRequestError(url=url, code=-1, msg=f"{e}")
 
 
 # used for sending public data request
-def send_public_request(url_path, payload={}):
-    query_string = urlencode(payload, True)
-    url = current_app.config["API_BASE_URL"] + url_path
+def send_public_request(url_path, payload=None):
+    query_string = urlencode(payload or {}, True)
+    url = current_account()["API_BASE_URL"] + url_path
     if query_string:
         url = url + "?" + query_string
     # print("{}".format(url))
     try:
-        response = dispatch_request("GET")(url=url)
+        response = dispatch_request("GET")(url)
         headers = response.headers
         try:
-            json_response = response.json()
-        except requests.exceptions.JSONDecodeError as e:
+            json_response = codec.response_json(response)
+        except codec.JSONDecodeError as e:
             raise HTTPRequestError(url=url, code=-3, msg=f"{e}")
         if "code" in json_response:
             raise HTTPRequestError(
                 url=url, code=json_response["code"], msg=json_response["msg"]
             )
         return headers, json_response
-    except requests.exceptions.ConnectionError as e:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
         raise HTTPRequestError(url=url, code=-2, msg=f"{e}")
 
 
+# Binance income history is backfilled from this date in windows fetched in parallel
+BACKFILL_START = int(datetime.fromisoformat("2020-01-01 00:00:00+00:00").timestamp() * 1000)
+BACKFILL_WINDOW = timedelta(days=90)
+# Bybit only serves closed PnL for ranges of up to seven days
+BYBIT_CLOSED_PNL_WINDOW = timedelta(days=7)
+# and keeps two years of it, of which the scraper asks for all but a day to stay clear of the edge
+BYBIT_CLOSED_PNL_HISTORY = timedelta(days=729)
+
+
+# Settings of the scraper connections. With write-ahead logging the pages keep reading while
+# a scrape writes, and a commit only has to reach the log instead of syncing the database file.
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),  # KiB
+)
+# Seconds a write waits for another connection to finish its own
+SQLITE_TIMEOUT = 30
+
+
 def create_connection(db_file):
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        conn = sqlite3.connect(db_file, timeout=SQLITE_TIMEOUT, check_same_thread=False)
+        for pragma, value in SQLITE_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma} = {value}")
     except Error as e:
         print(e)
 
     return conn
 
 
+def scrape_connection():
+    """Return the connection the scrape tasks of this context write through.
+
+    It is opened once per scrape run, or once per account for the life of the auto scraper,
+    instead of once per page.
+    """
+    conn = g.get("scrape_conn")
+    if conn is None:
+        conn = g.scrape_conn = create_connection(current_app.config["DATABASE"])
+        if conn is None:
+            raise Error(f"Could not open the database {current_app.config['DATABASE']}")
+    return conn
+
+
 def create_table(conn, create_table_sql):
     try:
         c = conn.cursor()
@@ -168,8 +250,7 @@ def create_table(conn, create_table_sql):
         print(e)
 
 
-def db_setup(database):
-    sql_create_income_table = """ CREATE TABLE IF NOT EXISTS income (
+SQL_CREATE_INCOME = f""" CREATE TABLE IF NOT EXISTS income (
                                         IID integer PRIMARY KEY AUTOINCREMENT,
                                         tranId text,
                                         symbol text,
@@ -179,29 +260,29 @@ def db_setup(database):
                                         info text,
                                         time integer,
                                         tradeId integer,
-                                        UNIQUE(tranId, incomeType) ON CONFLICT REPLACE
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}',
+                                        UNIQUE(account, tranId, incomeType) ON CONFLICT REPLACE
                                     ); """
-
-    sql_create_position_table = """ CREATE TABLE IF NOT EXISTS positions (
+SQL_CREATE_POSITIONS = f""" CREATE TABLE IF NOT EXISTS positions (
                                         PID integer PRIMARY KEY AUTOINCREMENT,
                                         symbol text,
                                         unrealizedProfit real,
                                         leverage integer,
                                         entryPrice real,
                                         positionSide text,
-                                        positionAmt real
+                                        positionAmt real,
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}'
                                     ); """
-
-    sql_create_account_table = """ CREATE TABLE IF NOT EXISTS account (
+SQL_CREATE_ACCOUNT = f""" CREATE TABLE IF NOT EXISTS account (
                                         AID integer PRIMARY KEY,
                                         totalWalletBalance real,
                                         totalUnrealizedProfit real,
                                         totalMarginBalance real,
                                         availableBalance real,
-                                        maxWithdrawAmount real
+                                        maxWithdrawAmount real,
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}'
                                     ); """
-
-    sql_create_orders_table = """ CREATE TABLE IF NOT EXISTS orders (
+SQL_CREATE_ORDERS = f""" CREATE TABLE IF NOT EXISTS orders (
                                         OID integer PRIMARY KEY AUTOINCREMENT,
                                         origQty real,
                                         price real,
@@ -210,432 +291,937 @@ def db_setup(database):
                                         status text,
                                         symbol text,
                                         time integer,
-                                        type text
+                                        type text,
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}'
+                                    ); """
+SQL_CREATE_INCOME_BACKFILL = f""" CREATE TABLE IF NOT EXISTS income_backfill (
+                                        windowStart integer,
+                                        windowEnd integer,
+                                        progress integer,
+                                        completed integer DEFAULT 0,
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}',
+                                        PRIMARY KEY (account, windowStart)
+                                    ); """
+SQL_CREATE_INGEST_STATE = f""" CREATE TABLE IF NOT EXISTS ingest_state (
+                                        stream text,
+                                        symbol text,
+                                        cursor text,
+                                        cursorStart integer,
+                                        watermark integer,
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}',
+                                        PRIMARY KEY (account, stream, symbol)
                                     ); """
+
+# Length of the days income is rolled up by, in milliseconds. Days start at midnight UTC, like the
+# dates the pages group income by.
+ROLLUP_DAY = 24 * 60 * 60 * 1000
+
+SQL_CREATE_INCOME_DAILY = f""" CREATE TABLE IF NOT EXISTS income_daily (
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}',
+                                        day integer,
+                                        symbol text,
+                                        incomeType text,
+                                        asset text,
+                                        income real,
+                                        rows integer,
+                                        PRIMARY KEY (day, symbol, incomeType, asset, account)
+                                    ) WITHOUT ROWID; """
+# Sums of a coin over all time, which a range of days does not narrow down
+SQL_CREATE_INCOME_DAILY_INDEX = """ CREATE INDEX IF NOT EXISTS income_daily_symbol
+                                        ON income_daily(symbol, incomeType, asset, income); """
+# The fees of all time per asset, of every account or of one
+SQL_CREATE_INCOME_DAILY_TYPE_INDEX = """ CREATE INDEX IF NOT EXISTS income_daily_type
+                                        ON income_daily(incomeType, account, asset, income); """
+# Every stored income row is added to its day as part of the statement inserting it, so the
+# rollup commits or rolls back along with the income
+SQL_CREATE_INCOME_DAILY_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_daily_insert
+                                        AFTER INSERT ON income
+                                        BEGIN
+                                            INSERT OR IGNORE INTO income_daily VALUES (
+                                                NEW.account, NEW.time - NEW.time % {ROLLUP_DAY},
+                                                COALESCE(NEW.symbol, ''),
+                                                COALESCE(NEW.incomeType, ''),
+                                                COALESCE(NEW.asset, ''), 0, 0
+                                            );
+                                            UPDATE income_daily
+                                            SET income = income + NEW.income, rows = rows + 1
+                                            WHERE account = NEW.account
+                                                AND day = NEW.time - NEW.time % {ROLLUP_DAY}
+                                                AND symbol = COALESCE(NEW.symbol, '')
+                                                AND incomeType = COALESCE(NEW.incomeType, '')
+                                                AND asset = COALESCE(NEW.asset, '');
+                                        END; """
+# Income changed or removed by hand is taken out of its day again, a day left without rows with it
+SQL_INCOME_DAILY_OLD_DAY = f"""account = OLD.account
+                                                AND day = OLD.time - OLD.time % {ROLLUP_DAY}
+                                                AND symbol = COALESCE(OLD.symbol, '')
+                                                AND incomeType = COALESCE(OLD.incomeType, '')
+                                                AND asset = COALESCE(OLD.asset, '')"""
+SQL_INCOME_DAILY_REMOVE_OLD = f"""UPDATE income_daily
+                                            SET income = income - OLD.income, rows = rows - 1
+                                            WHERE {SQL_INCOME_DAILY_OLD_DAY};
+                                            DELETE FROM income_daily
+                                            WHERE {SQL_INCOME_DAILY_OLD_DAY} AND rows <= 0;"""
+SQL_CREATE_INCOME_DAILY_DELETE_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_daily_delete
+                                        AFTER DELETE ON income
+                                        BEGIN
+                                            {SQL_INCOME_DAILY_REMOVE_OLD}
+                                        END; """
+SQL_CREATE_INCOME_DAILY_UPDATE_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_daily_update
+                                        AFTER UPDATE OF account, time, symbol, incomeType, asset,
+                                            income ON income
+                                        BEGIN
+                                            {SQL_INCOME_DAILY_REMOVE_OLD}
+                                            INSERT OR IGNORE INTO income_daily VALUES (
+                                                NEW.account, NEW.time - NEW.time % {ROLLUP_DAY},
+                                                COALESCE(NEW.symbol, ''),
+                                                COALESCE(NEW.incomeType, ''),
+                                                COALESCE(NEW.asset, ''), 0, 0
+                                            );
+                                            UPDATE income_daily
+                                            SET income = income + NEW.income, rows = rows + 1
+                                            WHERE account = NEW.account
+                                                AND day = NEW.time - NEW.time % {ROLLUP_DAY}
+                                                AND symbol = COALESCE(NEW.symbol, '')
+                                                AND incomeType = COALESCE(NEW.incomeType, '')
+                                                AND asset = COALESCE(NEW.asset, '');
+                                        END; """
+
+# Income types moving funds in and out of an account rather than making or losing them
+NON_PNL_INCOME_TYPES = ("TRANSFER", "COIN_SWAP_DEPOSIT", "COIN_SWAP_WITHDRAW")
+# Days since 1970 the running income total covers, up to 2149
+EQUITY_DAYS = 1 << 16
+EQUITY_LEVELS = EQUITY_DAYS.bit_length()
+SQL_EQUITY_LEVELS = f"VALUES {', '.join(f'({level})' for level in range(EQUITY_LEVELS))}"
+# The running total of the profit and loss of every account, by UTC day, as a Fenwick tree: the
+# node numbered n holds the income of the lowbit(n) days ending with day n - 1. The total up to
+# any day adds up at most 17 nodes, and storing income adds it to the same number of nodes, no
+# matter the order it arrives in.
+SQL_CREATE_INCOME_EQUITY = f""" CREATE TABLE IF NOT EXISTS income_equity (
+                                        node integer,
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}',
+                                        income real,
+                                        PRIMARY KEY (node, account)
+                                    ) WITHOUT ROWID; """
+SQL_CREATE_INCOME_EQUITY_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_equity_insert
+                                        AFTER INSERT ON income
+                                        WHEN NEW.asset <> 'BNB'
+                                            AND NEW.incomeType NOT IN {NON_PNL_INCOME_TYPES}
+                                            AND NEW.income IS NOT NULL AND NEW.time >= 0
+                                        BEGIN
+                                            INSERT INTO income_equity(node, account, income)
+                                            SELECT DISTINCT (day | ((1 << column1) - 1)) + 1,
+                                                NEW.account, NEW.income
+                                            FROM (SELECT NEW.time / {ROLLUP_DAY} AS day),
+                                                ({SQL_EQUITY_LEVELS})
+                                            WHERE true
+                                            ON CONFLICT (node, account)
+                                            DO UPDATE SET income = income + excluded.income;
+                                        END; """
+# Income changed or removed by hand is taken out of the running total again, and added back as
+# it is now when it still counts
+SQL_INCOME_EQUITY_REMOVE_OLD = f"""INSERT INTO income_equity(node, account, income)
+                                            SELECT DISTINCT (day | ((1 << column1) - 1)) + 1,
+                                                OLD.account, -OLD.income
+                                            FROM (SELECT OLD.time / {ROLLUP_DAY} AS day),
+                                                ({SQL_EQUITY_LEVELS})
+                                            WHERE OLD.asset <> 'BNB'
+                                                AND OLD.incomeType NOT IN {NON_PNL_INCOME_TYPES}
+                                                AND OLD.income IS NOT NULL AND OLD.time >= 0
+                                            ON CONFLICT (node, account)
+                                            DO UPDATE SET income = income + excluded.income;"""
+SQL_CREATE_INCOME_EQUITY_DELETE_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_equity_delete
+                                        AFTER DELETE ON income
+                                        BEGIN
+                                            {SQL_INCOME_EQUITY_REMOVE_OLD}
+                                        END; """
+SQL_CREATE_INCOME_EQUITY_UPDATE_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_equity_update
+                                        AFTER UPDATE OF account, time, incomeType, asset, income
+                                            ON income
+                                        BEGIN
+                                            {SQL_INCOME_EQUITY_REMOVE_OLD}
+                                            INSERT INTO income_equity(node, account, income)
+                                            SELECT DISTINCT (day | ((1 << column1) - 1)) + 1,
+                                                NEW.account, NEW.income
+                                            FROM (SELECT NEW.time / {ROLLUP_DAY} AS day),
+                                                ({SQL_EQUITY_LEVELS})
+                                            WHERE NEW.asset <> 'BNB'
+                                                AND NEW.incomeType NOT IN {NON_PNL_INCOME_TYPES}
+                                                AND NEW.income IS NOT NULL AND NEW.time >= 0
+                                            ON CONFLICT (node, account)
+                                            DO UPDATE SET income = income + excluded.income;
+                                        END; """
+# The symbols an account made or lost money on, listed in the sidebar
+SQL_CREATE_INCOME_SYMBOLS = f""" CREATE TABLE IF NOT EXISTS income_symbols (
+                                        symbol text,
+                                        account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}',
+                                        PRIMARY KEY (symbol, account)
+                                    ) WITHOUT ROWID; """
+SQL_CREATE_INCOME_SYMBOLS_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_symbols_insert
+                                        AFTER INSERT ON income
+                                        WHEN NEW.asset <> 'BNB' AND NEW.symbol <> ''
+                                            AND NEW.incomeType NOT IN {NON_PNL_INCOME_TYPES}
+                                        BEGIN
+                                            INSERT OR IGNORE INTO income_symbols
+                                            VALUES (NEW.symbol, NEW.account);
+                                        END; """
+# A symbol leaves the catalog of an account along with the last of its income that counted
+SQL_INCOME_SYMBOLS_REMOVE_OLD = f"""DELETE FROM income_symbols
+                                            WHERE symbol = OLD.symbol AND account = OLD.account
+                                                AND NOT EXISTS (
+                                                    SELECT 1 FROM income
+                                                    WHERE symbol = OLD.symbol
+                                                        AND account = OLD.account
+                                                        AND asset <> 'BNB'
+                                                        AND incomeType NOT IN {NON_PNL_INCOME_TYPES}
+                                                );"""
+SQL_CREATE_INCOME_SYMBOLS_DELETE_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_symbols_delete
+                                        AFTER DELETE ON income
+                                        BEGIN
+                                            {SQL_INCOME_SYMBOLS_REMOVE_OLD}
+                                        END; """
+SQL_CREATE_INCOME_SYMBOLS_UPDATE_TRIGGER = f""" CREATE TRIGGER IF NOT EXISTS income_symbols_update
+                                        AFTER UPDATE OF account, symbol, incomeType, asset
+                                            ON income
+                                        BEGIN
+                                            {SQL_INCOME_SYMBOLS_REMOVE_OLD}
+                                            INSERT OR IGNORE INTO income_symbols
+                                            SELECT NEW.symbol, NEW.account
+                                            WHERE NEW.asset <> 'BNB' AND NEW.symbol <> ''
+                                                AND NEW.incomeType NOT IN {NON_PNL_INCOME_TYPES};
+                                        END; """
+
+
+def db_setup(database):
     # create a database connection
     conn = create_connection(database)
 
     # create tables
     if conn is not None:
-        create_table(conn, sql_create_income_table)
-        create_table(conn, sql_create_position_table)
-        create_table(conn, sql_create_account_table)
-        create_table(conn, sql_create_orders_table)
+        create_table(conn, SQL_CREATE_INCOME)
+        create_table(conn, SQL_CREATE_POSITIONS)
+        create_table(conn, SQL_CREATE_ACCOUNT)
+        create_table(conn, SQL_CREATE_ORDERS)
+        create_table(conn, SQL_CREATE_INCOME_BACKFILL)
+        create_table(conn, SQL_CREATE_INGEST_STATE)
+        applied = migrate(conn)
+        conn.close()
+        return applied
     else:
         print("Error! cannot create the database connection.")
+        return []
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def upgrade_account_tables(conn):
+    """Tag the rows of a database created before accounts existed with the default account.
+
+    Tables whose key has to include the account are rebuilt, the others gain a column.
+    """
+    for table in ("positions", "account", "orders"):
+        if "account" not in table_columns(conn, table):
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN account text NOT NULL DEFAULT '{DEFAULT_ACCOUNT}'"
+            )
+    for table, create_table_sql in (
+        ("income", SQL_CREATE_INCOME),
+        ("income_backfill", SQL_CREATE_INCOME_BACKFILL),
+        ("ingest_state", SQL_CREATE_INGEST_STATE),
+    ):
+        columns = table_columns(conn, table)
+        if "account" not in columns:
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+            conn.execute(create_table_sql)
+            conn.execute(
+                f"INSERT INTO {table}({', '.join(columns)}) SELECT {', '.join(columns)} FROM {table}_old"
+            )
+            conn.execute(f"DROP TABLE {table}_old")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS account_name ON account(account)")
+
+
+# Indexes covering the page queries: the income sums of a time range, overall and of one symbol,
+# the fees per asset and the open orders of each side of a symbol
+SQL_CREATE_DASHBOARD_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS income_time ON income(time, incomeType, asset, income, symbol, account)",
+    "CREATE INDEX IF NOT EXISTS income_symbol_time ON income(symbol, time, incomeType, asset, income, account)",
+    "CREATE INDEX IF NOT EXISTS income_type_asset ON income(incomeType, asset, symbol, income, account)",
+    "CREATE INDEX IF NOT EXISTS orders_symbol_side ON orders(symbol, side, positionSide, account)",
+    "CREATE INDEX IF NOT EXISTS positions_symbol ON positions(symbol, account)",
+)
+
+
+def create_dashboard_indexes(conn):
+    for sql in SQL_CREATE_DASHBOARD_INDEXES:
+        conn.execute(sql)
+    # statistics for the query planner to choose between the indexes
+    conn.execute("ANALYZE")
+
+
+def rebuild_income_daily(conn):
+    """Recompute the daily income rollup from the stored income, returning the days written."""
+    conn.execute("DELETE FROM income_daily")
+    cur = conn.execute(
+        f"""INSERT INTO income_daily
+            SELECT account, time - time % {ROLLUP_DAY} AS day, COALESCE(symbol, ''),
+                COALESCE(incomeType, ''), COALESCE(asset, ''), SUM(income), COUNT(*)
+            FROM income GROUP BY 1, 2, 3, 4, 5"""
+    )
+    return cur.rowcount
+
+
+def create_income_daily(conn):
+    conn.execute(SQL_CREATE_INCOME_DAILY)
+    conn.execute(SQL_CREATE_INCOME_DAILY_INDEX)
+    conn.execute(SQL_CREATE_INCOME_DAILY_TRIGGER)
+    rebuild_income_daily(conn)
+    conn.execute("ANALYZE income_daily")
+
+
+def create_income_daily_type_index(conn):
+    conn.execute(SQL_CREATE_INCOME_DAILY_TYPE_INDEX)
+    conn.execute("ANALYZE income_daily")
+
+
+def create_income_daily_changes(conn):
+    conn.execute(SQL_CREATE_INCOME_DAILY_DELETE_TRIGGER)
+    conn.execute(SQL_CREATE_INCOME_DAILY_UPDATE_TRIGGER)
+
+
+def rebuild_income_equity(conn):
+    """Recompute the running income total from the stored income, returning the nodes written."""
+    conn.execute("DELETE FROM income_equity")
+    cur = conn.execute(
+        f"""INSERT INTO income_equity
+            SELECT node, account, SUM(income) FROM (
+                SELECT DISTINCT (day | ((1 << column1) - 1)) + 1 AS node, account, day, income
+                FROM (
+                    SELECT time / {ROLLUP_DAY} AS day, account, SUM(income) AS income
+                    FROM income
+                    WHERE asset <> 'BNB' AND incomeType NOT IN {NON_PNL_INCOME_TYPES}
+                        AND time >= 0
+                    GROUP BY 1, 2
+                ), ({SQL_EQUITY_LEVELS})
+            )
+            GROUP BY node, account"""
+    )
+    return cur.rowcount
+
+
+def create_income_equity(conn):
+    conn.execute(SQL_CREATE_INCOME_EQUITY)
+    conn.execute(SQL_CREATE_INCOME_EQUITY_TRIGGER)
+    rebuild_income_equity(conn)
+
+
+def create_income_equity_changes(conn):
+    conn.execute(SQL_CREATE_INCOME_EQUITY_DELETE_TRIGGER)
+    conn.execute(SQL_CREATE_INCOME_EQUITY_UPDATE_TRIGGER)
+
+
+def rebuild_income_symbols(conn):
+    """Recompute the symbol catalog from the stored income, returning the symbols written."""
+    conn.execute("DELETE FROM income_symbols")
+    cur = conn.execute(
+        f"""INSERT INTO income_symbols
+            SELECT DISTINCT symbol, account FROM income
+            WHERE asset <> 'BNB' AND symbol <> '' AND incomeType NOT IN {NON_PNL_INCOME_TYPES}"""
+    )
+    return cur.rowcount
+
+
+def create_income_symbols(conn):
+    conn.execute(SQL_CREATE_INCOME_SYMBOLS)
+    conn.execute(SQL_CREATE_INCOME_SYMBOLS_TRIGGER)
+    rebuild_income_symbols(conn)
+
+
+def create_income_symbols_changes(conn):
+    conn.execute(SQL_CREATE_INCOME_SYMBOLS_DELETE_TRIGGER)
+    conn.execute(SQL_CREATE_INCOME_SYMBOLS_UPDATE_TRIGGER)
+
+
+# Schema changes on top of the tables above, in the order they were made. A database records how
+# many it went through in its user_version, so each one runs once. Append new ones at the end and
+# never change one that was released.
+SCHEMA_MIGRATIONS = (
+    ("Tag rows with their account", upgrade_account_tables),
+    ("Index the dashboard queries", create_dashboard_indexes),
+    ("Roll up income by day", create_income_daily),
+    ("Keep a running total of income", create_income_equity),
+    ("Catalog the symbols with income", create_income_symbols),
+    ("Index the fees of the income rollup", create_income_daily_type_index),
+    ("Roll up income changed or removed by hand", create_income_daily_changes),
+    ("Keep the running total of income changed or removed by hand", create_income_equity_changes),
+    ("Catalog the symbols of income changed or removed by hand", create_income_symbols_changes),
+)
+
+
+def migrate(conn):
+    """Apply the schema migrations the database of ``conn`` misses, returning their descriptions.
+
+    Each migration commits on its own. Processes starting at the same time take turns, the write
+    lock held while the version is read keeps them from running a migration twice.
+    """
+    applied = []
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(SCHEMA_MIGRATIONS):
+                conn.rollback()
+                return applied
+            description, upgrade = SCHEMA_MIGRATIONS[version]
+            upgrade(conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(description)
+
+
+# The statements are kept as module constants so every page is written with the exact same SQL
+# text and sqlite3 can reuse the prepared statement from the connection's statement cache.
+# Income rows never change, so the ones fetched again are skipped instead of replaced (OR IGNORE
+# takes precedence over the ON CONFLICT REPLACE of the table).
+SQL_INSERT_INCOME = """ INSERT OR IGNORE INTO income(tranId, symbol, incomeType, income, asset, info, time, tradeId, account)
+              VALUES(?,?,?,?,?,?,?,?,?) """
+SQL_INSERT_POSITION = """ INSERT INTO positions(unrealizedProfit, leverage, entryPrice, positionAmt, symbol, positionSide, account) VALUES(?,?,?,?,?,?,?) """
+SQL_INSERT_ORDER = """ INSERT INTO orders(origQty, price, side, positionSide, status, symbol, time, type, account) VALUES(?,?,?,?,?,?,?,?,?) """
 
 
 # income interactions
-def create_income(conn, income):
-    sql = """ INSERT INTO income(tranId, symbol, incomeType, income, asset, info, time, tradeId)
-              VALUES(?,?,?,?,?,?,?,?) """
+def create_income(conn, income, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
-    cur.execute(sql, income)
+    cur.execute(SQL_INSERT_INCOME, (*income, account))
+    ROWS_INGESTED.inc(account, "income")
 
 
-def select_latest_income(conn):
+def create_income_batch(conn, incomes, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
-    cur.execute("SELECT time FROM income ORDER BY time DESC LIMIT 0, 1")
-    return cur.fetchone()
+    cur.executemany(SQL_INSERT_INCOME, [(*income, account) for income in incomes])
+    ROWS_INGESTED.inc(account, "income", amount=max(cur.rowcount, 0))
+    return cur.rowcount
+
+
+def select_latest_income(conn, account=DEFAULT_ACCOUNT):
+    cur = conn.cursor()
+    cur.execute("SELECT MAX(time) FROM income WHERE account = ?", (account,))
+    latest = cur.fetchone()
+    return None if latest[0] is None else latest
+
+
+def select_income_watermark(conn, account=DEFAULT_ACCOUNT):
+    """Return the time of the newest income of ``account`` ingested so far, or None without any.
+
+    The watermark is read from the ingest state. Databases written before it existed get it once
+    from the stored income.
+    """
+    state = select_ingest_state(conn, "income", "", account)
+    if state is not None:
+        return state[2]
+    latest = select_latest_income(conn, account)
+    if latest is None:
+        return None
+    update_ingest_state(conn, "income", "", None, None, latest[0], account)
+    return latest[0]
+
+
+def create_backfill_windows(conn, start, end, window=BACKFILL_WINDOW, account=DEFAULT_ACCOUNT):
+    size = int(window.total_seconds() * 1000)
+    windows = [
+        (window_start, min(window_start + size, end), window_start, account)
+        for window_start in range(start, end, size)
+    ]
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT OR IGNORE INTO income_backfill(windowStart, windowEnd, progress, account) VALUES(?,?,?,?)",
+        windows,
+    )
+
+
+def select_backfill_windows(conn, pending=True, account=DEFAULT_ACCOUNT):
+    cur = conn.cursor()
+    sql = "SELECT windowStart, windowEnd, progress FROM income_backfill WHERE account = ?"
+    if pending:
+        sql += " AND completed = 0"
+    cur.execute(sql + " ORDER BY windowStart DESC", (account,))
+    return cur.fetchall()
 
 
-def select_latest_income_symbol(conn, symbol):
+def update_backfill_window(conn, window_start, progress, completed, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
     cur.execute(
-        "SELECT time FROM income WHERE symbol = ? ORDER BY time DESC LIMIT 0, 1",
-        (symbol,),
+        "UPDATE income_backfill SET progress = ?, completed = ? WHERE account = ? AND windowStart = ?",
+        (progress, int(completed), account, window_start),
+    )
+
+
+def select_ingest_state(conn, stream, symbol, account=DEFAULT_ACCOUNT):
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT cursor, cursorStart, watermark FROM ingest_state WHERE account = ? AND stream = ? AND symbol = ?",
+        (account, stream, symbol),
     )
     return cur.fetchone()
 
 
+def update_ingest_state(
+    conn, stream, symbol, cursor, cursor_start, watermark, account=DEFAULT_ACCOUNT
+):
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT OR REPLACE INTO ingest_state(stream, symbol, cursor, cursorStart, watermark, account) VALUES(?,?,?,?,?,?)",
+        (stream, symbol, cursor, cursor_start, watermark, account),
+    )
+
+
+def select_latest_income_symbol(conn, symbol, account=DEFAULT_ACCOUNT):
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT MAX(time) FROM income WHERE account = ? AND symbol = ?", (account, symbol)
+    )
+    latest = cur.fetchone()
+    return None if latest[0] is None else latest
+
+
 # position interactions
-def create_position(conn, position):
-    sql = """ INSERT INTO positions(unrealizedProfit, leverage, entryPrice, positionAmt, symbol, positionSide) VALUES(?,?,?,?,?,?) """
+def create_position(conn, position, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
-    cur.execute(sql, position)
+    cur.execute(SQL_INSERT_POSITION, (*position, account))
+    ROWS_INGESTED.inc(account, "positions")
 
 
-def update_position(conn, position):
-    sql = """ UPDATE positions SET unrealizedProfit = ?, leverage = ?, entryPrice = ?, positionAmt = ? WHERE symbol = ? AND positionSide = ? """
+def create_position_batch(conn, positions, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
-    cur.execute(sql, position)
+    cur.executemany(SQL_INSERT_POSITION, [(*position, account) for position in positions])
+    ROWS_INGESTED.inc(account, "positions", amount=max(cur.rowcount, 0))
+    return cur.rowcount
+
+
+SQL_UPDATE_POSITION = """ UPDATE positions SET unrealizedProfit = ?, leverage = ?, entryPrice = ?, positionAmt = ? WHERE symbol = ? AND positionSide = ? AND account = ? """
 
 
-def delete_all_positions(conn):
-    sql = """ DELETE FROM positions """
+def update_position(conn, position, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
-    cur.execute(sql)
+    cur.execute(SQL_UPDATE_POSITION, (*position, account))
+    ROWS_INGESTED.inc(account, "positions")
+
+
+def sync_positions(conn, positions, account=DEFAULT_ACCOUNT):
+    """Apply only the changes needed for the positions of ``account`` to match a fetched snapshot.
+
+    Positions are keyed on (symbol, positionSide) and zero-size positions are not stored.
+    Returns the number of inserted, updated and deleted rows.
+    """
+    stored, deletes = {}, []
+    for pid, symbol, side, *values in conn.execute(
+        "SELECT PID, symbol, positionSide, unrealizedProfit, leverage, entryPrice, positionAmt FROM positions WHERE account = ?",
+        (account,),
+    ):
+        if (symbol, side) in stored or not values[3]:
+            deletes.append((pid,))
+        else:
+            stored[(symbol, side)] = (pid, tuple(values))
+
+    inserts, updates = [], []
+    for position in positions:
+        if not position[3]:
+            continue
+        current = stored.pop((position[4], position[5]), None)
+        if current is None:
+            inserts.append((*position, account))
+        elif current[1] != tuple(position[:4]):
+            updates.append((*position, account))
+    deletes.extend((pid,) for pid, _ in stored.values())
+
+    cur = conn.cursor()
+    cur.executemany(SQL_INSERT_POSITION, inserts)
+    cur.executemany(SQL_UPDATE_POSITION, updates)
+    cur.executemany("DELETE FROM positions WHERE PID = ?", deletes)
+    ROWS_INGESTED.inc(account, "positions", amount=len(inserts) + len(updates))
+    return len(inserts), len(updates), len(deletes)
+
+
+def delete_all_positions(conn, account=DEFAULT_ACCOUNT):
+    sql = """ DELETE FROM positions WHERE account = ? """
+    cur = conn.cursor()
+    cur.execute(sql, (account,))
     conn.commit()
 
 
-def select_position(conn, symbol):
+def select_position(conn, symbol, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
     cur.execute(
-        "SELECT unrealizedProfit FROM positions WHERE symbol = ? AND positionSide = ? LIMIT 0, 1",
+        "SELECT unrealizedProfit FROM positions WHERE symbol = ? AND positionSide = ? AND account = ? LIMIT 0, 1",
         (
             symbol[0],
             symbol[1],
+            account,
         ),
     )
     return cur.fetchone()
 
 
 # account interactions
-def create_account(conn, account):
-    sql = """ INSERT INTO account(totalWalletBalance, totalUnrealizedProfit, totalMarginBalance, availableBalance, maxWithdrawAmount, AID) VALUES(?,?,?,?,?,?) """
+def create_account(conn, totals, account=DEFAULT_ACCOUNT):
+    sql = """ INSERT INTO account(totalWalletBalance, totalUnrealizedProfit, totalMarginBalance, availableBalance, maxWithdrawAmount, account) VALUES(?,?,?,?,?,?) """
     cur = conn.cursor()
-    cur.execute(sql, account)
+    cur.execute(sql, (*totals, account))
+    ROWS_INGESTED.inc(account, "account")
 
 
-def update_account(conn, account):
-    sql = """ UPDATE account SET totalWalletBalance = ?, totalUnrealizedProfit = ?, totalMarginBalance = ?, availableBalance = ?, maxWithdrawAmount = ? WHERE AID = ?"""
+def update_account(conn, totals, account=DEFAULT_ACCOUNT):
+    sql = """ UPDATE account SET totalWalletBalance = ?, totalUnrealizedProfit = ?, totalMarginBalance = ?, availableBalance = ?, maxWithdrawAmount = ? WHERE account = ?"""
     cur = conn.cursor()
-    cur.execute(sql, account)
+    cur.execute(sql, (*totals, account))
+    ROWS_INGESTED.inc(account, "account")
 
 
-def select_account(conn):
+def select_account(conn, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
-    cur.execute("SELECT totalWalletBalance FROM account LIMIT 0, 1")
+    cur.execute(
+        "SELECT totalWalletBalance FROM account WHERE account = ? LIMIT 0, 1", (account,)
+    )
     return cur.fetchone()
 
 
 # orders interactions
-def delete_all_orders(conn):
-    sql = """ DELETE FROM orders """
+def delete_all_orders(conn, account=DEFAULT_ACCOUNT):
+    sql = """ DELETE FROM orders WHERE account = ? """
     cur = conn.cursor()
-    cur.execute(sql)
+    cur.execute(sql, (account,))
     conn.commit()
 
 
-def create_orders(conn, orders):
-    sql = """ INSERT INTO orders(origQty, price, side, positionSide, status, symbol, time, type) VALUES(?,?,?,?,?,?,?,?) """
+def create_orders(conn, orders, account=DEFAULT_ACCOUNT):
     cur = conn.cursor()
-    cur.execute(sql, orders)
+    cur.execute(SQL_INSERT_ORDER, (*orders, account))
+    ROWS_INGESTED.inc(account, "orders")
 
 
-def scrape(app=None):
-    try:
-        _scrape(app=app)
-    except HTTPRequestError as exc:
-        if app is None:
-            print(exc)
-        else:
-            app.logger.error(f"{exc}")
+def create_orders_batch(conn, orders, account=DEFAULT_ACCOUNT):
+    cur = conn.cursor()
+    cur.executemany(SQL_INSERT_ORDER, [(*order, account) for order in orders])
+    ROWS_INGESTED.inc(account, "orders", amount=max(cur.rowcount, 0))
+    return cur.rowcount
+
+
+def sync_orders(conn, orders, account=DEFAULT_ACCOUNT):
+    """Apply only the changes needed for the orders of ``account`` to match a fetched snapshot.
+
+    An order is identified by everything but its status and time, which are updated in place.
+    The user data stream has no creation time to store, so the time of an order it inserted is
+    replaced by the one of the snapshot rather than the order being replaced.
+    Returns the number of inserted, updated and deleted rows.
+    """
+    stored = defaultdict(list)
+    for oid, status, created, *identity in conn.execute(
+        "SELECT OID, status, time, origQty, price, side, positionSide, symbol, type FROM orders WHERE account = ?",
+        (account,),
+    ):
+        stored[tuple(identity)].append((oid, status, created))
+
+    inserts, updates = [], []
+    for order in orders:
+        matches = stored.get((*order[:4], order[5], order[7]))
+        if not matches:
+            inserts.append((*order, account))
+            continue
+        oid, status, created = matches.pop()
+        if status != order[4] or created != order[6]:
+            updates.append((order[4], order[6], oid))
+    deletes = [(oid,) for matches in stored.values() for oid, _, _ in matches]
 
+    cur = conn.cursor()
+    cur.executemany(SQL_INSERT_ORDER, inserts)
+    cur.executemany("UPDATE orders SET status = ?, time = ? WHERE OID = ?", updates)
+    cur.executemany("DELETE FROM orders WHERE OID = ?", deletes)
+    ROWS_INGESTED.inc(account, "orders", amount=len(inserts) + len(updates))
+    return len(inserts), len(updates), len(deletes)
+
+
+# exchange responses to table rows
+def binance_income_row(income):
+    return (
+        int(income["tranId"]),
+        income["symbol"],
+        income["incomeType"],
+        income["income"],
+        income["asset"],
+        income["info"],
+        int(income["time"]),
+        int(income["tradeId"]) if income["tradeId"] else 0,
+    )
 
-# flake8: noqa: C901
-def _scrape(app=None):
-    start = time.time()
-    db_setup(current_app.config["DATABASE"])
 
-    up_to_date = False
-    weightused = 0
-    processed, updated_positions, new_positions, updated_orders, sleeps = 0, 0, 0, 0, 0
+def binance_order_row(order):
+    return (
+        float(order["origQty"]),
+        float(order["price"]),
+        order["side"],
+        order["positionSide"],
+        order["status"],
+        order["symbol"],
+        int(order["time"]),
+        order["type"],
+    )
 
-    if current_app.config["EXCHANGE"].lower() == "binance":
-        if weightused < 800:
-            responseHeader, responseJSON = send_signed_request(
-                "GET", "/fapi/v1/openOrders"
-            )
-            weightused = int(responseHeader["X-MBX-USED-WEIGHT-1M"])
-
-            with create_connection(current_app.config["DATABASE"]) as conn:
-                delete_all_orders(conn)
-                for order in responseJSON:
-                    updated_orders += 1
-                    row = (
-                        float(order["origQty"]),
-                        float(order["price"]),
-                        order["side"],
-                        order["positionSide"],
-                        order["status"],
-                        order["symbol"],
-                        int(order["time"]),
-                        order["type"],
-                    )
-                    create_orders(conn, row)
-                conn.commit()
 
-        responseHeader, responseJSON = send_signed_request("GET", "/fapi/v2/account")
-        weightused = int(responseHeader["X-MBX-USED-WEIGHT-1M"])
+def binance_position_row(position):
+    return (
+        float(position["unrealizedProfit"]),
+        int(position["leverage"]),
+        float(position["entryPrice"]),
+        float(position["positionAmt"]),
+        position["symbol"],
+        position["positionSide"],
+    )
 
-        overweight = False
-        try:
-            positions = responseJSON["positions"]
-        except Exception:
-            overweight = True
 
-        if not overweight:
-            with create_connection(current_app.config["DATABASE"]) as conn:
-                totals_row = (
-                    float(responseJSON["totalWalletBalance"]),
-                    float(responseJSON["totalUnrealizedProfit"]),
-                    float(responseJSON["totalMarginBalance"]),
-                    float(responseJSON["availableBalance"]),
-                    float(responseJSON["maxWithdrawAmount"]),
-                    1,
-                )
-                accountCheck = select_account(conn)
-                if accountCheck is None:
-                    create_account(conn, totals_row)
-                elif float(accountCheck[0]) != float(
-                    responseJSON["totalWalletBalance"]
-                ):
-                    update_account(conn, totals_row)
-
-                delete_all_positions(conn)
-
-                for position in positions:
-                    position_row = (
-                        float(position["unrealizedProfit"]),
-                        int(position["leverage"]),
-                        float(position["entryPrice"]),
-                        float(position["positionAmt"]),
-                        position["symbol"],
-                        position["positionSide"],
-                    )
+BYBIT_POSITION_SIDES = {"buy": "LONG", "sell": "SHORT"}
 
-                    create_position(conn, position_row)
-                    updated_positions += 1
+BYBIT_EXEC_TYPES = {
+    "Trade": "REALIZED_PNL",
+    "Funding": "FUNDING_FEE",
+    "AdlTrade": "ADLTRADE",
+    "BustTrade": "BUSTTRADE",
+}
 
-                conn.commit()
 
-        while not up_to_date:
-            if weightused > 800:
-                print(
-                    f"Weight used: {weightused}/800\nProcessed: {processed}\nSleep: 1 minute"
-                )
-                sleeps += 1
-                time.sleep(60)
-
-            with create_connection(current_app.config["DATABASE"]) as conn:
-                startTime = select_latest_income(conn)
-                if startTime is None:
-                    startTime = int(
-                        datetime.fromisoformat("2020-01-01 00:00:00+00:00").timestamp()
-                        * 1000
-                    )
-                else:
-                    startTime = startTime[0]
+def bybit_position_row(position):
+    return (
+        float(position["unrealisedPnl"]),
+        int(position["leverage"]),
+        float(position["avgPrice"]),
+        float(position["size"]),
+        position["symbol"],
+        BYBIT_POSITION_SIDES[position["side"].lower()],
+    )
 
-                params = {"startTime": startTime + 1, "limit": 1000}
 
-                responseHeader, responseJSON = send_signed_request(
-                    http_method="GET", url_path="/fapi/v1/income", payload=params
-                )
-                weightused = int(responseHeader["X-MBX-USED-WEIGHT-1M"])
+def bybit_order_row(order, positionside):
+    return (
+        float(order["qty"]),
+        float(order["price"]),
+        order["side"].upper(),
+        positionside,
+        order["orderStatus"],
+        order["symbol"],
+        int(order["createdTime"]),
+        order["orderType"],
+    )
 
-                if len(responseJSON) == 0:
-                    up_to_date = True
-                else:
-                    for income in responseJSON:
-                        if len(income["tradeId"]) == 0:
-                            income["tradeId"] = 0
-                        income_row = (
-                            int(income["tranId"]),
-                            income["symbol"],
-                            income["incomeType"],
-                            income["income"],
-                            income["asset"],
-                            income["info"],
-                            int(income["time"]),
-                            int(income["tradeId"]),
-                        )
-                        create_income(conn, income_row)
-                        processed += 1
-
-                    conn.commit()
-    elif current_app.config["EXCHANGE"].lower() == "bybit":
-        all_symbols = []
-        exec_type = {
-            "Trade": "REALIZED_PNL",
-            "Funding": "FUNDING_FEE",
-            "AdlTrade": "ADLTRADE",
-            "BustTrade": "BUSTTRADE",
-        }
-
-        params = {"category": "linear", "limit": 200, "settleCoin": "USDT"}
-        responseHeader, responseJSON = send_signed_request(
-            http_method="GET",
-            url_path="/v5/position/list",
-            payload=params,
-            exchange="bybit",
+
+def bybit_income_row(symbol, trade):
+    income_type = BYBIT_EXEC_TYPES[trade["execType"]]
+    return (
+        trade["orderId"],
+        symbol,
+        income_type,
+        trade["closedPnl"],
+        "USDT",
+        income_type,
+        int(trade["createdTime"]),
+        trade["orderId"],
+    )
+
+
+def closed_pnl_progress(conn, symbol, account=DEFAULT_ACCOUNT):
+    """Return where the Bybit closed PnL of ``symbol`` resumes, as its pagination cursor, the
+    start of its current window and its time watermark.
+
+    A saved cursor carries on within its window. Otherwise the next window starts after the
+    watermark, at most two years back, which is all the history Bybit keeps.
+    """
+    state = select_ingest_state(conn, "closed_pnl", symbol, account)
+    if state is not None and state[0]:
+        return state
+    if state is not None:
+        watermark = state[2]
+    else:
+        latest = select_latest_income_symbol(conn, symbol, account)
+        watermark = BACKFILL_START - 1 if latest is None else int(latest[0])
+    two_years_ago = int((datetime.now() - BYBIT_CLOSED_PNL_HISTORY).timestamp() * 1000)
+    return None, max(watermark + 1, two_years_ago), watermark
+
+
+def write_income_page(conn, page, account=DEFAULT_ACCOUNT):
+    """Store one page of income rows with the progress it stands for, in a single transaction.
+
+    A page is a ``(rows, save_progress)`` pair, where ``save_progress`` records in ``conn`` how
+    far its source got, so an interrupted scrape resumes after the last stored page.
+    """
+    income_rows, save_progress = page
+    processed = create_income_batch(conn, income_rows, account)
+    save_progress(conn)
+    conn.commit()
+    return processed
+
+
+def fetch_bybit_positions():
+    params = {"category": "linear", "limit": 200, "settleCoin": "USDT"}
+    responseHeader, responseJSON = send_signed_request(
+        http_method="GET",
+        url_path="/v5/position/list",
+        payload=params,
+        exchange="bybit",
+    )
+    if "result" not in responseJSON:
+        current_app.logger.warning("Positions: 'result' not in responseJSON")
+        return None
+    if "list" not in responseJSON["result"]:
+        current_app.logger.warning("Positions: 'list' not in responseJSON['result']")
+        return None
+    return responseJSON["result"]["list"]
+
+
+def scrape_binance_orders():
+    responseHeader, responseJSON = send_signed_request("GET", "/fapi/v1/openOrders")
+
+    order_rows = [binance_order_row(order) for order in responseJSON]
+    with scrape_connection() as conn:
+        orders_synced = sync_orders(conn, order_rows, current_account()["NAME"])
+        conn.commit()
+    return {"orders": orders_synced}
+
+
+def scrape_binance_account():
+    responseHeader, responseJSON = send_signed_request("GET", "/fapi/v2/account")
+
+    try:
+        positions = responseJSON["positions"]
+    except Exception:
+        return {}
+
+    account = current_account()["NAME"]
+    with scrape_connection() as conn:
+        totals_row = (
+            float(responseJSON["totalWalletBalance"]),
+            float(responseJSON["totalUnrealizedProfit"]),
+            float(responseJSON["totalMarginBalance"]),
+            float(responseJSON["availableBalance"]),
+            float(responseJSON["maxWithdrawAmount"]),
         )
-        if "rate_limit_status" in responseJSON:
-            weightused = int(responseJSON["rate_limit_status"])
-
-        with create_connection(current_app.config["DATABASE"]) as conn:
-            app.logger.info("Deleting orders and positions from db")
-            delete_all_orders(conn)
-            delete_all_positions(conn)
-            app.logger.info("Loading orders and positions from exchange")
-            if "result" in responseJSON:
-                if "list" in responseJSON["result"]:
-                    for position in responseJSON["result"]["list"]:
-                        if weightused > 50:
-                            print(
-                                f"Weight used: {weightused}/{120-weightused}\nProcessed: {updated_positions + new_positions + updated_orders}\nSleep: 1 minute"
-                            )
-                            sleeps += 1
-                            time.sleep(60)
-                            weightused = 0
-
-                        if position["symbol"] not in all_symbols:
-                            all_symbols.append(position["symbol"])
-
-                        if float(position["size"]) > 0:
-                            position_sides = {"buy": "LONG", "sell": "SHORT"}
-                            positionside = position_sides[position["side"].lower()]
-
-                            position_row = (
-                                float(position["unrealisedPnl"]),
-                                int(position["leverage"]),
-                                float(position["avgPrice"]),
-                                float(position["size"]),
-                                position["symbol"],
-                                positionside,
-                            )
-
-                            create_position(conn, position_row)
-                            updated_positions += 1
-
-                            params = {
-                                "symbol": position["symbol"],
-                                "category": "linear",
-                            }
-                            responseHeader, responseJSON = send_signed_request(
-                                http_method="GET",
-                                url_path="/v5/order/realtime",
-                                payload=params,
-                                exchange="bybit",
-                            )
-                            if "rate_limit_status" in responseJSON:
-                                weightused = int(responseJSON["rate_limit_status"])
-                            else:
-                                weightused += 1
-
-                            if "result" in responseJSON:
-                                if "list" in responseJSON["result"]:
-                                    for order in responseJSON["result"]["list"]:
-                                        updated_orders += 1
-
-                                        orderside = order["side"].upper()
-
-                                        row = (
-                                            float(order["qty"]),
-                                            float(order["price"]),
-                                            orderside,
-                                            positionside,
-                                            order["orderStatus"],
-                                            order["symbol"],
-                                            int(order["createdTime"]),
-                                            order["orderType"],
-                                        )
-                                        create_orders(conn, row)
-                                else:
-                                    app.logger.warning(
-                                        "Orders: 'list' not in responseJSON['result']"
-                                    )
-                            else:
-                                app.logger.warning(
-                                    "Orders: 'result' not in responseJSON"
-                                )
-                else:
-                    app.logger.warning(
-                        "Positions: 'list' not in responseJSON['result']"
-                    )
-            else:
-                app.logger.warning("Positions: 'result' not in responseJSON")
+        balance_updated = 0
+        accountCheck = select_account(conn, account)
+        if accountCheck is None:
+            create_account(conn, totals_row, account)
+            balance_updated = 1
+        elif float(accountCheck[0]) != float(responseJSON["totalWalletBalance"]):
+            update_account(conn, totals_row, account)
+            balance_updated = 1
+
+        position_rows = [binance_position_row(position) for position in positions]
+        positions_synced = sync_positions(conn, position_rows, account)
+        conn.commit()
+    return {"positions": positions_synced, "balance": balance_updated}
+
+
+class BinanceAdapter:
+    """The Binance income history as page sources for the ingest pipeline.
+
+    The first scrape of an account splits its history into windows fetched side by side, later
+    scrapes page forward from the income watermark.
+    """
+
+    exchange = "binance"
+
+    def backfill_sources(self, conn, account):
+        if select_income_watermark(conn, account) is None and not select_backfill_windows(
+            conn, pending=False, account=account
+        ):
+            create_backfill_windows(conn, BACKFILL_START, get_timestamp(), account=account)
+            conn.commit()
+        windows = select_backfill_windows(conn, account=account)
+        if windows:
+            current_app.logger.info(f"Backfilling income history: {len(windows)} windows")
+        return [self.backfill_pages(window, account) for window in windows]
+
+    def income_sources(self, conn, account):
+        watermark = select_income_watermark(conn, account)
+        return [self.income_pages(BACKFILL_START if watermark is None else watermark, account)]
+
+    def backfill_pages(self, window, account):
+        window_start, window_end, progress = window
+        completed = False
+        while not completed:
+            params = {"startTime": progress, "endTime": window_end, "limit": 1000}
+            responseHeader, responseJSON = send_signed_request(
+                http_method="GET", url_path="/fapi/v1/income", payload=params
+            )
+            completed = len(responseJSON) < 1000
+            if not completed:
+                progress = int(responseJSON[-1]["time"]) + 1
+            income_rows = [binance_income_row(income) for income in responseJSON]
+            yield income_rows, functools.partial(
+                update_backfill_window,
+                window_start=window_start,
+                progress=progress,
+                completed=completed,
+                account=account,
+            )
 
-            params = {"coin": "USDT", "accountType": "CONTRACT"}
+    def income_pages(self, watermark, account):
+        while True:
+            params = {"startTime": watermark + 1, "limit": 1000}
             responseHeader, responseJSON = send_signed_request(
-                http_method="GET",
-                url_path="/v5/account/wallet-balance",
-                payload=params,
-                exchange="bybit",
+                http_method="GET", url_path="/fapi/v1/income", payload=params
+            )
+            if len(responseJSON) == 0:
+                return
+            income_rows = [binance_income_row(income) for income in responseJSON]
+            watermark = max(row[6] for row in income_rows)
+            yield income_rows, functools.partial(
+                update_ingest_state,
+                stream="income",
+                symbol="",
+                cursor=None,
+                cursor_start=None,
+                watermark=watermark,
+                account=account,
             )
-            app.logger.info("Updating wallet balance from exchange")
-            if "result" in responseJSON:
-                if "list" in responseJSON["result"]:
-                    if (
-                        responseJSON["result"]["list"][0]["totalMaintenanceMargin"]
-                        == ""
-                    ):
-                        maintenance_margin = 0.0
-                    else:
-                        maintenance_margin = float(
-                            responseJSON["result"]["list"][0]["totalMaintenanceMargin"]
-                        )
-
-                    totals_row = (
-                        float(
-                            responseJSON["result"]["list"][0]["coin"][0][
-                                "walletBalance"
-                            ]
-                        ),
-                        float(
-                            responseJSON["result"]["list"][0]["coin"][0][
-                                "unrealisedPnl"
-                            ]
-                        ),
-                        maintenance_margin,
-                        float(
-                            responseJSON["result"]["list"][0]["coin"][0][
-                                "availableToWithdraw"
-                            ]
-                        ),
-                        float(0),
-                        1,
-                    )
 
-                    accountCheck = select_account(conn)
-                    if accountCheck is None:
-                        create_account(conn, totals_row)
-                    elif float(accountCheck[0]) != float(
-                        responseJSON["result"]["list"][0]["coin"][0]["walletBalance"]
-                    ):
-                        update_account(conn, totals_row)
 
-                    conn.commit()
-                else:
-                    app.logger.warning("Wallet: 'list' not in responseJSON['result']")
-            else:
-                app.logger.warning("Wallet: 'result' not in responseJSON")
+class BybitAdapter:
+    """The Bybit closed PnL as page sources for the ingest pipeline, one source per symbol.
 
-        all_symbols = sorted(all_symbols)
-        app.logger.info("Updating closed PnL from exchange")
-        for symbol in all_symbols:
-            trades = {}
+    Each symbol is walked in windows of at most seven days, following the pagination cursor
+    within each window. The cursor and the watermark are saved with every page.
+    """
+
+    exchange = "bybit"
+
+    def backfill_sources(self, conn, account):
+        # the closed PnL sources walk the whole history Bybit keeps by themselves
+        return []
+
+    def income_sources(self, conn, account):
+        positions = fetch_bybit_positions()
+        if positions is None:
+            return []
+        now = get_timestamp()
+        return [
+            self.closed_pnl_pages(symbol, *closed_pnl_progress(conn, symbol, account), now, account)
+            for symbol in sorted({position["symbol"] for position in positions})
+        ]
+
+    def closed_pnl_pages(self, symbol, cursor, window_start, watermark, now, account):
+        window_size = int(BYBIT_CLOSED_PNL_WINDOW.total_seconds() * 1000)
+        while window_start <= now:
+            window_end = min(window_start + window_size - 1, now)
             params = {
                 "symbol": symbol,
                 "category": "linear",
                 "limit": 100,
+                "startTime": window_start,
+                "endTime": window_end,
             }
-            with create_connection(current_app.config["DATABASE"]) as conn:
-                startTime = select_latest_income_symbol(conn, symbol)
-                two_years_ago = datetime.now() - timedelta(days=729)
-                two_years_ago_timestamp = int(two_years_ago.timestamp() * 1000)
-                if startTime is None:
-                    startTime = int(
-                        datetime.fromisoformat("2020-01-01 00:00:00+00:00").timestamp()
-                        * 1000
-                    )
-                else:
-                    startTime = int(startTime[0]) + 1
-
-                if startTime < two_years_ago_timestamp:
-                    startTime = two_years_ago_timestamp
-                params["startTime"] = startTime
-
-            if weightused > 50:
-                print(
-                    f"Weight used: {weightused}/100\nProcessed: {processed}\nSleep: 1 minute"
-                )
-                sleeps += 1
-                time.sleep(60)
-                weightused = 0
-
-            # params["cursor"] = f"{page}"
+            if cursor:
+                params["cursor"] = cursor
             responseHeader, responseJSON = send_signed_request(
                 http_method="GET",
                 url_path="/v5/position/closed-pnl",
@@ -643,69 +1229,298 @@ def _scrape(app=None):
                 exchange="bybit",
             )
 
-            if "rate_limit_status" in responseJSON:
-                weightused = int(responseJSON["rate_limit_status"])
+            result = responseJSON.get("result")
+            if result is None:
+                current_app.logger.warning(
+                    f"Closed PNL {symbol}: 'result' not found in responseJSON"
+                )
+                return
+            if result.get("list") is None:
+                current_app.logger.warning(
+                    f"Closed PNL {symbol}: responseJSON['result']['list'] is None"
+                )
+                return
+
+            trades = {trade["createdTime"]: trade for trade in result["list"]}
+            income_rows = [bybit_income_row(symbol, trades[created]) for created in sorted(trades)]
+            cursor = result.get("nextPageCursor") or None
+            if not result["list"]:
+                cursor = None
+            if cursor is None:
+                watermark, window_start = window_end, window_end + 1
+            yield income_rows, functools.partial(
+                update_ingest_state,
+                stream="closed_pnl",
+                symbol=symbol,
+                cursor=cursor,
+                cursor_start=window_start,
+                watermark=watermark,
+                account=account,
+            )
+
+    def open_orders(self, position):
+        """Fetch the open orders of one position, as a single page of order rows."""
+        positionside = BYBIT_POSITION_SIDES[position["side"].lower()]
+        params = {"symbol": position["symbol"], "category": "linear"}
+        responseHeader, responseJSON = send_signed_request(
+            http_method="GET",
+            url_path="/v5/order/realtime",
+            payload=params,
+            exchange="bybit",
+        )
+
+        if "result" in responseJSON:
+            if "list" in responseJSON["result"]:
+                yield [
+                    bybit_order_row(order, positionside) for order in responseJSON["result"]["list"]
+                ]
             else:
-                weightused += 1
-
-            if "result" in responseJSON:
-                if responseJSON["result"] is not None:
-                    if "list" in responseJSON["result"]:
-                        if responseJSON["result"]["list"] is not None:
-                            for trade in responseJSON["result"]["list"]:
-                                trades[trade["createdTime"]] = [
-                                    trade["orderId"],
-                                    trade["execType"],
-                                    trade["closedPnl"],
-                                    trade["orderId"],
-                                ]
-
-                        else:
-                            app.logger.warning(
-                                "Closed PNL: responseJSON['result']['list'] is None"
-                            )
-                            break
-                    else:
-                        app.logger.warning(
-                            "Closed PNL: 'data' not found in responseJSON['result']['list']"
-                        )
-                        break
+                current_app.logger.warning("Orders: 'list' not in responseJSON['result']")
+        else:
+            current_app.logger.warning("Orders: 'result' not in responseJSON")
+
+
+ADAPTERS = {"binance": BinanceAdapter(), "bybit": BybitAdapter()}
+
+
+def ingest_pipeline():
+    """Return a pipeline fetching for the current account on ``BACKFILL_WORKERS`` threads,
+    stopped when the on-demand scrape it runs for is cancelled."""
+    return Pipeline(
+        current_app._get_current_object(),
+        current_account(),
+        current_app.config["BACKFILL_WORKERS"],
+        stop=g.get("scrape_cancelled"),
+    )
+
+
+def scrape_income(adapter):
+    """Bring the income of the current account up to date from the sources of ``adapter``.
+
+    The pending backfill is drained before the regular incremental sources, since those start
+    from the watermark the backfill leaves behind.
+    """
+    processed = 0
+    account = current_account()["NAME"]
+    with scrape_connection() as conn:
+        write = functools.partial(write_income_page, conn, account=account)
+        processed += ingest_pipeline().run(adapter.backfill_sources(conn, account), write)
+        processed += ingest_pipeline().run(adapter.income_sources(conn, account), write)
+    return {"trades": processed}
+
+
+def scrape_binance_income():
+    return scrape_income(ADAPTERS["binance"])
+
+
+def scrape_bybit_positions():
+    positions = fetch_bybit_positions()
+    order_rows = []
+    if positions is None:
+        return {}
+
+    account = current_account()["NAME"]
+    balance_updated = 0
+    with scrape_connection() as conn:
+        open_positions = [position for position in positions if float(position["size"]) > 0]
+        position_rows = [bybit_position_row(position) for position in open_positions]
+        ingest_pipeline().run(
+            (ADAPTERS["bybit"].open_orders(position) for position in open_positions),
+            order_rows.extend,
+        )
+
+        positions_synced = sync_positions(conn, position_rows, account)
+        orders_synced = sync_orders(conn, order_rows, account)
+        conn.commit()
+
+        params = {"coin": "USDT", "accountType": "CONTRACT"}
+        responseHeader, responseJSON = send_signed_request(
+            http_method="GET",
+            url_path="/v5/account/wallet-balance",
+            payload=params,
+            exchange="bybit",
+        )
+        if "result" in responseJSON:
+            if "list" in responseJSON["result"]:
+                if responseJSON["result"]["list"][0]["totalMaintenanceMargin"] == "":
+                    maintenance_margin = 0.0
                 else:
-                    app.logger.warning("Closed PNL: 'result' is None")
-                    break
+                    maintenance_margin = float(
+                        responseJSON["result"]["list"][0]["totalMaintenanceMargin"]
+                    )
+
+                totals_row = (
+                    float(responseJSON["result"]["list"][0]["coin"][0]["walletBalance"]),
+                    float(responseJSON["result"]["list"][0]["coin"][0]["unrealisedPnl"]),
+                    maintenance_margin,
+                    float(responseJSON["result"]["list"][0]["coin"][0]["availableToWithdraw"]),
+                    float(0),
+                )
+
+                accountCheck = select_account(conn, account)
+                if accountCheck is None:
+                    create_account(conn, totals_row, account)
+                    balance_updated = 1
+                elif float(accountCheck[0]) != float(
+                    responseJSON["result"]["list"][0]["coin"][0]["walletBalance"]
+                ):
+                    update_account(conn, totals_row, account)
+                    balance_updated = 1
+
+                conn.commit()
             else:
-                app.logger.warning("Closed PNL: 'result' not found in responseJSON")
-                break
-
-            if len(trades) > 0:
-                trades = OrderedDict(sorted(trades.items()))
-                with create_connection(current_app.config["DATABASE"]) as conn:
-                    for trade in trades:
-                        income_row = (
-                            trades[trade][0],
-                            symbol,
-                            exec_type[trades[trade][1]],
-                            trades[trade][2],
-                            "USDT",
-                            exec_type[trades[trade][1]],
-                            int(trade),
-                            trades[trade][0],
-                        )
-
-                        create_income(conn, income_row)
-                        processed += 1
-                    conn.commit()
-    else:
-        current_app.logger.info(
-            f"Exchange: {current_app.config['EXCHANGE']} is not currently supported"
+                current_app.logger.warning("Wallet: 'list' not in responseJSON['result']")
+        else:
+            current_app.logger.warning("Wallet: 'result' not in responseJSON")
+    return {"orders": orders_synced, "positions": positions_synced, "balance": balance_updated}
+
+
+def scrape_bybit_closed_pnl():
+    return scrape_income(ADAPTERS["bybit"])
+
+
+# (name, task, config key of its interval, priority) of every scrape routine, per exchange
+SCRAPE_TASKS = {
+    "binance": [
+        ("orders", scrape_binance_orders, "POSITIONS_SCRAPE_INTERVAL", 0),
+        ("account", scrape_binance_account, "POSITIONS_SCRAPE_INTERVAL", 0),
+        ("income", scrape_binance_income, "AUTO_SCRAPE_INTERVAL", 1),
+    ],
+    "bybit": [
+        ("positions", scrape_bybit_positions, "POSITIONS_SCRAPE_INTERVAL", 0),
+        ("closed_pnl", scrape_bybit_closed_pnl, "AUTO_SCRAPE_INTERVAL", 1),
+    ],
+}
+# Up to this fraction of its interval is randomly added to the wait before a task runs again
+SCRAPE_JITTER = 0.1
+
+
+def results_changed(results):
+    return any(value and value != (0, 0, 0) for value in results.values())
+
+
+_data_generation = 0
+
+
+def data_generation():
+    """Return a number that changes whenever a scrape task changed the database."""
+    return _data_generation
+
+
+def _count_generation(account, task, results):
+    global _data_generation
+    if results_changed(results):
+        _data_generation += 1
+
+
+# Called with the account name, the task name and the results after every scrape task
+scrape_listeners: list[Callable[[str, str, dict], None]] = [_count_generation]
+
+
+def notify_task(account, task, results):
+    for listener in list(scrape_listeners):
+        listener(account, task, results)
+
+
+def run_task(account, name, task):
+    """Run the scrape ``task`` of ``account``, recording it and notifying the listeners."""
+    results = observe_scrape(account, name, task)
+    notify_task(account, name, results)
+    return results
+
+
+def format_results(results):
+    summary = []
+    if "orders" in results:
+        summary.append("Orders updated: {1} (new: {0}, removed: {2})".format(*results["orders"]))
+    if "positions" in results:
+        summary.append(
+            "Positions updated: {1} (new: {0}, removed: {2})".format(*results["positions"])
         )
+    if "trades" in results:
+        summary.append(f"Trades processed: {results['trades']}")
+    if results.get("balance"):
+        summary.append("Balance updated")
+    return summary
+
+
+def scheduled_task(app, account, name, task, conn):
+    """Wrap ``task`` of ``account`` for the scheduler, logging its results whenever it changed anything.
+
+    The task writes through ``conn``, the connection shared by the tasks of the account.
+    """
+    label = name if len(app.config["ACCOUNTS"]) == 1 else f"{account['NAME']}/{name}"
+
+    def run():
+        with app.app_context(), account_lock(account["NAME"]):
+            g.account = account
+            g.scrape_conn = conn
+            start = time.time()
+            results = run_task(account["NAME"], name, task)
+            summary = "; ".join(format_results(results))
+            elapsed = timedelta(seconds=time.time() - start)
+            if results_changed(results):
+                app.logger.info(f"Scrape task {label}: {summary}; Time elapsed: {elapsed}")
+            else:
+                app.logger.debug(f"Scrape task {label}: nothing new; Time elapsed: {elapsed}")
+
+    return run
+
+
+def scrape(app=None):
+    """Run every scrape task of every account once, the accounts concurrently."""
+    accounts = current_app.config["ACCOUNTS"]
+    flask_app = current_app._get_current_object()
+    workers = min(len(accounts), current_app.config["SCRAPE_WORKERS"])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_scrape_account, flask_app, account, app) for account in accounts
+        ]
+        for future in futures:
+            future.result()
+
+
+def _scrape_account(flask_app, account, app=None):
+    with flask_app.app_context(), account_lock(account["NAME"]):
+        g.account = account
+        g.scrape_conn = create_connection(flask_app.config["DATABASE"])
+        try:
+            _scrape(app=app)
+        except HTTPRequestError as exc:
+            if app is None:
+                print(exc)
+            else:
+                app.logger.error(f"{exc}")
+        finally:
+            if g.scrape_conn is not None:
+                g.scrape_conn.close()
+
+
+def _scrape(app=None):
+    start = time.time()
+    account = current_account()
+
+    results = {"orders": (0, 0, 0), "positions": (0, 0, 0), "trades": 0}
+    governor = exchange_client().governor
+    governor_start = governor.stats()
+
+    tasks = SCRAPE_TASKS.get(account["EXCHANGE"].lower())
+    if tasks is None:
+        current_app.logger.info(f"Exchange: {account['EXCHANGE']} is not currently supported")
+    else:
+        for name, task, interval, priority in tasks:
+            results.update(run_task(account["NAME"], name, task))
 
     elapsed = time.time() - start
+    pacing = stats_since(governor, governor_start)
+    summary = format_results(results)
+    summary.append(f"Time elapsed: {timedelta(seconds=elapsed)}")
+    summary.append(
+        f"Sleeps: {pacing['sleeps']} ({pacing['slept']:.1f}s, saved {pacing['saved']:.1f}s)"
+    )
+    if len(current_app.config["ACCOUNTS"]) > 1:
+        summary.insert(0, f"Account: {account['NAME']}")
     if app is not None:
-        current_app.logger.info(
-            f"Orders updated: {updated_orders}; Positions updated: {updated_positions} (new: {new_positions}); Trades processed: {processed}; Time elapsed: {timedelta(seconds=elapsed)}; Sleeps: {sleeps}",
-        )
+        current_app.logger.info("; ".join(summary))
     else:
-        print(
-            f"Orders updated: {updated_orders}\nPositions updated: {updated_positions} (new: {new_positions})\nTrades processed: {processed}\nTime elapsed: {timedelta(seconds=elapsed)}\nSleeps: {sleeps}"
-        )
+        print("\n".join(summary))
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import threading
+
+from flask import current_app
+from flask import g
+
+from futuresboard import codec
+from futuresboard import scraper
+from futuresboard.config import DEFAULT_ACCOUNT
+from futuresboard.metrics import ROWS_INGESTED
+from futuresboard.ws import WebSocket
+from futuresboard.ws import WebSocketError
+
+# How often the keepalive runs: the Binance listen key expires after 60 minutes without a renewal
+# and Bybit drops private connections that have not pinged for a while
+KEEPALIVE_INTERVAL = {"binance": 30 * 60, "bybit": 20}
+# Reconnect back-off bounds, in seconds
+RECONNECT_MIN = 1
+RECONNECT_MAX = 60
+# Without any frame for this long the connection is considered dead and re-established
+READ_TIMEOUT = 300
+
+BINANCE_OPEN_ORDER_STATUSES = {"NEW", "PARTIALLY_FILLED"}
+BYBIT_OPEN_ORDER_STATUSES = {"New", "PartiallyFilled", "Untriggered"}
+BYBIT_POSITION_INDEXES = {1: "LONG", 2: "SHORT"}
+
+
+def start_stream(app):
+    """Open the account stream of every configured account, each on its own thread."""
+    streams = []
+    for account in app.config["ACCOUNTS"]:
+        stream = UserDataStream(app, account)
+        thread = threading.Thread(target=stream.run)
+        thread.daemon = True
+        thread.start()
+        streams.append(stream)
+    return streams
+
+
+# table changes driven by the stream events
+def upsert_position(
+    conn, symbol, side, amount, entry_price, unrealized, leverage=None, account=DEFAULT_ACCOUNT
+):
+    if not amount:
+        conn.execute(
+            "DELETE FROM positions WHERE symbol = ? AND positionSide = ? AND account = ?",
+            (symbol, side, account),
+        )
+        return
+    current = conn.execute(
+        "SELECT leverage FROM positions WHERE symbol = ? AND positionSide = ? AND account = ?",
+        (symbol, side, account),
+    ).fetchone()
+    if leverage is None:
+        leverage = current[0] if current is not None else 0
+    row = (unrealized, leverage, entry_price, amount, symbol, side)
+    if current is None:
+        scraper.create_position(conn, row, account)
+    else:
+        scraper.update_position(conn, row, account)
+
+
+def apply_order(conn, order, open_statuses, account=DEFAULT_ACCOUNT):
+    """Insert, update or remove an open order following its latest status."""
+    origQty, price, side, positionSide, status, symbol, time, type = order
+    existing = conn.execute(
+        "SELECT OID FROM orders WHERE account = ? AND symbol = ? AND side = ? AND type = ? AND price = ? AND origQty = ? ORDER BY positionSide = ? DESC LIMIT 0, 1",
+        (account, symbol, side, type, price, origQty, positionSide),
+    ).fetchone()
+    if status not in open_statuses:
+        if existing is not None:
+            conn.execute("DELETE FROM orders WHERE OID = ?", existing)
+    elif existing is None:
+        scraper.create_orders(conn, order, account)
+    else:
+        conn.execute("UPDATE orders SET status = ? WHERE OID = ?", (status, existing[0]))
+        ROWS_INGESTED.inc(account, "orders")
+
+
+def update_wallet_balance(conn, wallet_balance, account=DEFAULT_ACCOUNT):
+    conn.execute(
+        "UPDATE account SET totalWalletBalance = ? WHERE account = ?", (wallet_balance, account)
+    )
+    ROWS_INGESTED.inc(account, "account")
+
+
+def apply_binance_event(conn, event, leverages, account=DEFAULT_ACCOUNT):
+    """Apply one Binance user data stream event to the positions, orders and account tables."""
+    kind = event.get("e")
+    if kind == "ACCOUNT_UPDATE":
+        for balance in event["a"].get("B", []):
+            if balance["a"] == "USDT":
+                update_wallet_balance(conn, float(balance["wb"]), account)
+        for position in event["a"].get("P", []):
+            upsert_position(
+                conn,
+                position["s"],
+                position["ps"],
+                float(position["pa"]),
+                float(position["ep"]),
+                float(position["up"]),
+                leverages.get(position["s"]),
+                account,
+            )
+    elif kind == "ORDER_TRADE_UPDATE":
+        order = event["o"]
+        row = (
+            float(order["q"]),
+            float(order["p"]),
+            order["S"],
+            order["ps"],
+            order["X"],
+            order["s"],
+            int(order["T"]),
+            order["o"],
+        )
+        apply_order(conn, row, BINANCE_OPEN_ORDER_STATUSES, account)
+    elif kind == "ACCOUNT_CONFIG_UPDATE" and "ac" in event:
+        leverages[event["ac"]["s"]] = int(event["ac"]["l"])
+        conn.execute(
+            "UPDATE positions SET leverage = ? WHERE symbol = ? AND account = ?",
+            (int(event["ac"]["l"]), event["ac"]["s"], account),
+        )
+
+
+def _bybit_order_position_side(conn, item, account):
+    """Return the side of the position an order belongs to. In one-way mode the order does not
+    tell, a sell may close a long as well as open a short, so the stored position decides."""
+    side = BYBIT_POSITION_INDEXES.get(int(item.get("positionIdx", 0)))
+    if side is not None:
+        return side
+    current = conn.execute(
+        "SELECT positionSide FROM positions WHERE symbol = ? AND account = ? LIMIT 0, 1",
+        (item["symbol"], account),
+    ).fetchone()
+    if current is not None:
+        return current[0]
+    return scraper.BYBIT_POSITION_SIDES.get(item["side"].lower())
+
+
+def apply_bybit_event(conn, event, account=DEFAULT_ACCOUNT):
+    """Apply one Bybit private stream message to the positions, orders and account tables."""
+    topic = event.get("topic", "")
+    if topic.startswith("position"):
+        for position in event["data"]:
+            size = float(position["size"])
+            side = BYBIT_POSITION_INDEXES.get(int(position.get("positionIdx", 0)))
+            if side is None:
+                # a one-way position reports its current side, which flips when it turns over,
+                # and no side once closed
+                side = scraper.BYBIT_POSITION_SIDES.get(position["side"].lower())
+                conn.execute(
+                    "DELETE FROM positions WHERE symbol = ? AND positionSide IS NOT ? "
+                    "AND account = ?",
+                    (position["symbol"], side, account),
+                )
+                if side is None:
+                    continue
+            upsert_position(
+                conn,
+                position["symbol"],
+                side,
+                size,
+                float(position.get("avgPrice") or position.get("entryPrice") or 0),
+                float(position["unrealisedPnl"] or 0),
+                int(float(position["leverage"])) if position.get("leverage") else None,
+                account,
+            )
+    elif topic.startswith("order"):
+        for order in event["data"]:
+            side = _bybit_order_position_side(conn, order, account)
+            row = scraper.bybit_order_row(order, side)
+            apply_order(conn, row, BYBIT_OPEN_ORDER_STATUSES, account)
+    elif topic.startswith("wallet"):
+        for wallet in event["data"]:
+            for coin in wallet.get("coin", []):
+                if coin["coin"] == "USDT":
+                    update_wallet_balance(conn, float(coin["walletBalance"]), account)
+
+
+class UserDataStream:
+    """Keeps the private account stream of the configured exchange open.
+
+    Positions, open orders and the wallet balance are updated as the events arrive, while the
+    periodic REST scrape reconciles anything the stream might have missed. The connection is
+    re-established with an exponential back-off whenever it drops.
+    """
+
+    def __init__(self, app, account):
+        self.app = app
+        self.account = account
+        self.name = account["NAME"]
+        self.exchange = account["EXCHANGE"].lower()
+        self.stopped = threading.Event()
+        self.websocket: WebSocket | None = None
+        self.leverages: dict[str, int] = {}
+        self.listen_key = None
+        self.events = 0
+
+    def run(self):
+        with self.app.app_context():
+            g.account = self.account
+            delay = RECONNECT_MIN
+            while not self.stopped.is_set():
+                try:
+                    self._run_once()
+                    delay = RECONNECT_MIN
+                except Exception as exc:
+                    if self.stopped.is_set():
+                        break
+                    self.app.logger.warning(
+                        f"User data stream of account {self.name} disconnected: {exc}"
+                    )
+                self.stopped.wait(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+
+    def stop(self):
+        self.stopped.set()
+        if self.websocket is not None:
+            self.websocket.close()
+
+    def _run_once(self):
+        self.websocket = self.connect()
+        keepalive = threading.Thread(target=self._keepalive, args=(self.websocket,))
+        keepalive.daemon = True
+        keepalive.start()
+        self.app.logger.info(f"User data stream of account {self.name} connected to {self.exchange}")
+        conn = scraper.create_connection(current_app.config["DATABASE"])
+        try:
+            while not self.stopped.is_set():
+                event = codec.loads(self.websocket.recv())
+                if event.get("e") == "listenKeyExpired":
+                    return
+                if event.get("success") is False:
+                    raise WebSocketError(f"User data stream request failed: {event.get('ret_msg')}")
+                with conn:
+                    if self.exchange == "bybit":
+                        apply_bybit_event(conn, event, self.name)
+                    else:
+                        apply_binance_event(conn, event, self.leverages, self.name)
+                self.events += 1
+                scraper.notify_task(self.name, "stream", {"events": 1})
+        finally:
+            conn.close()
+            self.websocket.close()
+
+    def connect(self):
+        url = self.account["STREAM_URL"].rstrip("/")
+        if self.exchange == "bybit":
+            websocket = WebSocket.connect(url, read_timeout=READ_TIMEOUT)
+            expires = scraper.get_timestamp() + 10000
+            signature = hmac.new(
+                self.account["API_SECRET"].encode("utf-8"),
+                f"GET/realtime{expires}".encode("utf-8"),
+                hashlib.sha256,
+            ).hexdigest()
+            websocket.send(
+                codec.dumps({"op": "auth", "args": [self.account["API_KEY"], expires, signature]})
+            )
+            websocket.send(codec.dumps({"op": "subscribe", "args": ["position", "order", "wallet"]}))
+            return websocket
+
+        response = scraper.exchange_client().request("POST", "/fapi/v1/listenKey")
+        self.listen_key = codec.response_json(response)["listenKey"]
+        return WebSocket.connect(f"{url}/ws/{self.listen_key}", read_timeout=READ_TIMEOUT)
+
+    def _keepalive(self, websocket):
+        interval = KEEPALIVE_INTERVAL.get(self.exchange, KEEPALIVE_INTERVAL["binance"])
+        while not self.stopped.wait(interval) and websocket is self.websocket:
+            try:
+                with self.app.app_context():
+                    g.account = self.account
+                    if self.exchange == "bybit":
+                        websocket.send(codec.dumps({"op": "ping"}))
+                    else:
+                        scraper.exchange_client().request("PUT", "/fapi/v1/listenKey")
+            except Exception as exc:
+                self.app.logger.warning(
+                    f"User data stream keepalive of account {self.name} failed: {exc}"
+                )
+                websocket.close()
+                return
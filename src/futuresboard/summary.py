@@ -0,0 +1,118 @@
+"""Profit and loss totals and fees of the pages, each page reading them with one statement.
+
+The pages show the profit and loss of all time and of a few ranges, such as today or this week,
+next to the fees of all time. For a whole account the totals are lookups of the running income
+total, read together with the fees summed from the daily rollup. For a coin everything is summed
+in one pass over its rolled up days, where each total only adds up the income of its range. The
+days a range starts or ends in part of the way are summed from the income rows instead.
+
+The times are bound as arguments rather than written into the statements, which only differ by
+the shape of a summary. The pooled connections prepare each one once and keep it in their
+statement cache.
+"""
+from __future__ import annotations
+
+from futuresboard import db
+from futuresboard import equity
+from futuresboard.rollup import split_range
+from futuresboard.scraper import NON_PNL_INCOME_TYPES
+from futuresboard.scraper import ROLLUP_DAY
+
+# The income counted as profit and loss
+SQL_PNL = f"asset <> 'BNB' AND incomeType NOT IN {NON_PNL_INCOME_TYPES}"
+
+
+def _edge_days(periods):
+    """Return the UTC days the ``periods`` cover in part, by the times of their starts."""
+    days = set()
+    for start, end in periods:
+        if start is None or end is None:
+            continue
+        for first, last in split_range(start, end)[1]:
+            days.update(range(int(first // ROLLUP_DAY), int(last // ROLLUP_DAY) + 1))
+    return sorted(day * ROLLUP_DAY for day in days)
+
+
+def _account_sql(periods, account):
+    """Return the SQL and arguments of the fees per asset of an account or of all of them, along
+    with the profit and loss of each of the ``periods`` on every row."""
+    columns, args = [], []
+    for start, end in periods:
+        sql, pnl_args = equity.pnl_sql(start, end, account)
+        columns.append(sql)
+        args += pnl_args
+    fees_sql = "SELECT asset, SUM(income) AS income FROM income_daily WHERE incomeType = ?"
+    args.append("COMMISSION")
+    if account is not None:
+        fees_sql += " AND account = ?"
+        args.append(account)
+    return (
+        f"SELECT fees.asset, fees.income, {', '.join(columns)} "
+        f"FROM (SELECT 1) LEFT JOIN ({fees_sql} GROUP BY asset) AS fees",
+        args,
+    )
+
+
+def _coin_sql(periods, symbol, account):
+    """Return the SQL and arguments of the fees per asset of a coin, along with its profit and
+    loss of each of the ``periods`` in that asset."""
+    columns, args = [], []
+    for start, end in periods:
+        conditions = []
+        if start is not None:
+            conditions.append("time >= ?")
+            args.append(start)
+        if end is not None:
+            conditions.append("time <= ?")
+            args.append(end)
+        if conditions:
+            columns.append(f"SUM(CASE WHEN {' AND '.join(conditions)} THEN pnl END)")
+        else:
+            columns.append("SUM(pnl)")
+
+    # the income of a row is told apart once, each total then only compares its time
+    income = (
+        "asset, CASE WHEN incomeType = 'COMMISSION' THEN income END AS fee, "
+        f"CASE WHEN {SQL_PNL} THEN income END AS pnl"
+    )
+    filters, filters_args = " AND symbol = ?", [symbol]
+    if account is not None:
+        filters += " AND +account = ?"
+        filters_args.append(account)
+    edges = _edge_days(periods)
+    parts = [
+        f"SELECT day AS time, {income} FROM income_daily "
+        f"WHERE day NOT IN ({', '.join('?' for _ in edges)}){filters}"
+    ]
+    args += [*edges, *filters_args]
+    for day in edges:
+        parts.append(f"SELECT time, {income} FROM income WHERE time >= ? AND time < ?{filters}")
+        args += [day, day + ROLLUP_DAY, *filters_args]
+    return (
+        f"SELECT asset, SUM(fee), {', '.join(columns)} "
+        f"FROM ({' UNION ALL '.join(parts)}) GROUP BY asset",
+        args,
+    )
+
+
+def _add(values):
+    values = [value for value in values if value is not None]
+    return sum(values) if values else None
+
+
+def totals(periods, symbol=None, account=None):
+    """Return the profit and loss of each of the ``periods``, of one coin when ``symbol`` is given,
+    and the fees of all time per asset.
+
+    ``periods`` maps names to the (start, end) times of their ranges, both included. A range
+    without a start or an end is open on that side, so (None, None) is all of time. The profit
+    and loss is returned by the same names, None for a coin without income in the range.
+    """
+    if symbol is None:
+        rows = db.query(*_account_sql(periods.values(), account))
+        pnl = [equity.rounded(value) for value in rows[0][2:]]
+    else:
+        rows = db.query(*_coin_sql(periods.values(), symbol, account))
+        pnl = [_add(row[column] for row in rows) for column in range(2, 2 + len(periods))]
+    fees = {row[0]: row[1] for row in rows if row[1] is not None}
+    return dict(zip(periods, pnl)), fees
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests  # type: ignore
+from flask import current_app
+from flask import g
+
+from futuresboard import codec
+from futuresboard import scraper
+from futuresboard.metrics import ROWS_INGESTED
+from futuresboard.pipeline import ScrapeCancelled
+
+EXTENSION = "futuresboard.trigger"
+
+# How often the command line client polls a triggered scrape for progress, in seconds
+POLL_INTERVAL = 1.0
+
+
+class ScraperUnavailable(Exception):
+    """Raised when the scraper process cannot take a command."""
+
+
+def rows_ingested(account):
+    with ROWS_INGESTED.lock:
+        return sum(value for labels, value in ROWS_INGESTED.values.items() if labels[0] == account)
+
+
+class ScrapeRun:
+    """One on-demand scrape of every configured account.
+
+    The accounts are scraped concurrently, each holding the lock of its account so it never
+    overlaps with the scheduled tasks of the same account. Cancelling is cooperative: a task
+    stops between two pages and the tasks that did not start yet are skipped.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, accounts):
+        self.id = next(self._ids)
+        self.accounts = accounts
+        self.started = time.time()
+        self.finished: float | None = None
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.progress = {
+            account["NAME"]: {
+                "status": "pending",
+                "task": None,
+                "tasks_done": 0,
+                "tasks": len(scraper.SCRAPE_TASKS.get(account["EXCHANGE"].lower(), [])),
+                "rows": 0,
+                "results": {},
+                "error": None,
+            }
+            for account in accounts
+        }
+        self._rows_start = {name: rows_ingested(name) for name in self.progress}
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    @property
+    def status(self):
+        if self.running:
+            return "cancelling" if self.cancelled.is_set() else "running"
+        statuses = {progress["status"] for progress in self.progress.values()}
+        for status in ("failed", "cancelled"):
+            if status in statuses:
+                return status
+        return "finished"
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def as_dict(self):
+        with self.lock:
+            accounts = {}
+            for name, progress in self.progress.items():
+                accounts[name] = dict(progress, results=dict(progress["results"]))
+                if progress["status"] == "running":
+                    accounts[name]["rows"] = rows_ingested(name) - self._rows_start[name]
+        end = time.time() if self.finished is None else self.finished
+        return {
+            "id": self.id,
+            "status": self.status,
+            "started": self.started,
+            "finished": self.finished,
+            "elapsed": round(end - self.started, 3),
+            "accounts": accounts,
+        }
+
+    def _update(self, name, **changes):
+        with self.lock:
+            self.progress[name].update(changes)
+
+    def execute(self, app):
+        try:
+            workers = min(len(self.accounts), app.config["SCRAPE_WORKERS"])
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for account in self.accounts:
+                    executor.submit(self._scrape_account, app, account)
+        finally:
+            self.finished = time.time()
+            app.logger.info(f"On-demand scrape {self.id} {self.status}")
+
+    def _scrape_account(self, app, account):
+        name = account["NAME"]
+        with app.app_context(), scraper.account_lock(name):
+            g.account = account
+            g.scrape_cancelled = self.cancelled
+            g.scrape_conn = scraper.create_connection(app.config["DATABASE"])
+            self._rows_start[name] = rows_ingested(name)
+            self._update(name, status="running")
+            try:
+                for task_name, task, interval, priority in scraper.SCRAPE_TASKS.get(
+                    account["EXCHANGE"].lower(), []
+                ):
+                    if self.cancelled.is_set():
+                        raise ScrapeCancelled()
+                    self._update(name, task=task_name)
+                    results = scraper.run_task(name, task_name, task)
+                    with self.lock:
+                        self.progress[name]["results"].update(results)
+                        self.progress[name]["tasks_done"] += 1
+                status, error = "finished", None
+            except ScrapeCancelled:
+                status, error = "cancelled", None
+            except Exception as exc:
+                app.logger.error(f"On-demand scrape of account {name} failed: {exc}")
+                status, error = "failed", str(exc)
+            finally:
+                if g.scrape_conn is not None:
+                    g.scrape_conn.close()
+            self._update(
+                name,
+                status=status,
+                task=None,
+                error=error,
+                rows=rows_ingested(name) - self._rows_start[name],
+            )
+
+
+class ScrapeTrigger:
+    """Starts on-demand scrapes of the app, at most one at a time.
+
+    A request made while a scrape runs is coalesced into that run instead of starting another.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.run: ScrapeRun | None = None
+
+    def request(self):
+        """Start a scrape unless one is running, returning the run and whether it is new."""
+        with self.lock:
+            if self.run is not None and self.run.running:
+                return self.run, False
+            run = self.run = ScrapeRun(self.app.config["ACCOUNTS"])
+        thread = threading.Thread(target=run.execute, args=(self.app,))
+        thread.daemon = True
+        thread.start()
+        self.app.logger.info(f"On-demand scrape {run.id} started")
+        return run, True
+
+    def cancel(self):
+        """Cancel the running scrape, returning it, or None when nothing runs."""
+        with self.lock:
+            run = self.run
+        if run is None or not run.running:
+            return None
+        run.cancel()
+        return run
+
+
+def get_trigger():
+    return current_app.extensions[EXTENSION]
+
+
+def init_app(app):
+    """Register the scrape trigger with the Flask app. This is called by the application factory."""
+    app.extensions[EXTENSION] = ScrapeTrigger(app)
+
+
+# command line client of a running futuresboard
+def format_progress(run):
+    lines = [f"Scrape {run['id']}: {run['status']} ({run['elapsed']:.1f}s)"]
+    for name, progress in run["accounts"].items():
+        line = (
+            f"  {name}: {progress['status']}, {progress['tasks_done']}/{progress['tasks']} tasks, "
+            f"{progress['rows']} rows"
+        )
+        if progress["task"]:
+            line += f", running {progress['task']}"
+        if progress["error"]:
+            line += f", error: {progress['error']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def remote_scrape(url, token, cancel=False, wait=True, out=print):
+    """Trigger (or cancel) a scrape of the futuresboard running at ``url``.
+
+    With ``wait``, the progress is printed until the scrape ends, and interrupting the command
+    cancels the scrape. Returns the last state of the run.
+    """
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    endpoint = f"{url.rstrip('/')}/api/scrape"
+
+    response = session.request("DELETE" if cancel else "POST", endpoint, timeout=10)
+    if cancel and response.status_code == 404:
+        out("No scrape is running")
+        return None
+    response.raise_for_status()
+    run = codec.response_json(response)
+    if cancel:
+        out(format_progress(run))
+        return run
+    if response.status_code == 200:
+        out(f"Joined the scrape {run['id']} already running")
+
+    last = None
+    try:
+        while True:
+            state = dict(run, elapsed=None)
+            if state != last:
+                out(format_progress(run))
+                last = state
+            if not wait or run["status"] not in ("running", "cancelling"):
+                return run
+            time.sleep(POLL_INTERVAL)
+            response = session.get(endpoint, timeout=10)
+            response.raise_for_status()
+            run = codec.response_json(response)
+    except KeyboardInterrupt:
+        out("Cancelling the scrape")
+        return remote_scrape(url, token, cancel=True, out=out)
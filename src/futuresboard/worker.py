@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
+
+import futuresboard.app
+import futuresboard.scraper
+import futuresboard.stream
+from futuresboard import metrics
+from futuresboard import trigger
+from futuresboard.config import Config
+
+EXTENSION = "futuresboard.worker"
+
+# How often the scraper process reports its metrics, in seconds
+METRICS_INTERVAL = 1.0
+# How long the web service waits for the scraper process to answer, in seconds
+CALL_TIMEOUT = 10
+# Restart back-off bounds, in seconds. The back-off starts over once the process ran this long
+RESTART_MIN = 1
+RESTART_MAX = 60
+
+
+class Channel:
+    """One end of the pipe between the two processes, safe to send on from several threads."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        with self.lock:
+            self.conn.send(message)
+
+
+def run_worker(config_json, conn):
+    """Entry point of the scraper process.
+
+    Runs the scheduled scrape, the account stream and the on-demand scrapes of the configuration,
+    while answering the commands of the web service on ``conn``. Every finished scrape task and,
+    every ``METRICS_INTERVAL`` seconds, the metrics are reported back on it.
+    """
+    config = Config.parse_raw(config_json)
+    app = futuresboard.app.init_app(
+        config.copy(update={"SCRAPER_PROCESS": False, "DISABLE_AUTO_SCRAPE": True, "STREAM": False})
+    )
+    channel = Channel(conn)
+
+    def report_task(account, task, results):
+        try:
+            channel.send(("task", account, task, results))
+        except OSError:
+            # the web service is gone, the main loop notices and exits
+            pass
+
+    futuresboard.scraper.scrape_listeners.append(report_task)
+    if config.DISABLE_AUTO_SCRAPE is False:
+        futuresboard.scraper.auto_scrape(app, stream=config.STREAM)
+    if config.STREAM is True:
+        futuresboard.stream.start_stream(app)
+
+    scrape_trigger = app.extensions[trigger.EXTENSION]
+    reported = 0.0
+    while True:
+        if conn.poll(METRICS_INTERVAL):
+            try:
+                request_id, command = conn.recv()
+            except EOFError:
+                # the web service is gone
+                return
+            channel.send(("reply", request_id, handle_command(scrape_trigger, command)))
+        if time.monotonic() - reported >= METRICS_INTERVAL:
+            channel.send(("metrics", metrics.export()))
+            reported = time.monotonic()
+
+
+def handle_command(scrape_trigger, command):
+    if command == "request":
+        run, started = scrape_trigger.request()
+        return run.as_dict(), started
+    if command == "cancel":
+        run = scrape_trigger.cancel()
+    else:
+        run = scrape_trigger.run
+    return None if run is None else run.as_dict()
+
+
+class ScraperProcess:
+    """Runs the scraper in a child process, restarting it whenever it exits.
+
+    The web service then only renders pages, while the scraper parses and stores exchange data
+    on its own interpreter. The finished tasks reported by the child notify the scrape listeners
+    of the web service, so its data generation moves on as if the scraper ran in it.
+    """
+
+    def __init__(self, app, config):
+        self.app = app
+        self.config_json = config.json()
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.channel: Channel | None = None
+        self.pending: dict[int, Future] = {}
+        self.ids = itertools.count(1)
+        self.stopped = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=self.supervise)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.process is not None:
+            self.process.terminate()
+
+    def supervise(self):
+        delay = RESTART_MIN
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            conn = self._spawn()
+            self._listen(conn)
+            self.process.join()
+            self.channel = None
+            self._fail_pending()
+            if self.stopped.is_set():
+                return
+            if time.monotonic() - started >= RESTART_MAX:
+                delay = RESTART_MIN
+            self.app.logger.error(
+                f"Scraper process exited with code {self.process.exitcode}, restarting in {delay}s"
+            )
+            if self.stopped.wait(delay):
+                return
+            delay = min(delay * 2, RESTART_MAX)
+
+    def _spawn(self):
+        parent_conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=run_worker, args=(self.config_json, child_conn), name="futuresboard-scraper"
+        )
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.channel = Channel(parent_conn)
+        self.app.logger.info(f"Scraper process {self.process.pid} started")
+        return parent_conn
+
+    def _listen(self, conn):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            kind = message[0]
+            if kind == "reply":
+                future = self.pending.pop(message[1], None)
+                if future is not None:
+                    future.set_result(message[2])
+            elif kind == "task":
+                futuresboard.scraper.notify_task(*message[1:])
+            elif kind == "metrics":
+                metrics.load_remote(message[1])
+
+    def _fail_pending(self):
+        for request_id in list(self.pending):
+            future = self.pending.pop(request_id, None)
+            if future is not None:
+                future.set_exception(trigger.ScraperUnavailable("The scraper process exited"))
+
+    def call(self, command):
+        """Send ``command`` to the scraper process and return its answer."""
+        channel = self.channel
+        if channel is None:
+            raise trigger.ScraperUnavailable("The scraper process is not running")
+        request_id = next(self.ids)
+        future = self.pending[request_id] = Future()
+        try:
+            channel.send((request_id, command))
+            return future.result(CALL_TIMEOUT)
+        except (OSError, TimeoutError):
+            raise trigger.ScraperUnavailable("The scraper process did not answer")
+        finally:
+            self.pending.pop(request_id, None)
+
+
+class RemoteRun:
+    """The last known state of an on-demand scrape running in the scraper process."""
+
+    def __init__(self, state):
+        self.state = state
+
+    @property
+    def running(self):
+        return self.state["status"] in ("running", "cancelling")
+
+    def as_dict(self):
+        return self.state
+
+
+class RemoteTrigger:
+    """Stands in for the scrape trigger of the scraper process in the web service."""
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    def request(self):
+        state, started = self.worker.call("request")
+        return RemoteRun(state), started
+
+    def cancel(self):
+        state = self.worker.call("cancel")
+        return None if state is None else RemoteRun(state)
+
+    @property
+    def run(self):
+        state = self.worker.call("status")
+        return None if state is None else RemoteRun(state)
+
+
+def start_worker(app, config):
+    """Start the scraper process of ``app`` and route its on-demand scrapes there."""
+    worker = ScraperProcess(app, config)
+    worker.start()
+    app.extensions[EXTENSION] = worker
+    app.extensions[trigger.EXTENSION] = RemoteTrigger(worker)
+    return worker
+
@@ -0,0 +1,172 @@
+"""A minimal RFC 6455 WebSocket implementation, enough to follow the exchange account streams."""
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import threading
+from urllib.parse import urlsplit
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(Exception):
+    pass
+
+
+class WebSocketClosed(WebSocketError):
+    pass
+
+
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + GUID).encode()).digest()).decode()  # nosec
+
+
+def read_headers(rfile):
+    headers = {}
+    while True:
+        line = rfile.readline().decode("latin-1").strip()
+        if not line:
+            return headers
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+def _apply_mask(key, payload):
+    length = len(payload)
+    mask = int.from_bytes((key * (length // 4 + 1))[:length], "big")
+    return (int.from_bytes(payload, "big") ^ mask).to_bytes(length, "big")
+
+
+class WebSocket:
+    """One side of an established WebSocket connection.
+
+    Clients mask the frames they send, servers do not. ``send`` may be called from another
+    thread than the one reading with ``recv``, which is how keepalive pings are sent.
+    """
+
+    def __init__(self, sock, mask=True, rfile=None):
+        self.sock = sock
+        self.mask = mask
+        self.rfile = rfile or sock.makefile("rb")
+        self.lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, url, timeout=10, read_timeout=None):
+        parts = urlsplit(url)
+        secure = parts.scheme == "wss"
+        port = parts.port or (443 if secure else 80)
+        sock = socket.create_connection((parts.hostname, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        key = base64.b64encode(os.urandom(16)).decode()
+        sock.sendall(
+            (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        websocket = cls(sock)
+        status = websocket.rfile.readline().decode("latin-1")
+        headers = read_headers(websocket.rfile)
+        if status.split(" ")[1:2] != ["101"] or headers.get("sec-websocket-accept") != accept_key(
+            key
+        ):
+            sock.close()
+            raise WebSocketError(f"WebSocket handshake with {url!r} failed: {status.strip()}")
+        sock.settimeout(read_timeout)
+        return websocket
+
+    def send(self, message, opcode=OP_TEXT):
+        payload = message.encode("utf-8") if isinstance(message, str) else bytes(message)
+        length = len(payload)
+        mask_bit = 0x80 if self.mask else 0
+        header = bytearray([0x80 | opcode])
+        if length < 126:
+            header.append(mask_bit | length)
+        elif length < 65536:
+            header.append(mask_bit | 126)
+            header += struct.pack("!H", length)
+        else:
+            header.append(mask_bit | 127)
+            header += struct.pack("!Q", length)
+        if self.mask:
+            key = os.urandom(4)
+            header += key
+            payload = _apply_mask(key, payload)
+        with self.lock:
+            self.sock.sendall(bytes(header) + payload)
+
+    def _read(self, length):
+        try:
+            data = self.rfile.read(length)
+        except (OSError, ValueError) as exc:
+            raise WebSocketClosed(f"{exc}")
+        if len(data) < length:
+            raise WebSocketClosed("Connection closed by peer")
+        return data
+
+    def _read_frame(self):
+        head = self._read(2)
+        fin, opcode = head[0] & 0x80, head[0] & 0x0F
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._read(8))[0]
+        key = self._read(4) if head[1] & 0x80 else None
+        payload = self._read(length)
+        if key is not None:
+            payload = _apply_mask(key, payload)
+        return fin, opcode, payload
+
+    def recv(self):
+        """Return the next message, answering pings and close frames on the way."""
+        message, message_opcode = b"", OP_TEXT
+        while True:
+            fin, opcode, payload = self._read_frame()
+            if opcode == OP_PING:
+                self.send(payload, OP_PONG)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                try:
+                    self.send(payload[:2], OP_CLOSE)
+                except OSError:
+                    pass
+                raise WebSocketClosed("Connection closed by peer")
+            if opcode != OP_CONTINUATION:
+                message_opcode = opcode
+            message += payload
+            if fin:
+                return message.decode("utf-8") if message_opcode == OP_TEXT else message
+
+    def close(self):
+        try:
+            self.send(struct.pack("!H", 1000), OP_CLOSE)
+        except OSError:
+            pass
+        finally:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
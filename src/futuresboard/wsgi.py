@@ -1,6 +1,15 @@
 from __future__ import annotations
 
+import pathlib
+
 import futuresboard.app
+import futuresboard.worker
+from futuresboard.config import Config
+
 
+config = Config.from_config_dir(pathlib.Path.cwd())
+app = futuresboard.app.init_app(config)
 
-app = futuresboard.app.init_app()
+# like the command line, leave the scraper to its own process once the app is ready
+if config.SCRAPER_PROCESS:
+    futuresboard.worker.start_worker(app, config)
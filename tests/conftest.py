@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+
+from futuresboard.app import init_app
+from futuresboard.config import Config
+from futuresboard.fakes.exchange import FakeExchangeServer
+
+ACCOUNTS = ("main", "alt")
+
+
+@pytest.fixture(scope="session")
+def exchange():
+    """A fake exchange serving the mark prices and candles the pages show."""
+    server = FakeExchangeServer(symbols=50).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session")
+def make_app(exchange):
+    """Return a function creating the app of two accounts with its database in a directory."""
+
+    def make(directory):
+        config = Config.parse_obj(
+            {
+                "ACCOUNTS": [
+                    {
+                        "NAME": name,
+                        "API_KEY": "key",
+                        "API_SECRET": "secret",
+                        "API_BASE_URL": exchange.url,
+                    }
+                    for name in ACCOUNTS
+                ],
+                "DISABLE_AUTO_SCRAPE": True,
+                "CONFIG_DIR": directory,
+                "DATABASE": str(directory / "futures.db"),
+            }
+        )
+        return init_app(config)
+
+    return make
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(tmp_path)
@@ -0,0 +1,178 @@
+"""Check the running income total against the income rows it adds up."""
+from __future__ import annotations
+
+import random
+from datetime import date
+from datetime import timedelta
+
+import pytest
+
+from futuresboard import equity
+from futuresboard import scraper
+
+DAY = scraper.ROLLUP_DAY
+EPOCH = date(1970, 1, 1)
+ACCOUNTS = ("main", "alt")
+INCOME_TYPES = ("REALIZED_PNL", "FUNDING_FEE", "COMMISSION", *scraper.NON_PNL_INCOME_TYPES)
+PNL = (
+    "asset <> 'BNB' AND incomeType NOT IN "
+    f"({', '.join('?' for _ in scraper.NON_PNL_INCOME_TYPES)})"
+)
+
+
+def random_income(rng, count, first, days):
+    """Return ``count`` income rows on random ``days``, in no particular order of time."""
+    return [
+        (
+            f"T{number}",
+            "BTCUSDT",
+            rng.choice(INCOME_TYPES),
+            round(rng.uniform(-10, 10), 8),
+            "BNB" if rng.random() < 0.1 else "USDT",
+            "",
+            rng.choice(days) * DAY + rng.randint(0, DAY - 1),
+            number,
+        )
+        for number in range(first, first + count)
+    ]
+
+
+def raw_sum(conn, start=None, end=None, account=None):
+    sql = f"SELECT COALESCE(SUM(income), 0) FROM income WHERE {PNL}"
+    args = list(scraper.NON_PNL_INCOME_TYPES)
+    if start is not None:
+        sql += " AND time >= ?"
+        args.append(start)
+    if end is not None:
+        sql += " AND time <= ?"
+        args.append(end)
+    if account is not None:
+        sql += " AND account = ?"
+        args.append(account)
+    return conn.execute(sql, args).fetchone()[0]
+
+
+@pytest.fixture
+def conn(app):
+    conn = scraper.create_connection(app.config["DATABASE"])
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def days():
+    """Days of income: clustered around a few recent weeks, on both sides of the boundaries of
+    the tree's nodes, and anywhere it covers."""
+    rng = random.Random(3)
+    recent = (date(2024, 3, 10) - EPOCH).days
+    found = [recent + rng.randint(-60, 60) for _ in range(40)]
+    found += [edge + shift for edge in (1 << 14, 19 << 10, 5 << 12) for shift in (-1, 0, 1)]
+    found += [0, scraper.EQUITY_DAYS - 1]
+    found += [rng.randrange(scraper.EQUITY_DAYS) for _ in range(20)]
+    return found
+
+
+def check_totals(app, conn, days):
+    rng = random.Random(4)
+    times = [day * DAY + offset for day in days for offset in (0, DAY // 2, DAY - 1)]
+    with app.app_context():
+        for account in (None, *ACCOUNTS):
+            assert equity.pnl(account=account) == pytest.approx(
+                raw_sum(conn, account=account), abs=1e-6
+            )
+            for _ in range(60):
+                start, end = sorted(rng.sample(times, 2))
+                # a prefix, a range and a suffix of the history
+                for bounds in ((None, end), (start, end), (start, None)):
+                    assert equity.pnl(*bounds, account=account) == pytest.approx(
+                        raw_sum(conn, *bounds, account=account), abs=1e-6
+                    ), (bounds, account)
+
+            # the total up to the end of each day
+            ends = sorted(set(days))
+            dates = [(EPOCH + timedelta(days=day)).isoformat() for day in ends]
+            expected = [raw_sum(conn, end=day * DAY + DAY - 1, account=account) for day in ends]
+            assert equity.by_date(dates, account=account) == pytest.approx(expected, abs=1e-6)
+
+
+def test_running_total_follows_income(app, conn, days):
+    rng = random.Random(5)
+    # newer income first, then older income filling in the gaps, for both accounts in turn
+    ordered = sorted(days)
+    batches = [ordered[len(ordered) // 2 :], ordered[: len(ordered) // 2], ordered]
+    first = 0
+    for batch in batches:
+        for account in ACCOUNTS:
+            rows = random_income(rng, 300, first, batch)
+            with conn:
+                scraper.create_income_batch(conn, rows, account=account)
+            first += len(rows)
+    check_totals(app, conn, days)
+
+
+def test_rebuild_matches_triggers(app, conn, days):
+    rng = random.Random(6)
+    with conn:
+        for number, account in enumerate(ACCOUNTS):
+            scraper.create_income_batch(
+                conn, random_income(rng, 500, number * 500, days), account=account
+            )
+    kept = conn.execute("SELECT node, account, income FROM income_equity").fetchall()
+    with conn:
+        scraper.rebuild_income_equity(conn)
+    rebuilt = {
+        (node, account): income
+        for node, account, income in conn.execute(
+            "SELECT node, account, income FROM income_equity"
+        )
+    }
+    assert rebuilt == {
+        (node, account): pytest.approx(income, abs=1e-6) for node, account, income in kept
+    }
+    check_totals(app, conn, days)
+
+
+def test_running_total_follows_deletes(app, conn):
+    with conn:
+        scraper.create_income_batch(
+            conn,
+            [
+                ("T1", "BTCUSDT", "REALIZED_PNL", 5.0, "USDT", "", 10 * DAY, 1),
+                ("T2", "BTCUSDT", "REALIZED_PNL", 7.0, "USDT", "", 12 * DAY, 2),
+            ],
+        )
+        conn.execute("DELETE FROM income WHERE tranId = 'T1'")
+    with app.app_context():
+        assert equity.pnl() == 7.0
+        assert equity.pnl(end=11 * DAY) == 0.0
+
+
+def test_running_total_follows_changes(app, conn, days):
+    rng = random.Random(7)
+    with conn:
+        for number, account in enumerate(ACCOUNTS):
+            scraper.create_income_batch(
+                conn, random_income(rng, 400, number * 400, days), account=account
+            )
+    check_totals(app, conn, days)
+
+    with conn:
+        # income moved to another day or account, changed in amount, or turned into a transfer
+        # or a BNB fee, which no longer count, and the other way round
+        for iid in rng.sample(range(1, 801), 200):
+            conn.execute(
+                "UPDATE income SET time = ?, income = ?, incomeType = ?, asset = ?, account = ? "
+                "WHERE IID = ?",
+                (
+                    rng.choice(days) * DAY + rng.randint(0, DAY - 1),
+                    round(rng.uniform(-10, 10), 8),
+                    rng.choice(INCOME_TYPES),
+                    "BNB" if rng.random() < 0.1 else "USDT",
+                    rng.choice(ACCOUNTS),
+                    iid,
+                ),
+            )
+        conn.executemany(
+            "DELETE FROM income WHERE IID = ?", [(iid,) for iid in rng.sample(range(1, 801), 200)]
+        )
+    check_totals(app, conn, days)
@@ -0,0 +1,92 @@
+"""Check that coin pages read their candles from the store, which the background thread fetches."""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+import pytest
+
+from futuresboard import klines
+from futuresboard.client import get_client
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RecordingClient:
+    """The exchange client, noting the thread of every request."""
+
+    def __init__(self, client):
+        self.client = client
+        self.exchange = client.exchange
+        self.threads = []
+
+    def get(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return self.client.get(*args, **kwargs)
+
+
+@pytest.fixture
+def client(exchange):
+    return RecordingClient(get_client(exchange.url, exchange="binance"))
+
+
+@pytest.fixture
+def make_store(client, tmp_path):
+    stores = []
+
+    def make(interval=klines.OPEN_CANDLE_REFRESH):
+        store = klines.KlineStore(
+            str(tmp_path / "futures.db"), client, 7 * klines.INTERVALS["1d"], interval
+        )
+        store.start(LOGGER)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.stop()
+
+
+def test_views_only_read(make_store, client, exchange):
+    store = make_store()
+    symbol = exchange.symbols[3]
+    # the first view waits for the thread to fetch the candles of every timeframe
+    first = store.chart(symbol)
+    assert all(len(first[interval]) == klines.CANDLE_LIMIT for interval in klines.INTERVALS)
+    assert len(client.threads) == len(klines.INTERVALS)
+    assert threading.get_ident() not in client.threads
+
+    # later views read the stored candles without waiting or fetching anything
+    start = time.monotonic()
+    for _ in range(5):
+        assert store.chart(symbol) == first
+    assert time.monotonic() - start < 1
+    assert len(client.threads) == len(klines.INTERVALS)
+
+
+def test_viewed_charts_are_kept_up_to_date(make_store, client, exchange):
+    store = make_store(interval=50)
+    viewed, other = exchange.symbols[4], exchange.symbols[5]
+    store.chart(viewed)
+    # the open candles of the chart viewed are fetched again in the background
+    deadline = time.monotonic() + 10
+    while len(client.threads) < 3 * len(klines.INTERVALS):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert threading.get_ident() not in client.threads
+    assert store.candles(other, "1h") == []
+
+
+def test_charts_not_viewed_are_forgotten(make_store, client, exchange, monkeypatch):
+    store = make_store()
+    symbol = exchange.symbols[6]
+    store.chart(symbol)
+    monkeypatch.setattr(klines, "WATCH_PERIOD", 0)
+    time.sleep(0.01)
+    store.refresh_viewed(LOGGER)
+    assert store.viewed == {}
+    # the candles stay until the retention drops them, and viewing the chart again has them
+    # kept up to date again
+    assert len(store.candles(symbol, "1d")) == klines.CANDLE_LIMIT
+    assert store.view(symbol).wait(10)
@@ -0,0 +1,122 @@
+"""Check that the fetch/write pipeline stops cleanly, keeping every page it wrote."""
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+
+import pytest
+
+from futuresboard import scraper
+from futuresboard.pipeline import Pipeline
+from futuresboard.pipeline import ScrapeCancelled
+
+ROWS_PER_PAGE = 10
+
+
+class Sources:
+    """Endless sources of income pages, keeping track of which ones started and finished."""
+
+    def __init__(self):
+        self.started = set()
+        self.closed = set()
+        self.lock = threading.Lock()
+
+    def source(self, number, fail_after=None):
+        with self.lock:
+            self.started.add(number)
+        try:
+            for page in itertools.count():
+                if page == fail_after:
+                    raise RuntimeError(f"source {number} failed")
+                yield [
+                    (
+                        f"{number}-{page}-{row}",
+                        "BTCUSDT",
+                        "REALIZED_PNL",
+                        1.0,
+                        "USDT",
+                        "",
+                        page * ROWS_PER_PAGE + row,
+                        0,
+                    )
+                    for row in range(ROWS_PER_PAGE)
+                ], lambda conn: None
+        finally:
+            with self.lock:
+                self.closed.add(number)
+
+    def wait_closed(self):
+        """Wait until every source that started has finished."""
+        deadline = time.monotonic() + 10
+        while True:
+            with self.lock:
+                if self.closed == self.started:
+                    return
+            assert time.monotonic() < deadline, (self.started, self.closed)
+            time.sleep(0.01)
+
+
+@pytest.fixture
+def conn(app):
+    conn = scraper.create_connection(app.config["DATABASE"])
+    yield conn
+    conn.close()
+
+
+def stored(app):
+    conn = scraper.create_connection(app.config["DATABASE"])
+    rows = conn.execute("SELECT tranId FROM income").fetchall()
+    conn.close()
+    return {tran_id for tran_id, in rows}
+
+
+def test_cancel_keeps_the_pages_written(app, conn):
+    sources = Sources()
+    stop = threading.Event()
+    written = []
+    writers = set()
+
+    def write(page):
+        writers.add(threading.get_ident())
+        processed = scraper.write_income_page(conn, page, account="main")
+        written.extend(row[0] for row in page[0])
+        if len(written) >= 25 * ROWS_PER_PAGE:
+            stop.set()
+        return processed
+
+    pipeline = Pipeline(app, app.config["ACCOUNTS"][0], workers=3, stop=stop)
+    with pytest.raises(ScrapeCancelled):
+        pipeline.run([sources.source(number) for number in range(6)], write)
+
+    # the workers stop and close their sources, the ones not started yet never start
+    sources.wait_closed()
+    assert sources.started <= set(range(3))
+    # only the calling thread wrote, and every page it wrote is stored, nothing else
+    assert writers == {threading.get_ident()}
+    assert len(written) == 25 * ROWS_PER_PAGE
+    assert stored(app) == set(written)
+    # the pages of each source were written in order
+    for number in sources.started:
+        pages = [
+            int(tran_id.split("-")[1])
+            for tran_id in written[::ROWS_PER_PAGE]
+            if tran_id.startswith(f"{number}-")
+        ]
+        assert pages == list(range(len(pages)))
+
+
+def test_source_error_stops_the_others(app, conn):
+    sources = Sources()
+
+    def write(page):
+        return scraper.write_income_page(conn, page, account="main")
+
+    pipeline = Pipeline(app, app.config["ACCOUNTS"][0], workers=2)
+    with pytest.raises(RuntimeError, match="source 1 failed"):
+        pipeline.run([sources.source(0), sources.source(1, fail_after=3)], write)
+    sources.wait_closed()
+    # whatever was written before the error is kept
+    assert {tran_id for tran_id in stored(app) if tran_id.startswith("1-")} == {
+        f"1-{page}-{row}" for page in range(3) for row in range(ROWS_PER_PAGE)
+    }
@@ -0,0 +1,125 @@
+"""Check that the statements the pages run are answered from indexes.
+
+The statements are captured from rendering the pages, so they are the ones the blueprint builds
+from the rollup, the running total, the summary and the sidebar, for all accounts and for one.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from datetime import date
+from datetime import timedelta
+
+import pytest
+
+from futuresboard import blueprint
+from futuresboard import db
+from futuresboard import scraper
+
+ROWS = 100_000
+DAY = 24 * 60 * 60 * 1000
+INCOME_TYPES = ("REALIZED_PNL", "FUNDING_FEE", "COMMISSION", "REALIZED_PNL", "TRANSFER")
+# Tables growing with the history, which no page may read from end to end
+HISTORY_TABLES = ("income", "income_daily", "income_equity")
+
+
+@pytest.fixture(scope="module")
+def app(make_app, exchange, tmp_path_factory):
+    """The app on four years of income of 50 symbols, spread over both accounts."""
+    app = make_app(tmp_path_factory.mktemp("plans"))
+    conn = scraper.create_connection(app.config["DATABASE"])
+    end = int(time.time() * 1000)
+    spacing = 4 * 365 * DAY // ROWS
+    for index, account in enumerate(app.config["ACCOUNTS"]):
+        scraper.create_income_batch(
+            conn,
+            [
+                (
+                    row,
+                    exchange.symbols[row % len(exchange.symbols)],
+                    INCOME_TYPES[row % len(INCOME_TYPES)],
+                    (row % 200 - 100) / 100,
+                    "BNB" if row % 97 == 0 else "USDT",
+                    "",
+                    end - row * spacing,
+                    row,
+                )
+                for row in range(index, ROWS, 2)
+            ],
+            account=account["NAME"],
+        )
+        conn.execute(
+            "INSERT INTO account(totalWalletBalance, totalUnrealizedProfit, totalMarginBalance, "
+            "availableBalance, maxWithdrawAmount, account) "
+            "VALUES(10000, 0, 10000, 10000, 10000, ?)",
+            (account["NAME"],),
+        )
+        conn.execute(
+            "INSERT INTO positions(symbol, unrealizedProfit, leverage, entryPrice, positionSide, "
+            "positionAmt, account) VALUES(?, 1, 10, 100, 'LONG', 1, ?)",
+            (exchange.symbols[7], account["NAME"]),
+        )
+    conn.commit()
+    # statistics of the data, as a database migrated after years of scraping has them
+    conn.execute("ANALYZE")
+    conn.close()
+    return app
+
+
+@pytest.fixture(scope="module")
+def statements(app, exchange, tmp_path_factory):
+    """Render every page for all accounts and for one, returning the statements they ran."""
+    month = (date.today() - timedelta(days=30)).isoformat(), date.today().isoformat()
+    years = (date.today() - timedelta(days=4 * 365)).isoformat(), date.today().isoformat()
+    coin = exchange.symbols[7]
+    pages = [
+        "/",
+        f"/dashboard/{month[0]}/{month[1]}",
+        f"/dashboard/{years[0]}/{years[1]}",
+        "/positions",
+        f"/coins/{coin}",
+        f"/coins/{coin}/{month[0]}/{month[1]}",
+        "/history",
+        f"/history/{month[0]}/{month[1]}",
+        "/projection",
+    ]
+    captured = {}
+    query = db.query
+
+    def capture(sql, args=(), one=False):
+        captured.setdefault(sql, list(args))
+        return query(sql, args, one)
+
+    # the history pages export the income they list as CSV files next to the static files
+    root = tmp_path_factory.mktemp("root")
+    (root / "static" / "csv").mkdir(parents=True)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(db, "query", capture)
+        monkeypatch.setattr(blueprint.app, "root_path", str(root))
+        for account in (None, app.config["ACCOUNTS"][1]["NAME"]):
+            client = app.test_client()
+            if account is not None:
+                client.set_cookie(blueprint.ACCOUNT_COOKIE, account)
+            for page in pages:
+                assert client.get(page).status_code == 200, page
+    return captured
+
+
+def test_pages_ran_statements(statements):
+    sql = " ".join(statements)
+    for table in HISTORY_TABLES + ("income_symbols",):
+        assert re.search(rf"\b{table}\b", sql), table
+
+
+def test_history_is_searched_not_scanned(app, statements):
+    conn = sqlite3.connect(app.config["DATABASE"])
+    scans = []
+    for sql, args in statements.items():
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", args)]
+        for step in plan:
+            match = re.match(r"SCAN (\w+)", step)
+            if match and match.group(1) in HISTORY_TABLES:
+                scans.append(f"{step}: {sql}")
+    conn.close()
+    assert not scans
@@ -0,0 +1,162 @@
+"""Check how the rate governor paces requests, on a clock that only moves when it sleeps."""
+from __future__ import annotations
+
+import pytest
+
+from futuresboard import ratelimit
+from futuresboard.ratelimit import RateGovernor
+
+# Seconds since the epoch, 15 seconds into a clock minute
+WALL = 1_700_000_055.0
+POSITIONS = "/v5/position/list"
+INCOME = "/fapi/v1/income"
+
+
+class FakeClock:
+    """A monotonic and a wall clock moving together, only as far as the governor sleeps."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.wall = WALL
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def wallclock(self):
+        return self.wall
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        self.wall += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def governor(exchange, clock):
+    return RateGovernor(exchange, sleep=clock.sleep, clock=clock.clock, wallclock=clock.wallclock)
+
+
+def bybit_headers(remaining, reset, limit=10):
+    return {
+        "X-Bapi-Limit": str(limit),
+        "X-Bapi-Limit-Status": str(remaining),
+        "X-Bapi-Limit-Reset-Timestamp": str(int(reset * 1000)),
+    }
+
+
+def test_binance_weight_in_flight_is_subtracted(clock):
+    binance = governor("binance", clock)
+    capacity = binance.bucket.capacity
+    assert binance.acquire(INCOME) == binance.acquire(INCOME) == 30
+    assert binance.in_flight[INCOME] == (2, 60)
+
+    # the exchange counted the first request only, the second is still on its way
+    binance.observe(INCOME, {"X-MBX-USED-WEIGHT-1M": "100"})
+    assert binance.in_flight[INCOME] == (1, 30)
+    assert binance.bucket.tokens == pytest.approx(capacity - 100 - 30)
+
+    binance.observe(INCOME, {"X-MBX-USED-WEIGHT-1M": "130"})
+    assert binance.in_flight[INCOME] == (0, 0)
+    assert binance.bucket.tokens == pytest.approx(capacity - 130)
+    assert clock.sleeps == []
+
+
+def test_binance_minute_used_up_blocks_until_the_next(clock):
+    binance = governor("binance", clock)
+    binance.acquire(INCOME)
+    binance.observe(INCOME, {"X-MBX-USED-WEIGHT-1M": str(int(binance.bucket.capacity))})
+    # no weight frees up within the minute, all of it does at the start of the next
+    binance.acquire(INCOME)
+    assert clock.sleeps == [pytest.approx(45.0)]
+    assert clock.wall % 60 == pytest.approx(0)
+    binance.observe(INCOME, {"X-MBX-USED-WEIGHT-1M": "30"})
+    binance.acquire(INCOME)
+    assert len(clock.sleeps) == 1
+
+
+def test_binance_weight_below_the_limit_does_not_block(clock):
+    binance = governor("binance", clock)
+    binance.acquire(INCOME)
+    binance.observe(INCOME, {"X-MBX-USED-WEIGHT-1M": str(int(binance.bucket.capacity) - 31)})
+    binance.acquire(INCOME)
+    assert clock.sleeps == []
+
+
+def test_bybit_windows_out_of_order(clock):
+    bybit = governor("bybit", clock)
+    for _ in range(3):
+        bybit.acquire(POSITIONS)
+    reset = clock.wall + 0.5
+    bucket = bybit.endpoints[POSITIONS]
+
+    bybit.observe(POSITIONS, bybit_headers(6, reset))
+    assert bucket.capacity == pytest.approx(10 * ratelimit.HEADROOM)
+    # two requests of the window are still in flight
+    assert bucket.tokens == pytest.approx(4)
+
+    # answered before the last response, so it saw more requests left in the same window
+    bybit.observe(POSITIONS, bybit_headers(7, reset))
+    assert bybit.windows[POSITIONS] == (int(reset * 1000), 6)
+    assert bucket.tokens == pytest.approx(5)
+
+    # answered in the window before, which is over
+    bybit.observe(POSITIONS, bybit_headers(9, reset - 1))
+    assert bybit.windows[POSITIONS] == (int(reset * 1000), 6)
+    assert bybit.in_flight[POSITIONS] == (0, 0)
+    assert bucket.tokens == pytest.approx(5)
+
+
+def test_bybit_window_refills_nothing_until_it_resets(clock):
+    bybit = governor("bybit", clock)
+    bybit.acquire(POSITIONS)
+    reset = clock.wall + 0.5
+    bybit.observe(POSITIONS, bybit_headers(3, reset))
+    for _ in range(3):
+        bybit.acquire(POSITIONS)
+    assert clock.sleeps == []
+    # the fourth waits for the window to reset, and then for one token to refill
+    bybit.acquire(POSITIONS)
+    assert sum(clock.sleeps) == pytest.approx(0.5 + 1 / (10 * ratelimit.HEADROOM))
+
+
+def test_bybit_window_used_up_blocks_until_it_resets(clock):
+    bybit = governor("bybit", clock)
+    bybit.acquire(POSITIONS)
+    reset = clock.wall + 0.8
+    bybit.observe(POSITIONS, bybit_headers(1, reset))
+    bybit.acquire(POSITIONS)
+    assert clock.sleeps == [pytest.approx(0.8)]
+
+
+def test_backoff_grows_up_to_the_maximum(clock):
+    bybit = governor("bybit", clock)
+    bybit.acquire(POSITIONS)
+    bybit.observe(POSITIONS, {})
+    for attempt, delay in ((0, 0.5), (1, 1.0), (3, 4.0), (10, ratelimit.BACKOFF_MAX)):
+        bybit.backoff(POSITIONS, attempt)
+        assert bybit.endpoints[POSITIONS].blocked_until == pytest.approx(clock.now + delay)
+        bybit.acquire(POSITIONS)
+        assert clock.sleeps[-1] == pytest.approx(delay)
+        bybit.observe(POSITIONS, {})
+    assert bybit.stats()["retries"] == 4
+
+
+def test_backoff_keeps_the_block_the_headers_asked_for(clock):
+    binance = governor("binance", clock)
+    binance.acquire(INCOME)
+    binance.observe(INCOME, {"Retry-After": "2"})
+    # the exchange said when to come back, which is sooner than the back-off would be
+    binance.backoff(INCOME, 5)
+    # an endpoint without a bucket of its own holds back the whole exchange
+    assert binance.bucket.blocked_until == pytest.approx(clock.now + 2)
+    binance.acquire(INCOME)
+    assert clock.sleeps == [pytest.approx(2)]
+
+    binance.observe(INCOME, {})
+    binance.backoff(INCOME, 1)
+    assert binance.bucket.blocked_until == pytest.approx(clock.now + 1.0)
@@ -0,0 +1,206 @@
+"""Check the sums read from the daily income rollup against the income rows they stand for."""
+from __future__ import annotations
+
+import random
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from futuresboard import rollup
+from futuresboard import scraper
+from futuresboard.blueprint import remove_incomeTypes
+
+DAY = scraper.ROLLUP_DAY
+HOUR = DAY // 24
+# Midnight UTC on 2024-03-10, the days around it hold the income
+MIDNIGHT = int(datetime(2024, 3, 10, tzinfo=timezone.utc).timestamp() * 1000)
+SYMBOLS = ("BTCUSDT", "ETHUSDT", "")
+INCOME_TYPES = ("REALIZED_PNL", "FUNDING_FEE", "COMMISSION", "TRANSFER")
+# Time zones of the browsers asking for today, this week and so on
+OFFSETS = (-8 * HOUR, 0, 5 * HOUR + HOUR // 2, 13 * HOUR)
+
+
+def random_income(rng, count, first=0):
+    """Return ``count`` income rows within five days of ``MIDNIGHT``, many of them close to the
+    start or end of a day."""
+    rows = []
+    for number in range(first, first + count):
+        day = MIDNIGHT + rng.randint(-5, 5) * DAY
+        if rng.random() < 0.5:
+            time = day + rng.choice((-1, 1)) * rng.randint(0, 2 * HOUR)
+        else:
+            time = day + rng.randint(0, DAY - 1)
+        rows.append(
+            (
+                f"T{number}",
+                rng.choice(SYMBOLS),
+                rng.choice(INCOME_TYPES),
+                round(rng.uniform(-10, 10), 8),
+                "BNB" if rng.random() < 0.1 else "USDT",
+                "",
+                time,
+                number,
+            )
+        )
+    return rows
+
+
+def raw_sum(conn, start, end, symbol=None, account=None, exclude=()):
+    sql = "SELECT SUM(income) FROM income WHERE time >= ? AND time <= ?"
+    args = [start, end]
+    if exclude:
+        sql += f" AND asset <> 'BNB' AND incomeType NOT IN ({', '.join('?' for _ in exclude)})"
+        args += exclude
+    if symbol is not None:
+        sql += " AND symbol = ?"
+        args.append(symbol)
+    if account is not None:
+        sql += " AND account = ?"
+        args.append(account)
+    return conn.execute(sql, args).fetchone()[0]
+
+
+def ranges():
+    """Return the ranges the pages ask for, from local midnights in every time zone, along with
+    ranges starting and ending at any time."""
+    rng = random.Random(1)
+    found = [(MIDNIGHT - 6 * DAY, MIDNIGHT + 6 * DAY)]
+    for offset in OFFSETS:
+        for days in (1, 2, 7):
+            start = MIDNIGHT - offset - 3 * DAY
+            found.append((start, start + days * DAY - 1))
+    for _ in range(20):
+        start = MIDNIGHT + rng.randint(-6 * DAY, 5 * DAY)
+        found.append((start, start + rng.randint(0, 3 * DAY)))
+    return found
+
+
+def daily(conn):
+    return {
+        row[:5]: row[5:]
+        for row in conn.execute(
+            "SELECT account, day, symbol, incomeType, asset, income, rows FROM income_daily"
+        )
+    }
+
+
+def approx(days):
+    return {key: (pytest.approx(income, abs=1e-6), rows) for key, (income, rows) in days.items()}
+
+
+def expected_daily(conn):
+    return approx(
+        {
+            row[:5]: row[5:]
+            for row in conn.execute(
+                f"SELECT account, time - time % {DAY}, symbol, incomeType, asset, SUM(income), "
+                "COUNT(*) FROM income GROUP BY 1, 2, 3, 4, 5"
+            )
+        }
+    )
+
+
+def check_sums(app, conn):
+    assert daily(conn) == expected_daily(conn)
+    with app.app_context():
+        for start, end in ranges():
+            for filters in (
+                {},
+                {"exclude": remove_incomeTypes},
+                {"exclude": remove_incomeTypes, "account": "alt"},
+                {"symbol": "ETHUSDT", "account": "main"},
+            ):
+                assert rollup.pnl(start, end, **filters) == pytest.approx(
+                    raw_sum(conn, start, end, **filters), abs=1e-6
+                ), (start, end, filters)
+
+            by_date = dict(rollup.pnl_by_date(start, end, exclude=remove_incomeTypes))
+            raw_by_date = conn.execute(
+                'SELECT DATE(time / 1000, "unixepoch"), SUM(income) FROM income '
+                "WHERE time >= ? AND time <= ? AND asset <> 'BNB' "
+                f"AND incomeType NOT IN ({', '.join('?' for _ in remove_incomeTypes)}) GROUP BY 1",
+                [start, end, *remove_incomeTypes],
+            ).fetchall()
+            assert by_date == {
+                date: pytest.approx(income, abs=1e-6) for date, income in raw_by_date
+            }
+
+            by_symbol = {
+                symbol: income
+                for income, symbol in rollup.pnl_by_symbol(start, end, account="main")
+            }
+            raw_by_symbol = conn.execute(
+                "SELECT symbol, SUM(income) FROM income "
+                "WHERE time >= ? AND time <= ? AND account = 'main' GROUP BY symbol",
+                [start, end],
+            ).fetchall()
+            assert by_symbol == {
+                symbol: pytest.approx(income, abs=1e-6) for symbol, income in raw_by_symbol
+            }
+
+
+@pytest.fixture
+def conn(app):
+    conn = scraper.create_connection(app.config["DATABASE"])
+    yield conn
+    conn.close()
+
+
+def test_split_range_at_midnight():
+    assert rollup.split_range(MIDNIGHT, MIDNIGHT + DAY - 1) == ((MIDNIGHT, MIDNIGHT + DAY), [])
+    assert rollup.split_range(MIDNIGHT - HOUR, MIDNIGHT + DAY + HOUR) == (
+        (MIDNIGHT, MIDNIGHT + DAY),
+        [(MIDNIGHT - HOUR, MIDNIGHT - 1), (MIDNIGHT + DAY, MIDNIGHT + DAY + HOUR)],
+    )
+    assert rollup.split_range(MIDNIGHT + HOUR, MIDNIGHT + 2 * HOUR) == (
+        None,
+        [(MIDNIGHT + HOUR, MIDNIGHT + 2 * HOUR)],
+    )
+
+
+def test_rollup_follows_income(app, conn):
+    rng = random.Random(0)
+    with conn:
+        scraper.create_income_batch(conn, random_income(rng, 600), account="main")
+        scraper.create_income_batch(conn, random_income(rng, 400, 600), account="alt")
+    check_sums(app, conn)
+
+    with conn:
+        # income moved to another day, account, symbol or amount, in either direction of a
+        # day boundary
+        for iid in rng.sample(range(1, 1001), 150):
+            conn.execute(
+                "UPDATE income SET time = time + ?, income = ?, symbol = ?, account = ? "
+                "WHERE IID = ?",
+                (
+                    rng.choice((-DAY, -HOUR, 0, HOUR, DAY)),
+                    round(rng.uniform(-10, 10), 8),
+                    rng.choice(SYMBOLS),
+                    rng.choice(("main", "alt")),
+                    iid,
+                ),
+            )
+        conn.executemany(
+            "DELETE FROM income WHERE IID = ?", [(iid,) for iid in rng.sample(range(1, 1001), 200)]
+        )
+        scraper.create_income_batch(conn, random_income(rng, 200, 1000), account="alt")
+    check_sums(app, conn)
+
+    # the days emptied by the deletes are gone, not left at zero
+    assert not conn.execute("SELECT 1 FROM income_daily WHERE rows <= 0").fetchall()
+
+
+def test_rebuild_matches_triggers(app, conn):
+    rng = random.Random(2)
+    with conn:
+        scraper.create_income_batch(conn, random_income(rng, 500), account="main")
+        scraper.create_income_batch(conn, random_income(rng, 500, 500), account="alt")
+        conn.executemany(
+            "DELETE FROM income WHERE IID = ?", [(iid,) for iid in rng.sample(range(1, 1001), 100)]
+        )
+    kept = daily(conn)
+    with conn:
+        assert scraper.rebuild_income_daily(conn) == len(kept)
+    assert daily(conn) == approx(kept)
+    check_sums(app, conn)
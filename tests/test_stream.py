@@ -0,0 +1,176 @@
+"""Replay account stream events through the fake stream and check the tables they change."""
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from futuresboard import scraper
+from futuresboard.app import init_app
+from futuresboard.config import Config
+from futuresboard.fakes.stream import FIXTURE_FILES
+from futuresboard.fakes.stream import FakeStreamServer
+from futuresboard.fakes.stream import load_events
+from futuresboard.stream import UserDataStream
+
+# Replies of the fake to the Bybit auth and subscribe requests, which arrive as events too
+BYBIT_REPLIES = 2
+
+
+def bybit_position(side, size, leverage="20", unrealised="0"):
+    return {
+        "topic": "position",
+        "data": [
+            {
+                "symbol": "BTCUSDT",
+                "side": side,
+                "size": size,
+                "positionIdx": 0,
+                "entryPrice": "36000" if side else "0",
+                "leverage": leverage,
+                "unrealisedPnl": unrealised,
+            }
+        ],
+    }
+
+
+@pytest.fixture
+def replay(tmp_path):
+    """Return a function replaying events to the stream of an account of an exchange, returning
+    a connection to the database once the stream applied all of them."""
+    servers = []
+    conns = []
+
+    def replay(exchange, events):
+        server = FakeStreamServer(events).start()
+        servers.append(server)
+        account = {
+            "NAME": "main",
+            "EXCHANGE": exchange,
+            "API_KEY": "key",
+            "API_SECRET": "secret",
+            "API_BASE_URL": server.url.replace("ws://", "http://"),
+            "STREAM_URL": server.url,
+        }
+        app = init_app(
+            Config.parse_obj(
+                {
+                    "ACCOUNTS": [account],
+                    "DISABLE_AUTO_SCRAPE": True,
+                    "CONFIG_DIR": tmp_path,
+                    "DATABASE": str(tmp_path / f"{exchange}.db"),
+                }
+            )
+        )
+        conn = scraper.create_connection(app.config["DATABASE"])
+        conns.append(conn)
+        with conn:
+            scraper.create_account(conn, (1000.0, 0.0, 1000.0, 1000.0, 1000.0), "main")
+
+        stream = UserDataStream(app, app.config["ACCOUNTS"][0])
+        thread = threading.Thread(target=stream.run)
+        thread.daemon = True
+        thread.start()
+        expected = len(events) + (BYBIT_REPLIES if exchange == "bybit" else 0)
+        deadline = time.monotonic() + 10
+        while stream.events < expected:
+            assert time.monotonic() < deadline, f"{stream.events} of {expected} events applied"
+            time.sleep(0.01)
+        stream.stop()
+        thread.join(5)
+        assert server.connections == 1
+        return conn
+
+    yield replay
+    for conn in conns:
+        conn.close()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def positions(conn):
+    return conn.execute(
+        "SELECT symbol, positionSide, positionAmt, entryPrice, unrealizedProfit, leverage "
+        "FROM positions WHERE account = 'main' ORDER BY symbol, positionSide"
+    ).fetchall()
+
+
+def orders(conn):
+    return conn.execute(
+        "SELECT symbol, side, positionSide, price, origQty, status, type FROM orders "
+        "WHERE account = 'main' ORDER BY symbol, price"
+    ).fetchall()
+
+
+def wallet_balance(conn):
+    return conn.execute(
+        "SELECT totalWalletBalance FROM account WHERE account = 'main'"
+    ).fetchone()[0]
+
+
+def test_binance_position_opened(replay):
+    # up to the funding fee, after the buy order filled and the sell order waits
+    conn = replay("binance", load_events(FIXTURE_FILES["binance"])[:6])
+    assert positions(conn) == [("BTCUSDT", "LONG", 0.01, 36000.0, 1.5, 20)]
+    assert orders(conn) == [("BTCUSDT", "SELL", "LONG", 38000.0, 0.01, "NEW", "LIMIT")]
+    assert wallet_balance(conn) == 1000.21
+
+
+def test_binance_position_closed(replay):
+    conn = replay("binance", load_events(FIXTURE_FILES["binance"]))
+    # the position of size 0 is removed, along with the filled orders
+    assert positions(conn) == []
+    assert orders(conn) == [("ETHUSDT", "SELL", "SHORT", 2100.0, 0.5, "NEW", "LIMIT")]
+    assert wallet_balance(conn) == 1020.21
+
+
+def test_binance_order_updated(replay):
+    events = load_events(FIXTURE_FILES["binance"])[1:2]
+    filling = {**events[0], "o": {**events[0]["o"], "X": "PARTIALLY_FILLED", "x": "TRADE"}}
+    conn = replay("binance", [*events, filling])
+    assert orders(conn) == [
+        ("BTCUSDT", "BUY", "LONG", 36000.0, 0.01, "PARTIALLY_FILLED", "LIMIT")
+    ]
+
+
+def test_bybit_position_opened(replay):
+    # up to the unrealised profit update, after the buy order filled and the sell order waits
+    conn = replay("bybit", load_events(FIXTURE_FILES["bybit"])[:6])
+    assert positions(conn) == [("BTCUSDT", "LONG", 0.01, 36000.0, 1.5, 20)]
+    assert orders(conn) == [("BTCUSDT", "SELL", "SHORT", 38000.0, 0.01, "New", "Limit")]
+    assert wallet_balance(conn) == 1000.25
+
+
+def test_bybit_position_closed(replay):
+    conn = replay("bybit", load_events(FIXTURE_FILES["bybit"]))
+    # the one-way position of size 0 and no side is removed, along with the filled orders
+    assert positions(conn) == []
+    assert orders(conn) == []
+    assert wallet_balance(conn) == 1020.21
+
+
+def test_bybit_one_way_position_flips(replay):
+    conn = replay(
+        "bybit",
+        [
+            bybit_position("Buy", "0.010"),
+            # the long is sold and turned into a short within one order
+            bybit_position("Sell", "0.020", unrealised="-2"),
+        ],
+    )
+    assert positions(conn) == [("BTCUSDT", "SHORT", 0.02, 36000.0, -2.0, 20)]
+
+
+def test_bybit_one_way_position_flips_and_closes(replay):
+    conn = replay(
+        "bybit",
+        [
+            bybit_position("Buy", "0.010"),
+            bybit_position("Sell", "0.020"),
+            bybit_position("Buy", "0.010"),
+            bybit_position("", "0"),
+        ],
+    )
+    assert positions(conn) == []
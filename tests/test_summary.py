@@ -0,0 +1,142 @@
+"""Check the totals of a page read in one statement against plain sums of the income rows."""
+from __future__ import annotations
+
+import random
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from futuresboard import scraper
+from futuresboard import summary
+from futuresboard.blueprint import remove_incomeTypes
+
+DAY = scraper.ROLLUP_DAY
+HOUR = DAY // 24
+MIDNIGHT = int(datetime(2024, 3, 10, tzinfo=timezone.utc).timestamp() * 1000)
+SYMBOLS = ("BTCUSDT", "ETHUSDT", "")
+INCOME_TYPES = ("REALIZED_PNL", "FUNDING_FEE", "COMMISSION", "TRANSFER")
+
+
+@pytest.fixture
+def app(app):
+    """The app with income of a few symbols in the main account, and of one in the other. Some
+    of it is stored right at the start or end of a period."""
+    rng = random.Random(7)
+    bounds = [
+        bound
+        for name, period in periods().items()
+        for bound in period
+        if name != "empty" and bound is not None
+    ]
+    conn = scraper.create_connection(app.config["DATABASE"])
+    with conn:
+        for account, symbols, count in (("main", SYMBOLS, 800), ("alt", SYMBOLS[:1], 200)):
+            scraper.create_income_batch(
+                conn,
+                [
+                    (
+                        f"{account}{number}",
+                        rng.choice(symbols),
+                        rng.choice(INCOME_TYPES),
+                        round(rng.uniform(-10, 10), 8),
+                        "BNB" if rng.random() < 0.1 else "USDT",
+                        "",
+                        rng.choice(bounds)
+                        if rng.random() < 0.2
+                        else MIDNIGHT + rng.randint(-40 * DAY, DAY - 1),
+                        number,
+                    )
+                    for number in range(count)
+                ],
+                account=account,
+            )
+    conn.close()
+    return app
+
+
+def periods():
+    """Return the periods of a page: all of time, today, this week, this month and a custom
+    range, here in a time zone ahead of UTC, along with a range without any income."""
+    today = MIDNIGHT - 5 * HOUR
+    return {
+        "total": (None, None),
+        "today": (today, today + DAY - 1),
+        "week": (today - 3 * DAY, today + 4 * DAY - 1),
+        "month": (today - 9 * DAY, today + 22 * DAY - 1),
+        "custom": (today - 30 * DAY + 7 * HOUR, today - 2 * DAY + 13 * HOUR),
+        "empty": (MIDNIGHT + 10 * DAY, MIDNIGHT + 20 * DAY),
+    }
+
+
+def baseline(app, sql, symbol=None, account=None, args=(), group_by=None):
+    """Run ``sql`` over the income rows with the filters of a page, as the pages did before the
+    summary, one query per figure."""
+    args = list(args)
+    if symbol is not None:
+        sql += " AND symbol = ?"
+        args.append(symbol)
+    if account is not None:
+        sql += " AND account = ?"
+        args.append(account)
+    if group_by is not None:
+        sql += f" GROUP BY {group_by}"
+    conn = scraper.create_connection(app.config["DATABASE"])
+    rows = conn.execute(sql, args).fetchall()
+    conn.close()
+    return rows
+
+
+def raw_pnl(app, start, end, symbol=None, account=None):
+    sql = (
+        "SELECT SUM(income) FROM income WHERE asset <> 'BNB' "
+        f"AND incomeType NOT IN ({', '.join('?' for _ in remove_incomeTypes)})"
+    )
+    args = list(remove_incomeTypes)
+    if start is not None:
+        sql += " AND time >= ? AND time <= ?"
+        args += [start, end]
+    return baseline(app, sql, symbol, account, args)[0][0]
+
+
+def raw_fees(app, symbol=None, account=None):
+    """The fees of all time per asset."""
+    fees = baseline(
+        app,
+        "SELECT asset, SUM(income) FROM income WHERE incomeType = 'COMMISSION'",
+        symbol,
+        account,
+        group_by="asset",
+    )
+    return {asset: pytest.approx(income, abs=1e-6) for asset, income in fees}
+
+
+@pytest.mark.parametrize("account", [None, "main", "alt", "nobody"])
+def test_account_totals(app, account):
+    with app.app_context():
+        pnl, fees = summary.totals(periods(), account=account)
+    # the total of an account without income in a range is zero
+    assert pnl == {
+        name: pytest.approx(raw_pnl(app, start, end, account=account) or 0, abs=1e-6)
+        for name, (start, end) in periods().items()
+    }
+    assert pnl["empty"] == 0
+    assert fees == raw_fees(app, account=account)
+
+
+@pytest.mark.parametrize("symbol", SYMBOLS)
+@pytest.mark.parametrize("account", [None, "main", "alt"])
+def test_coin_totals(app, symbol, account):
+    with app.app_context():
+        pnl, fees = summary.totals(periods(), symbol=symbol, account=account)
+    expected = {
+        name: raw_pnl(app, start, end, symbol=symbol, account=account)
+        for name, (start, end) in periods().items()
+    }
+    assert pnl == {
+        name: None if income is None else pytest.approx(income, abs=1e-6)
+        for name, income in expected.items()
+    }
+    # a coin without income in a range has no total for it
+    assert pnl["empty"] is None
+    assert fees == raw_fees(app, symbol=symbol, account=account)
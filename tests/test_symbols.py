@@ -0,0 +1,100 @@
+"""Check the catalog of symbols with income against the income rows it lists."""
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from futuresboard import scraper
+
+SYMBOLS = ("BTCUSDT", "ETHUSDT", "XRPUSDT", "")
+ACCOUNTS = ("main", "alt")
+INCOME_TYPES = ("REALIZED_PNL", "FUNDING_FEE", "COMMISSION", *scraper.NON_PNL_INCOME_TYPES)
+
+
+@pytest.fixture
+def conn(app):
+    conn = scraper.create_connection(app.config["DATABASE"])
+    yield conn
+    conn.close()
+
+
+def catalog(conn):
+    return set(conn.execute("SELECT symbol, account FROM income_symbols"))
+
+
+def expected_catalog(conn):
+    return set(
+        conn.execute(
+            "SELECT DISTINCT symbol, account FROM income WHERE asset <> 'BNB' AND symbol <> '' "
+            f"AND incomeType NOT IN ({', '.join('?' for _ in scraper.NON_PNL_INCOME_TYPES)})",
+            scraper.NON_PNL_INCOME_TYPES,
+        )
+    )
+
+
+def test_catalog_follows_deletes(conn):
+    with conn:
+        scraper.create_income_batch(
+            conn,
+            [
+                ("T1", "BTCUSDT", "REALIZED_PNL", 5.0, "USDT", "", 1, 1),
+                ("T2", "BTCUSDT", "FUNDING_FEE", 1.0, "USDT", "", 2, 2),
+                ("T3", "ETHUSDT", "REALIZED_PNL", 7.0, "USDT", "", 3, 3),
+            ],
+            account="main",
+        )
+        conn.execute("DELETE FROM income WHERE tranId = 'T1'")
+    # the symbol is listed while any of its income is left
+    assert catalog(conn) == {("BTCUSDT", "main"), ("ETHUSDT", "main")}
+    with conn:
+        conn.execute("DELETE FROM income WHERE tranId IN ('T2', 'T3')")
+    assert catalog(conn) == set()
+
+
+def test_catalog_follows_changes(conn):
+    rng = random.Random(8)
+    with conn:
+        for number, account in enumerate(ACCOUNTS):
+            scraper.create_income_batch(
+                conn,
+                [
+                    (
+                        f"T{row}",
+                        rng.choice(SYMBOLS),
+                        rng.choice(INCOME_TYPES),
+                        round(rng.uniform(-10, 10), 8),
+                        "BNB" if rng.random() < 0.1 else "USDT",
+                        "",
+                        row,
+                        row,
+                    )
+                    for row in range(number * 100, number * 100 + 100)
+                ],
+                account=account,
+            )
+    assert catalog(conn) == expected_catalog(conn)
+
+    with conn:
+        # income moved to another symbol or account, or turned into a transfer or a BNB fee,
+        # which are not listed, and the other way round
+        for iid in rng.sample(range(1, 201), 120):
+            conn.execute(
+                "UPDATE income SET symbol = ?, incomeType = ?, asset = ?, account = ? "
+                "WHERE IID = ?",
+                (
+                    rng.choice(SYMBOLS),
+                    rng.choice(INCOME_TYPES),
+                    "BNB" if rng.random() < 0.3 else "USDT",
+                    rng.choice(ACCOUNTS),
+                    iid,
+                ),
+            )
+        conn.executemany(
+            "DELETE FROM income WHERE IID = ?", [(iid,) for iid in rng.sample(range(1, 201), 150)]
+        )
+    assert catalog(conn) == expected_catalog(conn)
+
+    with conn:
+        conn.execute("DELETE FROM income")
+    assert catalog(conn) == set()
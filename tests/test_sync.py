@@ -0,0 +1,124 @@
+"""Check that reconciling the stored positions and orders with a fetched snapshot changes only
+the rows that differ."""
+from __future__ import annotations
+
+import pytest
+
+from futuresboard import scraper
+
+
+@pytest.fixture
+def conn(app):
+    conn = scraper.create_connection(app.config["DATABASE"])
+    yield conn
+    conn.close()
+
+
+def positions(conn, account="main"):
+    """The stored positions by symbol and side, the first stored of any stored twice."""
+    return {
+        (symbol, side): (pid, values)
+        for pid, symbol, side, *values in conn.execute(
+            "SELECT PID, symbol, positionSide, unrealizedProfit, leverage, entryPrice, positionAmt "
+            "FROM positions WHERE account = ? ORDER BY PID DESC",
+            (account,),
+        )
+    }
+
+
+def orders(conn, account="main"):
+    return sorted(
+        conn.execute(
+            "SELECT OID, origQty, price, side, positionSide, status, symbol, time, type "
+            "FROM orders WHERE account = ?",
+            (account,),
+        )
+    )
+
+
+def test_sync_positions(conn):
+    snapshot = [
+        (1.5, 20, 36000.0, 0.01, "BTCUSDT", "LONG"),
+        (-2.0, 10, 2000.0, 0.5, "ETHUSDT", "SHORT"),
+        (0.0, 5, 0.5, 100.0, "XRPUSDT", "LONG"),
+    ]
+    with conn:
+        assert scraper.sync_positions(conn, snapshot, "main") == (3, 0, 0)
+        scraper.sync_positions(conn, snapshot[:1], "alt")
+        # a position the stream stored twice, and one it closed without removing it
+        conn.execute(
+            "INSERT INTO positions(symbol, unrealizedProfit, leverage, entryPrice, positionSide, "
+            "positionAmt, account) VALUES('ETHUSDT', -2, 10, 2000, 'SHORT', 0.5, 'main'), "
+            "('SOLUSDT', 0, 10, 0, 'LONG', 0, 'main')"
+        )
+    before = positions(conn)
+
+    changed = [
+        # the same position with a new profit, one unchanged, one opened and one of size 0
+        (2.5, 20, 36000.0, 0.01, "BTCUSDT", "LONG"),
+        (-2.0, 10, 2000.0, 0.5, "ETHUSDT", "SHORT"),
+        (0.1, 3, 150.0, 2.0, "SOLUSDT", "SHORT"),
+        (0.0, 20, 0.0, 0.0, "BNBUSDT", "LONG"),
+    ]
+    with conn:
+        # inserted: SOLUSDT SHORT; updated: BTCUSDT; deleted: the XRPUSDT position that was
+        # closed, the second ETHUSDT and the SOLUSDT LONG of size 0
+        assert scraper.sync_positions(conn, changed, "main") == (1, 1, 3)
+    after = positions(conn)
+    assert {key: values for key, (_, values) in after.items()} == {
+        ("BTCUSDT", "LONG"): [2.5, 20, 36000.0, 0.01],
+        ("ETHUSDT", "SHORT"): [-2.0, 10, 2000.0, 0.5],
+        ("SOLUSDT", "SHORT"): [0.1, 3, 150.0, 2.0],
+    }
+    # the rows kept are changed in place
+    for key in (("BTCUSDT", "LONG"), ("ETHUSDT", "SHORT")):
+        assert after[key][0] == before[key][0]
+    # another account is left alone
+    assert list(positions(conn, "alt")) == [("BTCUSDT", "LONG")]
+
+    with conn:
+        assert scraper.sync_positions(conn, changed, "main") == (0, 0, 0)
+
+
+def test_sync_orders(conn):
+    snapshot = [
+        (0.01, 36000.0, "BUY", "LONG", "NEW", "BTCUSDT", 1000, "LIMIT"),
+        (0.01, 38000.0, "SELL", "LONG", "NEW", "BTCUSDT", 2000, "LIMIT"),
+        # two orders alike in everything
+        (0.5, 2100.0, "SELL", "SHORT", "NEW", "ETHUSDT", 3000, "LIMIT"),
+        (0.5, 2100.0, "SELL", "SHORT", "NEW", "ETHUSDT", 3000, "LIMIT"),
+    ]
+    with conn:
+        assert scraper.sync_orders(conn, snapshot, "main") == (4, 0, 0)
+        scraper.sync_orders(conn, snapshot[:1], "alt")
+        # an order the stream stored as it arrived, at the time of the event
+        conn.execute(
+            "INSERT INTO orders(origQty, price, side, positionSide, status, symbol, time, type, "
+            "account) VALUES(1.0, 0.6, 'BUY', 'LONG', 'NEW', 'XRPUSDT', 5050, 'LIMIT', 'main')"
+        )
+    before = {row[1:]: row[0] for row in orders(conn)}
+
+    changed = [
+        # partly filled, unchanged, and the stream's order at its creation time
+        (0.01, 36000.0, "BUY", "LONG", "PARTIALLY_FILLED", "BTCUSDT", 1000, "LIMIT"),
+        (0.01, 38000.0, "SELL", "LONG", "NEW", "BTCUSDT", 2000, "LIMIT"),
+        (1.0, 0.6, "BUY", "LONG", "NEW", "XRPUSDT", 5000, "LIMIT"),
+        # one of the two alike is left, and a new one
+        (0.5, 2100.0, "SELL", "SHORT", "NEW", "ETHUSDT", 3000, "LIMIT"),
+        (1.0, 0.5, "BUY", "LONG", "NEW", "XRPUSDT", 6000, "STOP"),
+    ]
+    with conn:
+        assert scraper.sync_orders(conn, changed, "main") == (1, 2, 1)
+    after = orders(conn)
+    assert sorted(row[1:] for row in after) == sorted(changed)
+    # the stream's order and the partly filled one are updated in place, not replaced
+    oids = {row[1:]: row[0] for row in after}
+    assert oids[changed[0]] == before[snapshot[0]]
+    assert oids[changed[1]] == before[snapshot[1]]
+    assert oids[changed[2]] == before[(1.0, 0.6, "BUY", "LONG", "NEW", "XRPUSDT", 5050, "LIMIT")]
+    assert len(orders(conn, "alt")) == 1
+
+    with conn:
+        assert scraper.sync_orders(conn, changed, "main") == (0, 0, 0)
+        assert scraper.sync_orders(conn, [], "main") == (0, 0, 5)
+    assert orders(conn) == []
@@ -0,0 +1,104 @@
+"""Check that on-demand scrapes requested together run once."""
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from futuresboard import scraper
+from futuresboard import trigger
+
+
+class SlowTask:
+    """A scrape task that runs until it is released, counting its runs per account."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.runs = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.runs.append(scraper.current_account()["NAME"])
+        assert self.release.wait(10)
+        return {"trades": 1}
+
+
+@pytest.fixture
+def task(monkeypatch):
+    task = SlowTask()
+    monkeypatch.setattr(
+        scraper, "SCRAPE_TASKS", {"binance": [("slow", task, "AUTO_SCRAPE_INTERVAL", 0)]}
+    )
+    yield task
+    task.release.set()
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def wait_finished(run):
+    wait_until(lambda: not run.running)
+
+
+def test_burst_runs_once(app, task):
+    scrape_trigger = app.extensions[trigger.EXTENSION]
+    barrier = threading.Barrier(20)
+    requests = []
+
+    def request():
+        barrier.wait()
+        requests.append(scrape_trigger.request())
+
+    threads = [threading.Thread(target=request) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # every request joins the one run, which only one of them started
+    runs = {id(run) for run, _ in requests}
+    assert len(runs) == 1
+    assert [started for _, started in requests].count(True) == 1
+    run = requests[0][0]
+
+    # and more requests while it runs still join it
+    assert scrape_trigger.request() == (run, False)
+    task.release.set()
+    wait_finished(run)
+    assert sorted(task.runs) == ["alt", "main"]
+    assert run.status == "finished"
+    accounts = run.as_dict()["accounts"]
+    assert {name: progress["tasks_done"] for name, progress in accounts.items()} == {
+        "main": 1,
+        "alt": 1,
+    }
+
+    # once it finished, the next request starts another run
+    again, started = scrape_trigger.request()
+    assert started and again is not run
+    wait_finished(again)
+    assert len(task.runs) == 4
+
+
+def test_cancel_skips_the_tasks_left(app, task, monkeypatch):
+    second = SlowTask()
+    second.release.set()
+    monkeypatch.setitem(
+        scraper.SCRAPE_TASKS, "binance", [*scraper.SCRAPE_TASKS["binance"], ("next", second, "", 1)]
+    )
+    scrape_trigger = app.extensions[trigger.EXTENSION]
+    run, started = scrape_trigger.request()
+    assert started
+    wait_until(lambda: len(task.runs) == 2)
+    assert scrape_trigger.cancel() is run
+    task.release.set()
+    wait_finished(run)
+    assert run.status == "cancelled"
+    assert second.runs == []
+    assert scrape_trigger.cancel() is None